@@ -1,10 +1,12 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from app.utils.cache import ResponseCache
 import os
 
 db = SQLAlchemy()
 migrate = Migrate()
+response_cache = ResponseCache()
 
 def create_app():
     app = Flask(__name__)
@@ -20,6 +22,7 @@ def create_app():
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
+    response_cache.init_app(app)
 
     with app.app_context():
         # Import and register blueprints
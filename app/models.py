@@ -12,36 +12,120 @@ class Product(db.Model):
     keywords = db.relationship('KeywordPerformance', backref='product', lazy=True)
 
 class Sale(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'date', 'marketplace', name='uq_sale_product_date_marketplace'),
+        db.Index('ix_sale_date', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     revenue = db.Column(db.Float, nullable=False)
-    marketplace = db.Column(db.String(50))
+    marketplace = db.Column(db.String(50), nullable=False, default='Unknown')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class DailySalesRollup(db.Model):
+    """Sales pre-aggregated per product, day and marketplace, maintained on ingestion."""
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'date', 'marketplace', name='uq_daily_sales_rollup_product_date_marketplace'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
+    marketplace = db.Column(db.String(50), nullable=False, default='Unknown')
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DailyMarketplaceSalesRollup(db.Model):
+    """Sales of the whole catalog per day and marketplace, summed from DailySalesRollup on ingestion."""
+    __table_args__ = (
+        db.UniqueConstraint('date', 'marketplace', name='uq_daily_marketplace_sales_rollup_date_marketplace'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False)
+    marketplace = db.Column(db.String(50), nullable=False, default='Unknown')
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Report(db.Model):
+    __table_args__ = (
+        db.Index('ix_report_created_at_id', 'created_at', 'id'),
+        db.Index('ix_report_type_created_at', 'type', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     type = db.Column(db.String(50), nullable=False)  # daily, weekly, monthly
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
-    data = db.Column(db.JSON)
+    data = db.deferred(db.Column(db.JSON))  # reports processed before the Parquet store; loaded only when accessed
+    data_file = db.Column(db.String(255))  # Parquet file in the report store
+    row_count = db.Column(db.Integer)
+    byte_size = db.Column(db.BigInteger)  # size of the data file
+    processing_seconds = db.Column(db.Float)  # time spent processing the report document
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    amazon_report_id = db.Column(db.String(100))
+    report_document_id = db.Column(db.String(255))
+    error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class CompetitorPrice(db.Model):
+    __table_args__ = (
+        db.Index('ix_competitor_price_product_timestamp', 'product_id', 'timestamp'),
+        db.Index('ix_competitor_price_product_competitor_timestamp', 'product_id', 'marketplace', 'competitor_asin', 'timestamp'),
+        db.Index('ix_competitor_price_product_last_seen_at', 'product_id', 'last_seen_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     competitor_asin = db.Column(db.String(10), nullable=False)
+    marketplace = db.Column(db.String(50), nullable=False, default='Unknown')
     price = db.Column(db.Float, nullable=False)
     shipping_price = db.Column(db.Float, default=0.0)
     is_prime = db.Column(db.Boolean, default=False)
     is_fba = db.Column(db.Boolean, default=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)  # Valid from
     condition = db.Column(db.String(50), default='New')
+    valid_to = db.Column(db.DateTime)  # Set when change-only storage records a newer offer
+    last_seen_at = db.Column(db.DateTime, default=datetime.utcnow)  # Last poll that saw this offer
+    sample_count = db.Column(db.Integer, nullable=False, default=1)  # Polls that saw this offer
+
+class CompetitorPriceRollup(db.Model):
+    """Open/high/low/close competitor prices per hour or day, downsampled from expired CompetitorPrice rows."""
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'resolution', 'bucket_start', 'marketplace', 'competitor_asin',
+                            name='uq_competitor_price_rollup_product_resolution_bucket_competitor'),
+        db.Index('ix_competitor_price_rollup_resolution_bucket_start', 'resolution', 'bucket_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    competitor_asin = db.Column(db.String(10), nullable=False)
+    marketplace = db.Column(db.String(50), nullable=False, default='Unknown')
+    resolution = db.Column(db.String(10), nullable=False)  # hour, day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    open_price = db.Column(db.Float, nullable=False)
+    high_price = db.Column(db.Float, nullable=False)
+    low_price = db.Column(db.Float, nullable=False)
+    close_price = db.Column(db.Float, nullable=False)
+    close_at = db.Column(db.DateTime)  # Time of the last sample in the bucket
+    sample_count = db.Column(db.Integer, nullable=False)
+    is_prime = db.Column(db.Boolean, default=False)  # As of the last sample in the bucket
+    is_fba = db.Column(db.Boolean, default=False)
 
 class ProfitMargin(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'date', name='uq_profit_margin_product_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
@@ -57,6 +141,11 @@ class ProfitMargin(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class KeywordPerformance(db.Model):
+    __table_args__ = (
+        db.Index('ix_keyword_performance_product_date', 'product_id', 'date'),
+        db.UniqueConstraint('product_id', 'keyword', 'date', name='uq_keyword_performance_product_keyword_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     keyword = db.Column(db.String(255), nullable=False)
@@ -68,3 +157,97 @@ class KeywordPerformance(db.Model):
     acos = db.Column(db.Float, default=0.0)  # Advertising Cost of Sales
     date = db.Column(db.Date, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TrackingSchedule(db.Model):
+    """When each type of tracked data was last refreshed for a product and is next due."""
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'data_type', name='uq_tracking_schedule_product_data_type'),
+        db.Index('ix_tracking_schedule_data_type_next_due_at', 'data_type', 'next_due_at'),
+        db.Index('ix_tracking_schedule_data_type_priority', 'data_type', 'priority', 'next_due_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    data_type = db.Column(db.String(20), nullable=False)  # prices, keywords, profit
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, ok, failed
+    last_tracked_at = db.Column(db.DateTime)
+    next_due_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    priority = db.Column(db.Integer, nullable=False, default=0)  # Units sold recently; best sellers are tracked first
+    error = db.Column(db.Text)
+
+class CatalogItem(db.Model):
+    """Cached Catalog API details for an ASIN; found is False for ASINs Amazon doesn't know."""
+    id = db.Column(db.Integer, primary_key=True)
+    asin = db.Column(db.String(10), unique=True, nullable=False)
+    payload = db.Column(db.JSON)
+    found = db.Column(db.Boolean, nullable=False, default=True)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class Order(db.Model):
+    """An order from the Orders API, kept up to date by the order sync."""
+    __table_args__ = (
+        db.Index('ix_order_purchase_date', 'purchase_date'),
+        db.Index('ix_order_items_synced_at', 'items_synced_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    amazon_order_id = db.Column(db.String(50), unique=True, nullable=False)
+    marketplace = db.Column(db.String(50), nullable=False, default='Unknown')
+    purchase_date = db.Column(db.DateTime, nullable=False)
+    last_update_date = db.Column(db.DateTime, nullable=False)
+    order_status = db.Column(db.String(30), nullable=False)
+    fulfillment_channel = db.Column(db.String(10))  # AFN or MFN
+    order_total = db.Column(db.Float)
+    currency = db.Column(db.String(3))
+    items_synced_at = db.Column(db.DateTime)  # None until the items of the latest version are fetched
+
+class OrderItem(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('order_id', 'order_item_id', name='uq_order_item_order_order_item_id'),
+        db.Index('ix_order_item_product_id', 'product_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_item_id = db.Column(db.String(50), nullable=False)  # Amazon's OrderItemId
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'))  # None for ASINs not in the catalog
+    asin = db.Column(db.String(10), nullable=False)
+    seller_sku = db.Column(db.String(100))
+    title = db.Column(db.String(500))
+    quantity_ordered = db.Column(db.Integer, nullable=False, default=0)
+    quantity_shipped = db.Column(db.Integer, nullable=False, default=0)
+    item_price = db.Column(db.Float)
+    item_tax = db.Column(db.Float)
+    promotion_discount = db.Column(db.Float)
+
+class SyncCheckpoint(db.Model):
+    """High-water mark of an incremental sync from Amazon, per sync type and marketplace."""
+    __table_args__ = (
+        db.UniqueConstraint('sync_type', 'marketplace', name='uq_sync_checkpoint_sync_type_marketplace'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sync_type = db.Column(db.String(50), nullable=False)  # orders, sales
+    marketplace = db.Column(db.String(50), nullable=False)
+    high_water_mark = db.Column(db.DateTime, nullable=False)  # everything updated before this is synced
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SyncWindow(db.Model):
+    """A date range of a report-based sync, committed once its report has been ingested."""
+    __table_args__ = (
+        db.UniqueConstraint('sync_type', 'marketplace', 'start_date', 'end_date', name='uq_sync_window_type_marketplace_dates'),
+        db.Index('ix_sync_window_type_marketplace_status', 'sync_type', 'marketplace', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sync_type = db.Column(db.String(50), nullable=False)  # sales
+    marketplace = db.Column(db.String(50), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)  # inclusive
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    amazon_report_id = db.Column(db.String(100))
+    rows = db.Column(db.Integer)  # daily sales rows ingested
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    completed_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
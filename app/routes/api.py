@@ -1,16 +1,21 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, url_for, send_file
 from ..models import Product, Sale, Report, CompetitorPrice, ProfitMargin, KeywordPerformance
-from ..services.amazon_sp_api import AmazonSPAPIService
-from ..services.report_processor import ReportProcessor
+from ..services.amazon_sp_api import get_sp_api_service
+from ..services.report_jobs import get_report_queue
+from ..services.report_listing import report_list_query
+from ..services.report_store import ReportStore
+from ..services.catalog_cache import CatalogCache
 from ..services.competitor_tracker import CompetitorTracker
 from ..services.profit_calculator import ProfitCalculator
 from ..services.keyword_tracker import KeywordTracker
-from .. import db
+from ..services.sales_rollup import SalesRollup
+from ..services.tracking import track_products
+from ..utils.pagination import keyset_page, ndjson_response, page_size
+from .. import db, response_cache
 from datetime import datetime
 
 bp = Blueprint('api', __name__, url_prefix='/api')
-amazon_api = AmazonSPAPIService()
-report_processor = ReportProcessor()
+REPORT_TYPES = ('sales', 'orders', 'inventory')
 
 @bp.route('/sales', methods=['GET'])
 def get_sales():
@@ -21,71 +26,100 @@ def get_sales():
         return jsonify({'error': 'start_date and end_date are required'}), 400
     
     try:
-        start_date = datetime.strptime(start_date, '%Y-%m-%d')
-        end_date = datetime.strptime(end_date, '%Y-%m-%d')
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
     except ValueError:
         return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
     
-    sales = Sale.query.filter(
+    sales = db.session.query(
+        Sale.id,
+        Sale.date,
+        Sale.quantity,
+        Sale.revenue,
+        Sale.marketplace,
+        Product.asin
+    ).join(
+        Product, Sale.product_id == Product.id
+    ).filter(
         Sale.date >= start_date,
         Sale.date <= end_date
-    ).all()
+    ).order_by(Sale.date, Sale.id)
     
-    return jsonify([{
+    # Stream the whole range as NDJSON without building it in memory
+    if request.args.get('stream'):
+        return ndjson_response(_sale_json(sale) for sale in sales.yield_per(current_app.config['API_PAGE_SIZE']))
+    
+    try:
+        sales, next_cursor = keyset_page(sales, [Sale.date, Sale.id], request.args.get('cursor'), page_size())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'sales': [_sale_json(sale) for sale in sales],
+        'next_cursor': next_cursor
+    })
+
+def _sale_json(sale):
+    return {
         'id': sale.id,
-        'product_asin': sale.product.asin,
+        'product_asin': sale.asin,
         'date': sale.date.isoformat(),
         'quantity': sale.quantity,
         'revenue': sale.revenue,
         'marketplace': sale.marketplace
-    } for sale in sales])
+    }
 
 @bp.route('/reports', methods=['GET'])
 def get_reports():
-    reports = Report.query.all()
-    return jsonify([{
-        'id': report.id,
-        'name': report.name,
-        'type': report.type,
-        'start_date': report.start_date.isoformat(),
-        'end_date': report.end_date.isoformat(),
-        'created_at': report.created_at.isoformat()
-    } for report in reports])
+    try:
+        query, sort_columns, descending = report_list_query(request.args)
+        reports, next_cursor = keyset_page(query, sort_columns, request.args.get('cursor'), page_size(), descending)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'reports': [{
+            'id': report.id,
+            'name': report.name,
+            'type': report.type,
+            'start_date': report.start_date.isoformat(),
+            'end_date': report.end_date.isoformat(),
+            'status': report.status,
+            'row_count': report.row_count,
+            'byte_size': report.byte_size,
+            'processing_seconds': report.processing_seconds,
+            'created_at': report.created_at.isoformat()
+        } for report in reports],
+        'next_cursor': next_cursor
+    })
 
 @bp.route('/reports', methods=['POST'])
 def create_report():
     data = request.form
     
+    if data.get('type') not in REPORT_TYPES:
+        return jsonify({'error': 'Invalid report type'}), 400
+    
     try:
         report = Report(
             name=data['name'],
             type=data['type'],
             start_date=datetime.strptime(data['start_date'], '%Y-%m-%d').date(),
-            end_date=datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+            end_date=datetime.strptime(data['end_date'], '%Y-%m-%d').date(),
+            status='queued'
         )
         db.session.add(report)
         db.session.commit()
         
-        # Request report from Amazon
-        if report.type == 'sales':
-            amazon_report = amazon_api.get_sales_report(report.start_date, report.end_date)
-        elif report.type == 'orders':
-            amazon_report = amazon_api.get_orders_report(report.start_date, report.end_date)
-        elif report.type == 'inventory':
-            amazon_report = amazon_api.get_inventory_report()
-        else:
-            return jsonify({'error': 'Invalid report type'}), 400
+        # Request, download and process the report in a worker process
+        get_report_queue().enqueue(report.id)
         
-        if amazon_report:
-            report.report_document_id = amazon_report.get('reportDocumentId')
-            db.session.commit()
-            
-            # Process report asynchronously
-            report_processor.process_report(report.id)
-            
-            return jsonify({'success': True, 'report_id': report.id})
-        
-        return jsonify({'error': 'Failed to create report'}), 500
+        return jsonify({
+            'success': True,
+            'report_id': report.id,
+            'status': report.status,
+            'status_url': url_for('api.get_report_status', report_id=report.id)
+        }), 202
     except Exception as e:
         current_app.logger.error(f"Error creating report: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -93,30 +127,80 @@ def create_report():
 @bp.route('/reports/<int:report_id>', methods=['GET'])
 def get_report(report_id):
     report = Report.query.get_or_404(report_id)
+
+    # ?columns=asin,quantity projects columns; each ?where=quantity,>=,5 filters rows
+    columns = [column for column in request.args.get('columns', '').split(',') if column] or None
+    data = None
+    if report.data_file or report.data is not None:
+        store = ReportStore()
+        if report.data_file and not store.exists(report.data_file):
+            return jsonify({'error': 'Report data file not found'}), 404
+        try:
+            data = store.query(report, columns, request.args.getlist('where')).to_pylist()
+        except FileNotFoundError:
+            return jsonify({'error': 'Report data file not found'}), 404
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
     return jsonify({
         'id': report.id,
         'name': report.name,
         'type': report.type,
         'start_date': report.start_date.isoformat(),
         'end_date': report.end_date.isoformat(),
-        'data': report.data,
+        'status': report.status,
+        'error': report.error,
+        'row_count': report.row_count,
+        'byte_size': report.byte_size,
+        'processing_seconds': report.processing_seconds,
+        'data': data,
         'created_at': report.created_at.isoformat(),
         'updated_at': report.updated_at.isoformat()
     })
 
+@bp.route('/reports/<int:report_id>/status', methods=['GET'])
+def get_report_status(report_id):
+    report = Report.query.get_or_404(report_id)
+    return jsonify({
+        'id': report.id,
+        'status': report.status,
+        'error': report.error,
+        'amazon_report_id': report.amazon_report_id,
+        'started_at': report.started_at.isoformat() if report.started_at else None,
+        'completed_at': report.completed_at.isoformat() if report.completed_at else None
+    })
+
+@bp.route('/reports/<int:report_id>/download', methods=['GET'])
+def download_report(report_id):
+    report = Report.query.get_or_404(report_id)
+    if not report.data_file:
+        return jsonify({'error': 'Report has no data file'}), 404
+    store = ReportStore()
+    if not store.exists(report.data_file):
+        return jsonify({'error': 'Report data file not found'}), 404
+    return send_file(
+        store.path(report.data_file),
+        mimetype='application/vnd.apache.parquet',
+        as_attachment=True,
+        download_name=f'report-{report.id}.parquet'
+    )
+
 @bp.route('/reports/<int:report_id>', methods=['DELETE'])
 def delete_report(report_id):
     report = Report.query.get_or_404(report_id)
+    data_file = report.data_file
     db.session.delete(report)
     db.session.commit()
+    if data_file:
+        ReportStore().delete(data_file)
     return jsonify({'success': True})
 
 @bp.route('/products/<asin>', methods=['GET'])
 def get_product(asin):
     product = Product.query.filter_by(asin=asin).first()
     if not product:
-        # Try to fetch from Amazon
-        amazon_product = amazon_api.get_product_details(asin)
+        # Try to fetch from Amazon, remembering ASINs it doesn't know
+        amazon_product = CatalogCache(get_sp_api_service()).get_details(asin, fields=['title'])
         if amazon_product:
             product = Product(
                 asin=asin,
@@ -127,45 +211,91 @@ def get_product(asin):
         else:
             return jsonify({'error': 'Product not found'}), 404
     
+    total_sales, total_revenue = SalesRollup().get_totals(product_id=product.id)
+    
     return jsonify({
         'asin': product.asin,
         'title': product.title,
-        'total_sales': len(product.sales),
-        'total_revenue': sum(sale.revenue for sale in product.sales)
+        'total_sales': total_sales,
+        'total_revenue': total_revenue
     })
 
 @bp.route('/products/<int:product_id>/competitors', methods=['GET'])
+@response_cache.cached_product_response('competitors')
 def get_competitors(product_id):
     """Get competitor information for a product."""
     product = Product.query.get_or_404(product_id)
-    tracker = CompetitorTracker(AmazonSPAPIService({}))  # Pass your credentials here
+    tracker = CompetitorTracker(get_sp_api_service())
     
     # Get market position
     market_position = tracker.get_market_position(product_id)
     
     # Get price alerts
-    alerts = tracker.get_price_alerts(product_id)
+    alerts = tracker.get_price_alerts(
+        product_id,
+        threshold=request.args.get('threshold', type=float),
+        lookback_hours=request.args.get('lookback_hours', type=int)
+    )
     
-    # Get price history
-    history = tracker.get_price_history(product_id)
+    # Get the newest page of price history; the cursor continues with older prices
+    history_query, sort_columns = tracker.price_history_query(product_id, descending=True)
+    history, next_cursor = keyset_page(history_query, sort_columns, None, page_size(), descending=True)
     
     return jsonify({
         'market_position': market_position,
         'alerts': alerts,
-        'history': [{
-            'competitor_asin': p.competitor_asin,
-            'price': p.price,
-            'timestamp': p.timestamp.isoformat(),
-            'is_prime': p.is_prime,
-            'is_fba': p.is_fba
-        } for p in history]
+        'history': [_price_json(p) for p in history],
+        'history_next_cursor': next_cursor
     })
 
+@bp.route('/products/<int:product_id>/competitors/history', methods=['GET'])
+def get_competitor_history(product_id):
+    """Page or stream through a product's competitor price history, oldest first unless order=desc."""
+    Product.query.get_or_404(product_id)
+    tracker = CompetitorTracker(get_sp_api_service())
+    descending = request.args.get('order', 'asc') == 'desc'
+    history, sort_columns = tracker.price_history_query(
+        product_id,
+        days=request.args.get('days', 30, type=int),
+        descending=descending
+    )
+    
+    if request.args.get('stream'):
+        return ndjson_response(_price_json(p) for p in history.yield_per(current_app.config['API_PAGE_SIZE']))
+    
+    try:
+        history, next_cursor = keyset_page(
+            history,
+            sort_columns,
+            request.args.get('cursor'),
+            page_size(),
+            descending
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'history': [_price_json(p) for p in history],
+        'next_cursor': next_cursor
+    })
+
+def _price_json(price):
+    return {
+        'competitor_asin': price.competitor_asin,
+        'marketplace': price.marketplace,
+        'price': price.price,
+        'timestamp': price.timestamp.isoformat(),
+        'is_prime': price.is_prime,
+        'is_fba': price.is_fba,
+        'resolution': price.resolution
+    }
+
 @bp.route('/products/<int:product_id>/profit', methods=['GET'])
+@response_cache.cached_product_response('profit')
 def get_profit_analysis(product_id):
     """Get profit analysis for a product."""
     product = Product.query.get_or_404(product_id)
-    calculator = ProfitCalculator(AmazonSPAPIService({}))  # Pass your credentials here
+    calculator = ProfitCalculator(get_sp_api_service())
     
     # Get profit trends
     trends = calculator.get_profit_trends(product_id)
@@ -185,10 +315,11 @@ def get_profit_analysis(product_id):
     })
 
 @bp.route('/products/<int:product_id>/keywords', methods=['GET'])
+@response_cache.cached_product_response('keywords')
 def get_keyword_analysis(product_id):
     """Get keyword analysis for a product."""
     product = Product.query.get_or_404(product_id)
-    tracker = KeywordTracker(AmazonSPAPIService({}))  # Pass your credentials here
+    tracker = KeywordTracker(get_sp_api_service())
     
     # Get keyword trends
     trends = tracker.get_keyword_trends(product_id)
@@ -223,25 +354,48 @@ def get_keyword_analysis(product_id):
         'health': health
     })
 
+@bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Get hit and miss counters for the response cache."""
+    return jsonify(response_cache.stats())
+
 @bp.route('/products/<int:product_id>/track', methods=['POST'])
 def track_product(product_id):
     """Start tracking a product's competitors, profits, and keywords."""
     product = Product.query.get_or_404(product_id)
     
-    # Initialize services
-    sp_api = AmazonSPAPIService({})  # Pass your credentials here
-    competitor_tracker = CompetitorTracker(sp_api)
-    profit_calculator = ProfitCalculator(sp_api)
-    keyword_tracker = KeywordTracker(sp_api)
+    # Track everything, with the three pipelines running concurrently
+    results = _tracking_json(track_products([product.id]), product.id)
     
-    # Track everything
-    competitor_success = competitor_tracker.track_competitor_prices(product)
-    profit_success = profit_calculator.calculate_profit_margin(product) is not None
-    keyword_success = keyword_tracker.track_keyword_performance(product)
+    return jsonify({
+        'success': all(results.values()),
+        **results
+    })
+
+@bp.route('/products/track', methods=['POST'])
+def track_products_bulk():
+    """Track competitors, profits, and keywords for a list of products."""
+    data = request.get_json() or {}
+    product_ids = data.get('product_ids')
+    
+    if not isinstance(product_ids, list) or not all(isinstance(i, int) for i in product_ids):
+        return jsonify({'error': 'product_ids must be a list of product ids'}), 400
+    if len(product_ids) > current_app.config['TRACKING_BATCH_SIZE']:
+        return jsonify({'error': f"At most {current_app.config['TRACKING_BATCH_SIZE']} products can be tracked per request"}), 400
+    
+    found = [row.id for row in db.session.query(Product.id).filter(Product.id.in_(product_ids)).all()]
+    results = track_products(found) if found else {}
+    products = {str(product_id): _tracking_json(results, product_id) for product_id in found}
     
     return jsonify({
-        'success': all([competitor_success, profit_success, keyword_success]),
-        'competitor_tracking': competitor_success,
-        'profit_tracking': profit_success,
-        'keyword_tracking': keyword_success
-    }) 
\ No newline at end of file
+        'success': bool(found) and all(all(r.values()) for r in products.values()),
+        'products': products,
+        'not_found': sorted(set(product_ids) - set(found))
+    })
+
+def _tracking_json(results, product_id):
+    return {
+        'competitor_tracking': results['prices'][product_id],
+        'profit_tracking': results['profit'][product_id],
+        'keyword_tracking': results['keywords'][product_id]
+    }
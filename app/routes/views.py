@@ -1,29 +1,43 @@
-from flask import Blueprint, render_template
-from ..models import Product, Sale, Report
+from flask import Blueprint, abort, render_template, request, url_for
+from ..models import Product
+from ..services.amazon_sp_api import MARKETPLACE_CURRENCIES
+from ..services.report_listing import report_list_query
+from ..services.sales_rollup import SalesRollup
+from ..utils.pagination import keyset_page, page_size
 from datetime import datetime, timedelta
 
 bp = Blueprint('views', __name__)
 
 @bp.route('/')
 def index():
-    # Get summary statistics
+    # Get summary statistics per marketplace from the per-marketplace sales rollup, with revenue for the last 30 days
     total_products = Product.query.count()
-    total_sales = Sale.query.count()
+    thirty_days_ago = datetime.now().date() - timedelta(days=30)
+    marketplace_totals = SalesRollup().get_marketplace_totals(recent_since=thirty_days_ago)
+    total_sales = sum(row.units for row in marketplace_totals)
     
-    # Get sales for the last 30 days
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    recent_sales = Sale.query.filter(Sale.date >= thirty_days_ago).all()
-    total_revenue = sum(sale.revenue for sale in recent_sales)
+    # Revenue is only summed within a currency
+    revenue_by_currency = {}
+    for row in marketplace_totals:
+        currency = MARKETPLACE_CURRENCIES.get(row.marketplace, 'Unknown')
+        revenue_by_currency[currency] = revenue_by_currency.get(currency, 0.0) + row.recent_revenue
     
     return render_template('index.html',
                          total_products=total_products,
                          total_sales=total_sales,
-                         total_revenue=total_revenue)
+                         revenue_by_currency=revenue_by_currency,
+                         marketplace_totals=marketplace_totals,
+                         marketplace_currencies=MARKETPLACE_CURRENCIES)
 
 @bp.route('/reports')
 def reports():
-    reports = Report.query.order_by(Report.created_at.desc()).all()
-    return render_template('reports.html', reports=reports)
+    try:
+        query, sort_columns, descending = report_list_query(request.args)
+        reports, next_cursor = keyset_page(query, sort_columns, request.args.get('cursor'), page_size(), descending)
+    except ValueError:
+        abort(400)
+    next_url = url_for('views.reports', **{**request.args.to_dict(), 'cursor': next_cursor}) if next_cursor else None
+    return render_template('reports.html', reports=reports, next_url=next_url)
 
 @bp.route('/products')
 def products():
@@ -1,33 +1,119 @@
 from sp_api.api import Reports, Orders, Catalog, Products
 from sp_api.base import Marketplaces
+from sp_api.base.exceptions import SellingApiBadRequestException, SellingApiNotFoundException
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from flask import current_app
-import pandas as pd
+import logging
+import threading
 import json
 from app import db
 from app.models import Product, Sale, Report
+from app.utils.bulk import chunked
+from app.utils.data_processing import open_text_stream
+from .rate_limiter import get_rate_limiter
+from .sp_api_clients import http_session, registry
+
+REPORT_DOWNLOAD_TIMEOUT = 60  # seconds to wait for each chunk of a report document
+COMPETITIVE_PRICING_BATCH_SIZE = 20  # maximum ASINs per getCompetitivePricing request
+KEYWORD_PERFORMANCE_BATCH_SIZE = 100  # (ASIN, keyword) pairs per keyword performance request
+
+# Currency each marketplace's prices and sales are in, by marketplace ID
+MARKETPLACE_CURRENCIES = {Marketplaces[code].marketplace_id: currency for code, currency in {
+    'US': 'USD', 'CA': 'CAD', 'MX': 'MXN', 'BR': 'BRL',
+    'GB': 'GBP', 'DE': 'EUR', 'FR': 'EUR', 'IT': 'EUR', 'ES': 'EUR', 'NL': 'EUR', 'BE': 'EUR', 'IE': 'EUR',
+    'SE': 'SEK', 'PL': 'PLN', 'TR': 'TRY', 'AE': 'AED', 'SA': 'SAR', 'EG': 'EGP', 'IN': 'INR', 'ZA': 'ZAR',
+    'JP': 'JPY', 'AU': 'AUD', 'SG': 'SGD',
+}.items()}
+
+logger = logging.getLogger(__name__)
+
+_services = {}
+_services_lock = threading.Lock()
+
+def credentials_from_config():
+    """SP-API credentials from the app configuration."""
+    return {
+        'refresh_token': current_app.config['AMAZON_REFRESH_TOKEN'],
+        'lwa_app_id': current_app.config['AMAZON_CLIENT_ID'],
+        'lwa_client_secret': current_app.config['AMAZON_CLIENT_SECRET'],
+        'aws_access_key': current_app.config['AMAZON_AWS_ACCESS_KEY'],
+        'aws_secret_key': current_app.config['AMAZON_AWS_SECRET_KEY'],
+        'role_arn': current_app.config['AMAZON_ROLE_ARN'],
+    }
+
+def configured_marketplaces():
+    """The marketplaces to sell in: AMAZON_MARKETPLACES, else the one AMAZON_MARKETPLACE_ID names, else US."""
+    codes = current_app.config['AMAZON_MARKETPLACES']
+    if codes:
+        return [Marketplaces[code] for code in codes]
+    for marketplace in Marketplaces:
+        if marketplace.marketplace_id == current_app.config['AMAZON_MARKETPLACE_ID']:
+            return [marketplace]
+    return [Marketplaces.US]
+
+def get_sp_api_service(marketplace: Marketplaces = None):
+    """Return the shared service for a marketplace, the primary one by default, and the configured credentials."""
+    marketplace = marketplace or configured_marketplaces()[0]
+    credentials = credentials_from_config()
+    key = (marketplace, tuple(sorted(credentials.items(), key=lambda item: item[0])))
+    with _services_lock:
+        if key not in _services:
+            _services[key] = AmazonSPAPIService(credentials, marketplace)
+        return _services[key]
+
+def for_each_marketplace(fn):
+    """Call fn(service) for every configured marketplace concurrently, returning {marketplace_id: result}.
+
+    Each call runs in its own thread and application context, and so with
+    its own database session.
+    """
+    services = [get_sp_api_service(marketplace) for marketplace in configured_marketplaces()]
+    if len(services) == 1:
+        return {services[0].marketplace_id: fn(services[0])}
+
+    app = current_app._get_current_object()
+
+    def run(service):
+        with app.app_context():
+            return fn(service)
+
+    with ThreadPoolExecutor(max_workers=len(services)) as executor:
+        return dict(zip([service.marketplace_id for service in services], executor.map(run, services)))
 
 class AmazonSPAPIService:
-    def __init__(self):
-        self.credentials = {
-            'refresh_token': current_app.config['AMAZON_REFRESH_TOKEN'],
-            'lwa_app_id': current_app.config['AMAZON_CLIENT_ID'],
-            'lwa_client_secret': current_app.config['AMAZON_CLIENT_SECRET'],
-            'aws_access_key': current_app.config['AMAZON_AWS_ACCESS_KEY'],
-            'aws_secret_key': current_app.config['AMAZON_AWS_SECRET_KEY'],
-            'role_arn': current_app.config['AMAZON_ROLE_ARN'],
-        }
-        self.marketplace_id = current_app.config['AMAZON_MARKETPLACE_ID']
-        self.reports_api = Reports(credentials=self.credentials)
-        self.orders_api = Orders(credentials=self.credentials)
-        self.catalog_api = Catalog(credentials=self.credentials)
-        self.marketplace = Marketplaces.US  # Default to US marketplace
+    def __init__(self, credentials: dict = None, marketplace: Marketplaces = None):
+        self.credentials = credentials or credentials_from_config()
+        # The marketplace decides the regional endpoint the clients call
+        self.marketplace = marketplace or configured_marketplaces()[0]
+        self.marketplace_id = self.marketplace.marketplace_id
+        self.rate_limiter = get_rate_limiter(self.marketplace.name)
+
+    # Clients come from the process-wide registry, so credentials and LWA tokens are set up once
+    @property
+    def reports_api(self):
+        return registry.client(Reports, self.credentials, self.marketplace)
+
+    @property
+    def orders_api(self):
+        return registry.client(Orders, self.credentials, self.marketplace)
+
+    @property
+    def catalog_api(self):
+        return registry.client(Catalog, self.credentials, self.marketplace)
+
+    @property
+    def products_api(self):
+        return registry.client(Products, self.credentials, self.marketplace)
 
     def get_sales_report(self, start_date, end_date):
         """Fetch sales report for the specified date range"""
         try:
             report_type = 'GET_FLAT_FILE_OPEN_LISTINGS_DATA'
-            response = self.reports_api.create_report(
+            response = self.rate_limiter.call(
+                'createReport',
+                self.reports_api.create_report,
                 reportType=report_type,
                 dataStartTime=start_date,
                 dataEndTime=end_date,
@@ -42,7 +128,9 @@ class AmazonSPAPIService:
         """Fetch orders report for the specified date range"""
         try:
             report_type = 'GET_FLAT_FILE_OPEN_LISTINGS_DATA'
-            response = self.reports_api.create_report(
+            response = self.rate_limiter.call(
+                'createReport',
+                self.reports_api.create_report,
                 reportType=report_type,
                 dataStartTime=start_date,
                 dataEndTime=end_date,
@@ -57,7 +145,9 @@ class AmazonSPAPIService:
         """Fetch current inventory levels"""
         try:
             report_type = 'GET_FLAT_FILE_OPEN_LISTINGS_DATA'
-            response = self.reports_api.create_report(
+            response = self.rate_limiter.call(
+                'createReport',
+                self.reports_api.create_report,
                 reportType=report_type,
                 marketplaceIds=[self.marketplace_id]
             )
@@ -69,55 +159,86 @@ class AmazonSPAPIService:
     def get_report_document(self, report_document_id):
         """Fetch the actual report document using the report document ID"""
         try:
-            response = self.reports_api.get_report_document(report_document_id)
+            response = self.rate_limiter.call('getReportDocument', self.reports_api.get_report_document, report_document_id)
             return response.payload
         except Exception as e:
             current_app.logger.error(f"Error fetching report document: {str(e)}")
             return None
 
+    @contextmanager
+    def stream_report_document(self, report_document_id):
+        """Open a report document as a text stream that is downloaded and decompressed lazily"""
+        document = self.rate_limiter.call(
+            'getReportDocument', self.reports_api.get_report_document, report_document_id
+        ).payload
+        response = http_session.get(document['url'], stream=True, timeout=REPORT_DOWNLOAD_TIMEOUT)
+        try:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            stream = open_text_stream(
+                response.raw,
+                compression=document.get('compressionAlgorithm'),
+                encoding=response.encoding or 'iso-8859-1'
+            )
+            yield stream
+        finally:
+            response.close()
+
     def get_product_details(self, asin):
         """Fetch product details using the Catalog API"""
         try:
-            response = self.catalog_api.get_catalog_item(asin)
-            return response.payload
+            return self.fetch_product_details(asin)
         except Exception as e:
             current_app.logger.error(f"Error fetching product details: {str(e)}")
             return None
 
+    def fetch_product_details(self, asin):
+        """Fetch product details, returning None for an unknown ASIN and raising on any other error"""
+        try:
+            response = self.rate_limiter.call('getCatalogItem', self.catalog_api.get_catalog_item, asin)
+        except (SellingApiNotFoundException, SellingApiBadRequestException):
+            return None
+        return response.payload
+
     def get_recent_orders(self, days=30):
-        """Fetch recent orders"""
+        """Fetch all orders created in the last days days, across every page"""
         try:
             start_date = datetime.utcnow() - timedelta(days=days)
-            response = self.orders_api.get_orders(
-                CreatedAfter=start_date.isoformat(),
-                MarketplaceIds=[self.marketplace_id]
-            )
-            return response.payload
+            orders = []
+            for page in self.iter_order_pages(CreatedAfter=start_date.isoformat()):
+                orders.extend(page)
+            return {'Orders': orders}
         except Exception as e:
             current_app.logger.error(f"Error fetching recent orders: {str(e)}")
             return None
 
-    def process_sales_data(self, report_data):
-        """Process sales report data into a structured format"""
-        try:
-            # Convert report data to DataFrame
-            df = pd.DataFrame(report_data)
-            
-            # Group by date and calculate metrics
-            daily_sales = df.groupby('date').agg({
-                'quantity': 'sum',
-                'revenue': 'sum'
-            }).reset_index()
-            
-            return daily_sales.to_dict('records')
-        except Exception as e:
-            current_app.logger.error(f"Error processing sales data: {str(e)}")
-            return None
+    def iter_order_pages(self, **params):
+        """Yield each page of orders matching the getOrders params, following NextToken; raises on error"""
+        params = dict(params, MarketplaceIds=[self.marketplace_id])
+        while True:
+            payload = self.rate_limiter.call('getOrders', self.orders_api.get_orders, **params).payload or {}
+            yield payload.get('Orders', [])
+            next_token = payload.get('NextToken')
+            if not next_token:
+                return
+            params = {'NextToken': next_token, 'MarketplaceIds': [self.marketplace_id]}
+
+    def fetch_order_items(self, order_id: str):
+        """Fetch every item of an order, following NextToken; raises on error"""
+        items = []
+        params = {}
+        while True:
+            response = self.rate_limiter.call('getOrderItems', self.orders_api.get_order_items, order_id, **params)
+            payload = response.payload or {}
+            items.extend(payload.get('OrderItems', []))
+            if not payload.get('NextToken'):
+                return items
+            params = {'NextToken': payload['NextToken']}
 
     def get_report_status(self, report_id):
         """Check the status of a report"""
         try:
-            response = self.reports_api.get_report(report_id)
+            response = self.rate_limiter.call('getReport', self.reports_api.get_report, report_id)
             return response.payload
         except Exception as e:
             current_app.logger.error(f"Error checking report status: {str(e)}")
@@ -134,7 +255,7 @@ class AmazonSPAPIService:
             if processing_statuses:
                 params['processingStatuses'] = processing_statuses
 
-            response = self.reports_api.get_reports(**params)
+            response = self.rate_limiter.call('getReports', self.reports_api.get_reports, **params)
             return response.payload
         except Exception as e:
             current_app.logger.error(f"Error listing reports: {str(e)}")
@@ -142,46 +263,86 @@ class AmazonSPAPIService:
 
     def get_competing_offers(self, asin: str):
         """Get competing offers for a product."""
+        offers, _ = self.get_competing_offers_batch([asin])
+        return offers.get(asin, [])
+
+    def get_competing_offers_batch(self, asins: list):
+        """Get competing offers for many products, as many ASINs per call as the API allows.
+
+        Batches are requested concurrently within the pricing rate limit.
+        Returns ({asin: offers}, [ASINs whose batch failed]).
+        """
+        offers, failed = {}, []
+        batches = list(chunked(asins, COMPETITIVE_PRICING_BATCH_SIZE))
+        for batch, batch_offers in zip(batches, self.rate_limiter.map(self._get_competing_offers_page, batches)):
+            if batch_offers is None:
+                failed.extend(batch)
+                continue
+            for asin, asin_offers in batch_offers.items():
+                offers.setdefault(asin, []).extend(asin_offers)
+        return offers, failed
+
+    def _get_competing_offers_page(self, asins: list):
+        """Get competing offers for a single batch of ASINs, or None if the request failed."""
         try:
-            products_api = Products(credentials=self.credentials, marketplace=self.marketplace)
-            response = products_api.get_competitive_pricing_for_asin(asin)
-            
-            if not response.payload:
-                return []
-
-            offers = []
-            for item in response.payload:
-                if 'Product' in item and 'CompetitivePricing' in item['Product']:
-                    for offer in item['Product']['CompetitivePricing'].get('CompetitivePrices', []):
-                        if 'Price' in offer:
-                            offers.append({
-                                'asin': item['Product']['Identifiers']['MarketplaceASIN']['ASIN'],
-                                'price': float(offer['Price']['LandedPrice']['Amount']),
-                                'shipping_price': float(offer['Price'].get('Shipping', {}).get('Amount', 0)),
-                                'is_prime': offer.get('condition', '') == 'New',
-                                'is_fba': 'FBA' in offer.get('fulfillmentChannel', ''),
-                                'condition': offer.get('condition', 'New')
-                            })
-            return offers
+            response = self.rate_limiter.call(
+                'getCompetitivePricing', self.products_api.get_competitive_pricing_for_asins, asins
+            )
+            return self._parse_competitive_pricing(response.payload or [])
         except Exception as e:
-            print(f"Error getting competing offers: {str(e)}")
-            return []
+            current_app.logger.error(f"Error getting competing offers for {len(asins)} ASINs: {str(e)}")
+            return None
+
+    def _parse_competitive_pricing(self, payload):
+        """Group competitive pricing offers in a pricing payload by ASIN."""
+        offers = {}
+        for item in payload:
+            if 'Product' in item and 'CompetitivePricing' in item['Product']:
+                asin = item['Product']['Identifiers']['MarketplaceASIN']['ASIN']
+                for offer in item['Product']['CompetitivePricing'].get('CompetitivePrices', []):
+                    if 'Price' in offer:
+                        offers.setdefault(asin, []).append({
+                            'asin': asin,
+                            'price': float(offer['Price']['LandedPrice']['Amount']),
+                            'shipping_price': float(offer['Price'].get('Shipping', {}).get('Amount', 0)),
+                            'is_prime': offer.get('condition', '') == 'New',
+                            'is_fba': 'FBA' in offer.get('fulfillmentChannel', ''),
+                            'condition': offer.get('condition', 'New')
+                        })
+        return offers
 
     def get_keyword_performance(self, asin: str, keyword: str):
         """Get keyword performance data for a product."""
+        return self.get_keyword_performance_batch([(asin, keyword)]).get((asin, keyword), {})
+
+    def get_keyword_performance_batch(self, pairs: list):
+        """Get performance data for many (asin, keyword) pairs, returning {(asin, keyword): metrics}.
+
+        Pairs are requested in batches of KEYWORD_PERFORMANCE_BATCH_SIZE, concurrently.
+        """
+        performance = {}
+        batches = list(chunked(pairs, KEYWORD_PERFORMANCE_BATCH_SIZE))
+        for batch_performance in self.rate_limiter.map(self._get_keyword_performance_page, batches):
+            performance.update(batch_performance)
+        return performance
+
+    def _get_keyword_performance_page(self, pairs: list):
+        """Get keyword performance data for a single batch of (asin, keyword) pairs."""
         try:
-            # This would typically use Amazon's Advertising API
+            # This would typically be one Amazon Advertising API report request per batch
             # For now, we'll simulate the data
             return {
-                'rank': self._simulate_rank(),
-                'impressions': self._simulate_impressions(),
-                'clicks': self._simulate_clicks(),
-                'conversions': self._simulate_conversions(),
-                'ctr': self._simulate_ctr(),
-                'acos': self._simulate_acos()
+                (asin, keyword): {
+                    'rank': self._simulate_rank(),
+                    'impressions': self._simulate_impressions(),
+                    'clicks': self._simulate_clicks(),
+                    'conversions': self._simulate_conversions(),
+                    'ctr': self._simulate_ctr(),
+                    'acos': self._simulate_acos()
+                } for asin, keyword in pairs
             }
         except Exception as e:
-            print(f"Error getting keyword performance: {str(e)}")
+            logger.exception(f"Error getting keyword performance for {len(pairs)} keywords: {str(e)}")
             return {}
 
     def _simulate_rank(self):
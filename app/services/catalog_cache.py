@@ -0,0 +1,137 @@
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models import CatalogItem
+from app.utils.bulk import bulk_upsert, chunked
+from app.utils.cache import MemoryCacheBackend
+from .amazon_sp_api import AmazonSPAPIService
+
+# Returned by _fetch when the Catalog API call failed, so the failure isn't cached
+FETCH_FAILED = object()
+
+_memory = None
+_memory_lock = threading.Lock()
+
+class CatalogCache:
+    """Catalog API details cached in memory and in the CatalogItem table.
+
+    Each field has its own TTL, so a lookup that only needs slow-changing
+    fields like the title can use details too old to trust for the price.
+    ASINs Amazon doesn't know are remembered for CATALOG_NOT_FOUND_TTL.
+    """
+    def __init__(self, sp_api_service: AmazonSPAPIService):
+        self.sp_api = sp_api_service
+        self.memory = get_memory_cache()
+        self.details_ttl = current_app.config['CATALOG_DETAILS_TTL']
+        self.field_ttls = current_app.config['CATALOG_FIELD_TTLS']
+        self.not_found_ttl = current_app.config['CATALOG_NOT_FOUND_TTL']
+
+    def get_details(self, asin: str, fields: list = None):
+        """Return catalog details for an ASIN, or None if it is unknown or can't be fetched.
+
+        fields names the fields the caller needs, which decides how old the
+        cached details may be; None requires every field to be fresh.
+        """
+        return self.get_details_batch([asin], fields)[asin]
+
+    def get_details_batch(self, asins: list, fields: list = None):
+        """Return {asin: details or None}, fetching only ASINs with no fresh cached details."""
+        details, stale = self._lookup(asins, self._max_age(fields))
+        if stale:
+            details.update(self._refresh(stale))
+        return details
+
+    def warm(self, asins: list, batch_size: int = 500):
+        """Fetch details for every ASIN whose cached details are stale, returning the number fetched."""
+        fetched = 0
+        for batch in chunked(asins, batch_size):
+            _, stale = self._lookup(batch, self._max_age(None))
+            if stale:
+                self._refresh(stale)
+                fetched += len(stale)
+        return fetched
+
+    def _lookup(self, asins: list, max_age: int):
+        """Split ASINs into ({asin: fresh cached details}, [ASINs to fetch]), checking memory then the table."""
+        now = datetime.utcnow()
+        details = {}
+        missing = []
+        for asin in dict.fromkeys(asins):
+            entry = self.memory.get(asin)
+            if entry is not None and self._is_fresh(entry, max_age, now):
+                details[asin] = entry[0]
+            else:
+                missing.append(asin)
+
+        stale = []
+        for batch in chunked(missing, current_app.config['BULK_INSERT_BATCH_SIZE']):
+            stored = {item.asin: item for item in CatalogItem.query.filter(CatalogItem.asin.in_(batch)).all()}
+            for asin in batch:
+                item = stored.get(asin)
+                entry = (item.payload, item.found, item.fetched_at) if item else None
+                if entry is not None and self._is_fresh(entry, max_age, now):
+                    self._remember(asin, entry)
+                    details[asin] = entry[0]
+                else:
+                    stale.append(asin)
+        return details, stale
+
+    def _refresh(self, asins: list):
+        """Fetch details from the Catalog API and store them, skipping failed calls."""
+        results = self.sp_api.rate_limiter.map(self._fetch, asins)
+
+        fetched_at = datetime.utcnow()
+        rows = [{
+            'asin': asin,
+            'payload': payload,
+            'found': payload is not None,
+            'fetched_at': fetched_at
+        } for asin, payload in zip(asins, results) if payload is not FETCH_FAILED]
+
+        try:
+            bulk_upsert(
+                CatalogItem,
+                rows,
+                index_elements=['asin'],
+                update_columns=['payload', 'found', 'fetched_at'],
+                batch_size=current_app.config['BULK_INSERT_BATCH_SIZE']
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error caching catalog details: {str(e)}")
+
+        for row in rows:
+            self._remember(row['asin'], (row['payload'], row['found'], fetched_at))
+        return {asin: None if payload is FETCH_FAILED else payload for asin, payload in zip(asins, results)}
+
+    def _fetch(self, asin: str):
+        try:
+            return self.sp_api.fetch_product_details(asin)
+        except Exception as e:
+            current_app.logger.error(f"Error fetching product details for {asin}: {str(e)}")
+            return FETCH_FAILED
+
+    def _remember(self, asin, entry):
+        self.memory.set(asin, entry, self.details_ttl if entry[1] else self.not_found_ttl)
+
+    def _max_age(self, fields):
+        """The age in seconds beyond which cached details are too old for the requested fields."""
+        if fields is None:
+            return min([self.details_ttl, *self.field_ttls.values()])
+        return min(self.field_ttls.get(field, self.details_ttl) for field in fields)
+
+    def _is_fresh(self, entry, max_age: int, now: datetime):
+        payload, found, fetched_at = entry
+        if not found:
+            max_age = self.not_found_ttl
+        return fetched_at + timedelta(seconds=max_age) > now
+
+def get_memory_cache():
+    """Return the process-wide in-memory LRU in front of the CatalogItem table."""
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = MemoryCacheBackend(current_app.config['CATALOG_CACHE_MAX_ENTRIES'])
+        return _memory
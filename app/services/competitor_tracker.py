@@ -1,7 +1,19 @@
 from datetime import datetime, timedelta
-from app import db
-from app.models import Product, CompetitorPrice
-from app.services.amazon_sp_api import AmazonSPAPIService
+from flask import current_app
+import logging
+import threading
+from sqlalchemy import and_, bindparam, case, func, insert, literal
+from app import db, response_cache
+from app.models import Product, CompetitorPrice, CompetitorPriceRollup
+from app.services.amazon_sp_api import MARKETPLACE_CURRENCIES, AmazonSPAPIService
+from app.utils.aggregates import count_if, mean
+from app.utils.bulk import chunked
+from app.utils.cache import MemoryCacheBackend
+
+# Offer fields whose change is stored as a new price row in change-only storage
+OFFER_STATE_COLUMNS = ('price', 'shipping_price', 'is_prime', 'is_fba', 'condition')
+
+logger = logging.getLogger(__name__)
 
 class CompetitorTracker:
     def __init__(self, sp_api_service: AmazonSPAPIService):
@@ -9,93 +21,361 @@ class CompetitorTracker:
 
     def track_competitor_prices(self, product: Product):
         """Track prices of competing products for a given ASIN."""
+        return product.id in (self.track_catalog_prices([product]) or set())
+
+    def track_catalog_prices(self, products: list):
+        """Track competitor prices for many products with batched API calls and bulk writes.
+
+        Returns the ids of the products whose prices were fetched and stored,
+        leaving out those whose pricing request failed, or None on error.
+        """
         try:
             # Get competing products from Amazon's API
-            competitors = self.sp_api.get_competing_offers(product.asin)
+            offers, failed_asins = self.sp_api.get_competing_offers_batch([product.asin for product in products])
+            failed_asins = set(failed_asins)
+            products = [product for product in products if product.asin not in failed_asins]
             
-            for competitor in competitors:
-                price = CompetitorPrice(
-                    product_id=product.id,
-                    competitor_asin=competitor['asin'],
-                    price=competitor['price'],
-                    shipping_price=competitor.get('shipping_price', 0.0),
-                    is_prime=competitor.get('is_prime', False),
-                    is_fba=competitor.get('is_fba', False),
-                    condition=competitor.get('condition', 'New')
-                )
-                db.session.add(price)
+            timestamp = datetime.utcnow()
+            rows = [{
+                'product_id': product.id,
+                'competitor_asin': competitor['asin'],
+                'marketplace': self.sp_api.marketplace_id,
+                'price': competitor['price'],
+                'shipping_price': competitor.get('shipping_price', 0.0),
+                'is_prime': competitor.get('is_prime', False),
+                'is_fba': competitor.get('is_fba', False),
+                'condition': competitor.get('condition', 'New'),
+                'timestamp': timestamp,
+                'last_seen_at': timestamp
+            } for product in products for competitor in offers.get(product.asin, [])]
+            # A stable order within each poll, so the newest row per competitor doesn't depend on API ordering
+            rows.sort(key=lambda row: (row['product_id'], row['competitor_asin'], _offer_state(row)))
             
-            db.session.commit()
-            return True
+            if current_app.config['COMPETITOR_PRICE_STORAGE'] == 'changes':
+                changed = self._store_price_changes(rows, timestamp)
+            else:
+                changed = {row['product_id'] for row in rows}
+                if rows:
+                    db.session.execute(insert(CompetitorPrice), rows)
+                db.session.commit()
+
+            for product_id in changed:
+                response_cache.invalidate_product(product_id)
+            return {product.id for product in products}
         except Exception as e:
             db.session.rollback()
-            print(f"Error tracking competitor prices: {str(e)}")
-            return False
+            logger.exception(f"Error tracking competitor prices: {str(e)}")
+            return None
+
+    def _store_price_changes(self, rows: list, timestamp: datetime):
+        """Store only competitors whose offers changed, extending the intervals of the rest.
+
+        Each row is valid from its timestamp until valid_to, and last_seen_at
+        records the last poll that saw it. Offers are compared per competitor
+        against the last known state in this marketplace cached in memory, so
+        unchanged polls need no reads. Returns the ids of products whose
+        prices changed.
+        """
+        marketplace = self.sp_api.marketplace_id
+        polled = {}
+        for row in rows:
+            polled.setdefault((row['product_id'], row['competitor_asin']), []).append(row)
+
+        states = get_price_states()
+        for attempt in range(2):
+            known = states.load(marketplace, {product_id for product_id, _ in polled})
+            touched, closed, inserted = [], [], []
+            for (product_id, competitor_asin), offers in polled.items():
+                current = known[product_id].get(competitor_asin)
+                if current and current[1] == [_offer_state(offer) for offer in offers]:
+                    touched.extend(current[0])
+                else:
+                    closed.extend(current[0] if current else [])
+                    inserted.extend(offers)
+
+            if self._extend_intervals(touched, closed, timestamp):
+                break
+            # Another process changed these products' prices; reload their state from the database
+            db.session.rollback()
+            states.forget(marketplace, known)
+        else:
+            raise RuntimeError('Competitor price state changed during tracking')
+
+        self._insert_prices(inserted)
+        db.session.commit()
+
+        states.update(marketplace, known, polled, inserted)
+        return {row['product_id'] for row in inserted}
+
+    def _insert_prices(self, rows: list):
+        """Insert price rows, setting the id of each row."""
+        if not rows:
+            return
+        if db.session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+            row_ids = db.session.execute(
+                insert(CompetitorPrice).returning(CompetitorPrice.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+        else:
+            # MySQL returns no ids from a multi-row insert; only changed offers get here, so insert them one by one
+            table = CompetitorPrice.__table__
+            row_ids = [db.session.execute(insert(table), row).inserted_primary_key[0] for row in rows]
+        for row, row_id in zip(rows, row_ids):
+            row['id'] = row_id
+
+    def _extend_intervals(self, touched: list, closed: list, timestamp: datetime):
+        """Mark unchanged rows as seen and end the intervals of changed ones.
+
+        Returns False if any row was already closed, meaning the cached state is stale.
+        """
+        table = CompetitorPrice.__table__
+        updates = [
+            (touched, {'last_seen_at': timestamp, 'sample_count': table.c.sample_count + 1}),
+            (closed, {'valid_to': timestamp}),
+        ]
+        for row_ids, values in updates:
+            if not row_ids:
+                continue
+            result = db.session.execute(
+                table.update().where(table.c.id == bindparam('row_id'), table.c.valid_to.is_(None)).values(**values),
+                [{'row_id': row_id} for row_id in row_ids]
+            )
+            if db.session.get_bind().dialect.supports_sane_multi_rowcount and result.rowcount != len(row_ids):
+                return False
+        return True
 
     def get_price_history(self, product_id: int, days: int = 30):
         """Get price history for a product's competitors."""
+        query, _ = self.price_history_query(product_id, days)
+        return query.all()
+
+    def price_history_query(self, product_id: int, days: int = 30, descending: bool = False):
+        """Query a product's competitor price history, oldest first unless descending, with the columns it is sorted by.
+
+        Recent history comes from the raw prices. Older history that has been
+        downsampled comes from the hourly rollups, or from the daily rollups
+        when the range reaches beyond the hourly retention window. Rollups
+        report each bucket's closing price at the bucket start.
+        """
         start_date = datetime.utcnow() - timedelta(days=days)
-        return CompetitorPrice.query.filter(
+        resolution = 'hour' if days <= current_app.config['COMPETITOR_PRICE_HOURLY_RETENTION_DAYS'] else 'day'
+
+        raw = db.session.query(
+            CompetitorPrice.id.label('id'),
+            CompetitorPrice.competitor_asin.label('competitor_asin'),
+            CompetitorPrice.marketplace.label('marketplace'),
+            CompetitorPrice.price.label('price'),
+            CompetitorPrice.timestamp.label('timestamp'),
+            CompetitorPrice.is_prime.label('is_prime'),
+            CompetitorPrice.is_fba.label('is_fba'),
+            literal('raw').label('resolution')
+        ).filter(
             CompetitorPrice.product_id == product_id,
-            CompetitorPrice.timestamp >= start_date
-        ).order_by(CompetitorPrice.timestamp).all()
+            CompetitorPrice.last_seen_at >= start_date
+        )
+        rollups = db.session.query(
+            CompetitorPriceRollup.id,
+            CompetitorPriceRollup.competitor_asin,
+            CompetitorPriceRollup.marketplace,
+            CompetitorPriceRollup.close_price,
+            CompetitorPriceRollup.bucket_start,
+            CompetitorPriceRollup.is_prime,
+            CompetitorPriceRollup.is_fba,
+            literal(resolution)
+        ).filter(
+            CompetitorPriceRollup.product_id == product_id,
+            CompetitorPriceRollup.resolution == resolution,
+            # Include the bucket containing the start of the range
+            CompetitorPriceRollup.bucket_start >= start_date - timedelta(**{f'{resolution}s': 1})
+        )
 
-    def get_price_alerts(self, product_id: int, threshold: float = 0.1):
-        """Get alerts for significant price changes."""
-        # Get the latest prices
-        latest_prices = db.session.query(
-            CompetitorPrice.competitor_asin,
-            CompetitorPrice.price
+        # Raw prices and rollups never cover the same time, so (timestamp, id) stays unique
+        history = raw.union_all(rollups).subquery('price_history')
+        sort_columns = [history.c.timestamp, history.c.id]
+        order_by = [column.desc() if descending else column for column in sort_columns]
+        return db.session.query(history).order_by(*order_by), sort_columns
+
+    def get_price_alerts(self, product_id: int, threshold: float = None, lookback_hours: int = None):
+        """Get alerts for significant price changes, comparing each competitor's
+        latest price with its last price before the lookback cutoff."""
+        if threshold is None:
+            threshold = current_app.config['PRICE_ALERT_THRESHOLD']
+        if lookback_hours is None:
+            lookback_hours = current_app.config['PRICE_ALERT_LOOKBACK_HOURS']
+        cutoff = datetime.utcnow() - timedelta(hours=lookback_hours)
+
+        # A competitor with no price since the cutoff can't have changed price
+        latest = self._ranked_prices(product_id, CompetitorPrice.last_seen_at >= cutoff).subquery('latest')
+        previous = self._ranked_prices(product_id, CompetitorPrice.timestamp < cutoff).subquery('previous')
+        price_change = (latest.c.price - previous.c.price) / previous.c.price
+
+        changes = db.session.query(
+            latest.c.competitor_asin,
+            latest.c.marketplace,
+            price_change.label('price_change'),
+            previous.c.price,
+            latest.c.price
+        ).join(
+            previous, and_(
+                previous.c.competitor_asin == latest.c.competitor_asin,
+                previous.c.marketplace == latest.c.marketplace
+            )
         ).filter(
-            CompetitorPrice.product_id == product_id
+            latest.c.row_number == 1,
+            previous.c.row_number == 1,
+            previous.c.price > 0,
+            func.abs(price_change) >= threshold
         ).order_by(
-            CompetitorPrice.timestamp.desc()
+            func.abs(price_change).desc()
         ).all()
 
-        # Get previous prices
-        previous_prices = db.session.query(
+        return [{
+            'competitor_asin': competitor_asin,
+            'marketplace': marketplace,
+            'price_change': change,
+            'old_price': old_price,
+            'new_price': new_price
+        } for competitor_asin, marketplace, change, old_price, new_price in changes]
+
+    def _ranked_prices(self, product_id: int, *filters):
+        """Competitor prices numbered from newest to oldest per competitor ASIN and marketplace."""
+        return db.session.query(
             CompetitorPrice.competitor_asin,
-            CompetitorPrice.price
+            CompetitorPrice.marketplace,
+            CompetitorPrice.price,
+            func.row_number().over(
+                partition_by=(CompetitorPrice.marketplace, CompetitorPrice.competitor_asin),
+                order_by=(CompetitorPrice.timestamp.desc(), CompetitorPrice.id.desc())
+            ).label('row_number')
         ).filter(
             CompetitorPrice.product_id == product_id,
-            CompetitorPrice.timestamp < datetime.utcnow() - timedelta(hours=24)
-        ).order_by(
-            CompetitorPrice.timestamp.desc()
-        ).all()
-
-        alerts = []
-        for latest, previous in zip(latest_prices, previous_prices):
-            if latest[0] == previous[0]:  # Same competitor
-                price_change = (latest[1] - previous[1]) / previous[1]
-                if abs(price_change) >= threshold:
-                    alerts.append({
-                        'competitor_asin': latest[0],
-                        'price_change': price_change,
-                        'old_price': previous[1],
-                        'new_price': latest[1]
-                    })
-
-        return alerts
+            *filters
+        )
 
     def get_market_position(self, product_id: int):
-        """Analyze product's position in the market based on competitor prices."""
-        latest_prices = CompetitorPrice.query.filter(
+        """Analyze product's position in each marketplace based on competitor prices.
+
+        Returns {marketplace: position} with the prices in the marketplace's
+        currency, as prices in different currencies can't be compared. The
+        price range covers every price seen in the last 24 hours; the average
+        and count cover the offers of the marketplace's latest poll, i.e.
+        every row last seen at its latest last_seen_at, which dense and
+        change-only storage both record.
+        """
+        recent = (
             CompetitorPrice.product_id == product_id,
-            CompetitorPrice.timestamp >= datetime.utcnow() - timedelta(hours=24)
-        ).all()
+            CompetitorPrice.last_seen_at >= datetime.utcnow() - timedelta(hours=24)
+        )
+        latest_polls = db.session.query(
+            CompetitorPrice.marketplace,
+            func.max(CompetitorPrice.last_seen_at).label('last_seen_at')
+        ).filter(*recent).group_by(CompetitorPrice.marketplace).subquery()
+        is_latest = CompetitorPrice.last_seen_at == latest_polls.c.last_seen_at
+        positions = db.session.query(
+            CompetitorPrice.marketplace,
+            count_if(is_latest).label('count'),
+            func.sum(case((is_latest, CompetitorPrice.price))).label('total_price'),
+            func.min(CompetitorPrice.price).label('min_price'),
+            func.max(CompetitorPrice.price).label('max_price')
+        ).join(
+            latest_polls, latest_polls.c.marketplace == CompetitorPrice.marketplace
+        ).filter(*recent).group_by(CompetitorPrice.marketplace).order_by(CompetitorPrice.marketplace).all()
 
-        if not latest_prices:
-            return None
+        return {
+            position.marketplace: {
+                'currency': MARKETPLACE_CURRENCIES.get(position.marketplace),
+                'average_market_price': mean(position.total_price, position.count),
+                'lowest_price': position.min_price,
+                'highest_price': position.max_price,
+                'price_range': position.max_price - position.min_price,
+                'competitor_count': position.count
+            }
+            for position in positions
+        }
 
-        prices = [p.price for p in latest_prices]
-        avg_price = sum(prices) / len(prices)
-        min_price = min(prices)
-        max_price = max(prices)
+class PriceStateCache:
+    """Last known offers per marketplace and product, as {competitor_asin: ([open row ids], [offer states])}."""
+    def __init__(self, max_entries: int):
+        self.memory = MemoryCacheBackend(max_entries)
 
-        return {
-            'average_market_price': avg_price,
-            'lowest_price': min_price,
-            'highest_price': max_price,
-            'price_range': max_price - min_price,
-            'competitor_count': len(prices)
-        } 
\ No newline at end of file
+    def load(self, marketplace: str, product_ids: set):
+        """Return the known state of each product in a marketplace, reading only uncached products from the database."""
+        states = {}
+        for product_id in product_ids:
+            state = self.memory.get((marketplace, product_id))
+            if state is not None:
+                states[product_id] = state
+
+        missing = [product_id for product_id in product_ids if product_id not in states]
+        # Rows not seen within the raw retention window are due for compaction and can't be extended
+        seen_since = datetime.utcnow() - timedelta(days=current_app.config['COMPETITOR_PRICE_RAW_RETENTION_DAYS'])
+        for batch in chunked(missing, current_app.config['BULK_INSERT_BATCH_SIZE']):
+            open_rows = CompetitorPrice.query.filter(
+                CompetitorPrice.product_id.in_(batch),
+                CompetitorPrice.marketplace == marketplace,
+                CompetitorPrice.valid_to.is_(None),
+                CompetitorPrice.last_seen_at >= seen_since
+            ).order_by(CompetitorPrice.product_id, CompetitorPrice.competitor_asin, CompetitorPrice.id).all()
+
+            offers = {}
+            for row in open_rows:
+                offers.setdefault((row.product_id, row.competitor_asin), []).append(row)
+            for product_id in batch:
+                states[product_id] = {}
+            for (product_id, competitor_asin), competitor_rows in offers.items():
+                # Only the most recent poll is current, e.g. for rows stored before change-only storage
+                last_seen_at = max(row.last_seen_at for row in competitor_rows)
+                current = [row for row in competitor_rows if row.last_seen_at == last_seen_at]
+                states[product_id][competitor_asin] = (
+                    [row.id for row in current],
+                    [_offer_state({column: getattr(row, column) for column in OFFER_STATE_COLUMNS}) for row in current]
+                )
+        return states
+
+    def update(self, marketplace: str, known: dict, polled: dict, inserted: list):
+        """Store the state after a poll, replacing competitors whose offers were inserted."""
+        changed = {}
+        for offer in inserted:
+            changed.setdefault((offer['product_id'], offer['competitor_asin']), []).append(offer)
+        for product_id, state in known.items():
+            state = dict(state)
+            for (changed_product_id, competitor_asin), offers in changed.items():
+                if changed_product_id == product_id:
+                    state[competitor_asin] = ([offer['id'] for offer in offers], [_offer_state(offer) for offer in offers])
+            self.memory.set((marketplace, product_id), state)
+
+    def forget(self, marketplace: str, product_ids):
+        """Drop cached state so it is reloaded from the database."""
+        for product_id in product_ids:
+            self.memory.delete((marketplace, product_id))
+
+_price_states = None
+_price_states_lock = threading.Lock()
+
+def get_price_states():
+    """Return the process-wide cache of last known competitor offers."""
+    global _price_states
+    with _price_states_lock:
+        if _price_states is None:
+            _price_states = PriceStateCache(current_app.config['COMPETITOR_PRICE_STATE_CACHE_SIZE'])
+        return _price_states
+
+def backfill_last_seen_at(batch_size: int):
+    """Set last_seen_at from timestamp on prices stored before it existed, returning the number of rows updated.
+
+    Queries filter on last_seen_at, so until then those rows are left out of every answer.
+    """
+    table = CompetitorPrice.__table__
+    updated = 0
+    while True:
+        row_ids = [row.id for row in db.session.query(CompetitorPrice.id).filter(
+            CompetitorPrice.last_seen_at.is_(None),
+            CompetitorPrice.timestamp.isnot(None)
+        ).limit(batch_size).all()]
+        if not row_ids:
+            return updated
+        db.session.execute(table.update().where(table.c.id.in_(row_ids)).values(last_seen_at=table.c.timestamp))
+        db.session.commit()
+        updated += len(row_ids)
+
+def _offer_state(offer: dict):
+    return tuple(offer[column] for column in OFFER_STATE_COLUMNS)
@@ -0,0 +1,116 @@
+import operator
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from app.models import KeywordPerformance
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+}
+
+# Each rule matches rows meeting all of its conditions; matches are ranked by the score column
+DEFAULT_RULES = [
+    {
+        'type': 'low_ctr',
+        'conditions': [['impressions', '>', 1000], ['ctr', '<', 0.01]],
+        'score': 'impressions',
+        'suggestion': 'Optimize listing for better click-through rate'
+    },
+    {
+        'type': 'low_conversion',
+        'conditions': [['clicks', '>', 100], ['conversions', '<', 5]],
+        'score': 'clicks',
+        'suggestion': 'Review pricing and listing content'
+    },
+    {
+        'type': 'high_acos',
+        'conditions': [['acos', '>', 0.3]],
+        'score': 'acos',
+        'suggestion': 'Consider adjusting bid strategy'
+    },
+    {
+        'type': 'rank_drop',
+        'conditions': [['rank_drop', '>=', 10]],
+        'score': 'rank_drop',
+        'suggestion': 'Search rank is falling; review bids and listing relevance'
+    },
+]
+
+PERFORMANCE_COLUMNS = ['product_id', 'keyword', 'date', 'search_rank', 'impressions', 'clicks', 'conversions', 'ctr', 'acos']
+
+class KeywordOpportunityEngine:
+    """Evaluates keyword opportunity rules over the whole catalog with array operations."""
+    def __init__(self, rules: list = None):
+        self.rules = rules or current_app.config['KEYWORD_OPPORTUNITY_RULES'] or DEFAULT_RULES
+
+    def load_performance(self, days: int = 30, product_ids: list = None):
+        """Load recent keyword performance into a DataFrame with one query, adding rank_drop."""
+        stmt = select(*[getattr(KeywordPerformance, column) for column in PERFORMANCE_COLUMNS]).where(
+            KeywordPerformance.date >= datetime.utcnow().date() - timedelta(days=days)
+        )
+        if product_ids is not None:
+            stmt = stmt.where(KeywordPerformance.product_id.in_(product_ids))
+
+        df = pd.DataFrame(db.session.execute(stmt).all(), columns=PERFORMANCE_COLUMNS)
+        df = df.sort_values(['product_id', 'keyword', 'date'], ignore_index=True)
+        for column in ('impressions', 'clicks', 'conversions'):
+            df[column] = df[column].fillna(0).astype(np.int64)
+        for column in ('search_rank', 'ctr', 'acos'):
+            df[column] = df[column].astype(np.float64)
+
+        # Positions lost since the keyword's previous observation; ranks count up from 1
+        previous_rank = df.groupby(['product_id', 'keyword'])['search_rank'].shift()
+        df['rank_drop'] = (df['search_rank'] - previous_rank).fillna(0.0)
+        return df
+
+    def evaluate(self, df: pd.DataFrame, latest_only: bool = True):
+        """Apply every rule to the performance frame, returning matches ranked by score.
+
+        With latest_only, only each keyword's most recent observation is
+        considered. score is the match's percentile within its rule, so rules
+        with differently scaled score columns rank against each other.
+        """
+        if latest_only:
+            df = df.drop_duplicates(['product_id', 'keyword'], keep='last')
+
+        matches = []
+        for rule in self.rules:
+            mask = np.ones(len(df), dtype=bool)
+            for column, op, value in rule['conditions']:
+                mask &= OPERATORS[op](df[column].to_numpy(), value)
+            if not mask.any():
+                continue
+
+            matched = df.loc[mask, ['product_id', 'keyword', 'date', rule['score']]].rename(columns={rule['score']: 'value'})
+            matched['type'] = rule['type']
+            matched['suggestion'] = rule['suggestion']
+            matched['score'] = matched['value'].rank(pct=True)
+            matches.append(matched)
+
+        if not matches:
+            return pd.DataFrame(columns=['product_id', 'keyword', 'date', 'type', 'suggestion', 'value', 'score'])
+        return pd.concat(matches, ignore_index=True).sort_values(
+            ['score', 'value'], ascending=False, ignore_index=True
+        )[['product_id', 'keyword', 'date', 'type', 'suggestion', 'value', 'score']]
+
+    def get_opportunities(self, days: int = 30, product_ids: list = None, limit: int = None):
+        """Ranked keyword opportunities across the catalog as a list of dicts."""
+        ranked = self.evaluate(self.load_performance(days, product_ids))
+        if limit:
+            ranked = ranked.head(limit)
+        return [{
+            'product_id': int(row.product_id),
+            'keyword': row.keyword,
+            'date': row.date.isoformat(),
+            'type': row.type,
+            'suggestion': row.suggestion,
+            'value': float(row.value),
+            'score': float(row.score)
+        } for row in ranked.itertuples(index=False)]
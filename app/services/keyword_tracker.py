@@ -1,7 +1,12 @@
 from datetime import datetime, timedelta
-from app import db
+from flask import current_app
+from sqlalchemy import func
+from app import db, response_cache
 from app.models import Product, KeywordPerformance
 from app.services.amazon_sp_api import AmazonSPAPIService
+from app.utils.aggregates import aggregate_metrics, count, count_distinct, mean
+from app.utils.bulk import bulk_upsert
+from app.utils.keywords import extract_keywords, normalize_keyword
 
 class KeywordTracker:
     def __init__(self, sp_api_service: AmazonSPAPIService):
@@ -9,50 +14,72 @@ class KeywordTracker:
 
     def track_keyword_performance(self, product: Product, keywords: list = None):
         """Track performance of keywords for a product."""
-        try:
-            if keywords is None:
-                # Get keywords from product title and description
-                keywords = self._extract_keywords(product)
-
-            for keyword in keywords:
-                # Get keyword performance data from Amazon
-                performance_data = self.sp_api.get_keyword_performance(
-                    product.asin,
-                    keyword
-                )
-
-                # Create keyword performance record
-                keyword_perf = KeywordPerformance(
-                    product_id=product.id,
-                    keyword=keyword,
-                    search_rank=performance_data.get('rank'),
-                    impressions=performance_data.get('impressions', 0),
-                    clicks=performance_data.get('clicks', 0),
-                    conversions=performance_data.get('conversions', 0),
-                    ctr=performance_data.get('ctr', 0.0),
-                    acos=performance_data.get('acos', 0.0),
-                    date=datetime.utcnow().date()
-                )
-
-                db.session.add(keyword_perf)
+        return self.track_catalog_keywords([product], keywords) is not None
+
+    def track_catalog_keywords(self, products: list, keywords: list = None):
+        """Track keyword performance for many products with batched API calls and a bulk upsert.
 
+        keywords defaults to those extracted from each product's title. Rows
+        are keyed on (product, keyword, date), so repeat runs on the same day
+        update that day's rows. Returns the number of rows stored, or None on error.
+        """
+        try:
+            if keywords is not None:
+                keywords = list(dict.fromkeys(filter(None, map(normalize_keyword, keywords))))
+            product_keywords = {
+                product.id: keywords if keywords is not None else self._extract_keywords(product)
+                for product in products
+            }
+
+            # Get keyword performance data from Amazon for every product at once
+            performance = self.sp_api.get_keyword_performance_batch([
+                (product.asin, keyword) for product in products for keyword in product_keywords[product.id]
+            ])
+
+            today = datetime.utcnow().date()
+            rows = []
+            for product in products:
+                for keyword in product_keywords[product.id]:
+                    performance_data = performance.get((product.asin, keyword))
+                    if not performance_data:
+                        continue
+                    rows.append({
+                        'product_id': product.id,
+                        'keyword': keyword,
+                        'search_rank': performance_data.get('rank'),
+                        'impressions': performance_data.get('impressions', 0),
+                        'clicks': performance_data.get('clicks', 0),
+                        'conversions': performance_data.get('conversions', 0),
+                        'ctr': performance_data.get('ctr', 0.0),
+                        'acos': performance_data.get('acos', 0.0),
+                        'date': today,
+                        'created_at': datetime.utcnow()
+                    })
+
+            bulk_upsert(
+                KeywordPerformance,
+                rows,
+                index_elements=['product_id', 'keyword', 'date'],
+                update_columns=['search_rank', 'impressions', 'clicks', 'conversions', 'ctr', 'acos'],
+                batch_size=current_app.config['BULK_INSERT_BATCH_SIZE']
+            )
             db.session.commit()
-            return True
+            for product_id in {row['product_id'] for row in rows}:
+                response_cache.invalidate_product(product_id)
+            return len(rows)
 
         except Exception as e:
             db.session.rollback()
             print(f"Error tracking keyword performance: {str(e)}")
-            return False
+            return None
 
     def _extract_keywords(self, product: Product):
-        """Extract keywords from product title and description."""
-        # This is a simplified version. In practice, you'd want to:
-        # 1. Use NLP to extract meaningful keywords
-        # 2. Remove stop words
-        # 3. Consider product category-specific terms
-        # 4. Include variations and synonyms
-        words = product.title.lower().split()
-        return list(set(words))  # Remove duplicates
+        """Extract search keywords and phrases from the product title, without stop words or punctuation."""
+        return extract_keywords(
+            product.title,
+            max_ngram=current_app.config['KEYWORD_MAX_NGRAM'],
+            max_keywords=current_app.config['KEYWORD_MAX_PER_PRODUCT']
+        )
 
     def get_keyword_trends(self, product_id: int, days: int = 30):
         """Get keyword performance trends over time."""
@@ -121,18 +148,27 @@ class KeywordTracker:
 
     def get_keyword_health(self, product_id: int):
         """Get overall keyword health metrics."""
-        recent_performance = KeywordPerformance.query.filter(
-            KeywordPerformance.product_id == product_id,
-            KeywordPerformance.date >= datetime.utcnow().date() - timedelta(days=30)
-        ).all()
-
-        if not recent_performance:
+        recent_performance = aggregate_metrics(
+            KeywordPerformance,
+            [
+                KeywordPerformance.product_id == product_id,
+                KeywordPerformance.date >= datetime.utcnow().date() - timedelta(days=30)
+            ],
+            count=count(),
+            total_keywords=count_distinct(KeywordPerformance.keyword),
+            total_rank=func.sum(KeywordPerformance.search_rank),
+            total_impressions=func.sum(KeywordPerformance.impressions),
+            total_ctr=func.sum(KeywordPerformance.ctr),
+            total_acos=func.sum(KeywordPerformance.acos)
+        )
+
+        if not recent_performance.count:
             return None
 
         return {
-            'total_keywords': len(set(p.keyword for p in recent_performance)),
-            'average_rank': sum(p.search_rank for p in recent_performance) / len(recent_performance),
-            'total_impressions': sum(p.impressions for p in recent_performance),
-            'average_ctr': sum(p.ctr for p in recent_performance) / len(recent_performance),
-            'average_acos': sum(p.acos for p in recent_performance) / len(recent_performance)
+            'total_keywords': recent_performance.total_keywords,
+            'average_rank': mean(recent_performance.total_rank, recent_performance.count),
+            'total_impressions': recent_performance.total_impressions,
+            'average_ctr': mean(recent_performance.total_ctr, recent_performance.count),
+            'average_acos': mean(recent_performance.total_acos, recent_performance.count)
         } 
\ No newline at end of file
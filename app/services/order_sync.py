@@ -0,0 +1,195 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from app import db
+from app.models import Order, OrderItem, Product, SyncCheckpoint
+from app.utils.bulk import bulk_upsert, chunked
+from .amazon_sp_api import AmazonSPAPIService
+
+# getOrders only accepts a LastUpdatedBefore at least this long before the request
+ORDERS_API_LAG = timedelta(minutes=2)
+ORDER_UPDATE_COLUMNS = [
+    'marketplace', 'purchase_date', 'last_update_date', 'order_status',
+    'fulfillment_channel', 'order_total', 'currency', 'items_synced_at'
+]
+ORDER_ITEM_UPDATE_COLUMNS = [
+    'product_id', 'asin', 'seller_sku', 'title', 'quantity_ordered',
+    'quantity_shipped', 'item_price', 'item_tax', 'promotion_discount'
+]
+
+# Returned by _fetch_items when getOrderItems failed, so the order is retried next sync
+FETCH_FAILED = object()
+
+class OrderSync:
+    """Incrementally syncs orders and their items from the Orders API.
+
+    Each run asks for orders updated since the stored high-water mark,
+    following NextToken across every page, and advances the mark only once
+    all pages are stored, so a failed run is simply repeated. Stored orders
+    have their items fetched concurrently within the getOrderItems rate
+    limit; orders whose items failed to fetch are retried on the next run.
+    """
+    SYNC_TYPE = 'orders'
+
+    def __init__(self, sp_api_service: AmazonSPAPIService):
+        self.sp_api = sp_api_service
+        self.marketplace = sp_api_service.marketplace_id
+        self.batch_size = current_app.config['ORDER_SYNC_BATCH_SIZE']
+
+    def sync(self, now: datetime = None):
+        """Sync orders updated since the last run and their items, returning counts or None on error."""
+        try:
+            updated_before = (now or datetime.utcnow()) - ORDERS_API_LAG
+            updated_after = self._updated_after(updated_before)
+
+            orders = 0
+            for page in self.sp_api.iter_order_pages(
+                LastUpdatedAfter=_iso(updated_after),
+                LastUpdatedBefore=_iso(updated_before)
+            ):
+                orders += self._store_orders(page)
+                db.session.commit()
+
+            self._save_checkpoint(updated_before)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error syncing orders: {str(e)}")
+            return None
+
+        items, failed = self.sync_items()
+        return {
+            'orders': orders,
+            'order_items': items,
+            'failed_orders': failed,
+            'high_water_mark': updated_before
+        }
+
+    def sync_items(self):
+        """Fetch the items of every order still waiting for them, returning (items stored, orders failed)."""
+        stored = failed = 0
+        last_id = 0
+        while True:
+            orders = db.session.query(Order.id, Order.amazon_order_id).filter(
+                Order.items_synced_at.is_(None),
+                Order.id > last_id
+            ).order_by(Order.id).limit(self.batch_size).all()
+            if not orders:
+                return stored, failed
+            last_id = orders[-1].id
+
+            fetched_at = datetime.utcnow()
+            results = self.sp_api.rate_limiter.map(self._fetch_items, [order.amazon_order_id for order in orders])
+            synced = [(order.id, items) for order, items in zip(orders, results) if items is not FETCH_FAILED]
+            failed += len(orders) - len(synced)
+            try:
+                stored += self._store_items(synced)
+                Order.query.filter(Order.id.in_([order_id for order_id, _ in synced])).update(
+                    {'items_synced_at': fetched_at}, synchronize_session=False
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Error storing order items: {str(e)}")
+                failed += len(synced)
+
+    def _updated_after(self, updated_before: datetime):
+        """Start of the window to sync: the high-water mark less an overlap, or the initial history."""
+        checkpoint = SyncCheckpoint.query.filter_by(sync_type=self.SYNC_TYPE, marketplace=self.marketplace).first()
+        if checkpoint is None:
+            return updated_before - timedelta(days=current_app.config['ORDER_SYNC_INITIAL_DAYS'])
+        # Amazon can report an update a little after it happened, so re-read the end of the last window
+        return checkpoint.high_water_mark - timedelta(seconds=current_app.config['ORDER_SYNC_OVERLAP'])
+
+    def _save_checkpoint(self, high_water_mark: datetime):
+        bulk_upsert(
+            SyncCheckpoint,
+            [{
+                'sync_type': self.SYNC_TYPE,
+                'marketplace': self.marketplace,
+                'high_water_mark': high_water_mark,
+                'updated_at': datetime.utcnow()
+            }],
+            index_elements=['sync_type', 'marketplace'],
+            update_columns=['high_water_mark', 'updated_at']
+        )
+
+    def _store_orders(self, orders: list):
+        """Upsert a page of orders, marking their items for refetching."""
+        rows = [{
+            'amazon_order_id': order['AmazonOrderId'],
+            'marketplace': order.get('MarketplaceId') or self.marketplace,
+            'purchase_date': _parse_datetime(order['PurchaseDate']),
+            'last_update_date': _parse_datetime(order['LastUpdateDate']),
+            'order_status': order.get('OrderStatus', 'Unknown'),
+            'fulfillment_channel': order.get('FulfillmentChannel'),
+            'order_total': _amount(order.get('OrderTotal')),
+            'currency': (order.get('OrderTotal') or {}).get('CurrencyCode'),
+            'items_synced_at': None
+        } for order in orders]
+        return bulk_upsert(
+            Order,
+            rows,
+            index_elements=['amazon_order_id'],
+            update_columns=ORDER_UPDATE_COLUMNS,
+            batch_size=current_app.config['BULK_INSERT_BATCH_SIZE']
+        )
+
+    def _store_items(self, synced: list):
+        """Replace the items of (order id, items) pairs, deleting stored items Amazon no longer returns."""
+        batch_size = current_app.config['BULK_INSERT_BATCH_SIZE']
+        fetched = {(order_id, item['OrderItemId']) for order_id, items in synced for item in items}
+        for batch in chunked([order_id for order_id, _ in synced], batch_size):
+            stored = db.session.query(OrderItem.id, OrderItem.order_id, OrderItem.order_item_id).filter(
+                OrderItem.order_id.in_(batch)
+            ).all()
+            stale = [row.id for row in stored if (row.order_id, row.order_item_id) not in fetched]
+            if stale:
+                OrderItem.query.filter(OrderItem.id.in_(stale)).delete(synchronize_session=False)
+
+        asins = {item['ASIN'] for _, items in synced for item in items}
+        product_ids = {}
+        for batch in chunked(asins, batch_size):
+            product_ids.update(db.session.query(Product.asin, Product.id).filter(Product.asin.in_(batch)).all())
+
+        rows = [{
+            'order_id': order_id,
+            'order_item_id': item['OrderItemId'],
+            'product_id': product_ids.get(item['ASIN']),
+            'asin': item['ASIN'],
+            'seller_sku': item.get('SellerSKU'),
+            'title': item.get('Title'),
+            'quantity_ordered': int(item.get('QuantityOrdered') or 0),
+            'quantity_shipped': int(item.get('QuantityShipped') or 0),
+            'item_price': _amount(item.get('ItemPrice')),
+            'item_tax': _amount(item.get('ItemTax')),
+            'promotion_discount': _amount(item.get('PromotionDiscount'))
+        } for order_id, items in synced for item in items]
+        return bulk_upsert(
+            OrderItem,
+            rows,
+            index_elements=['order_id', 'order_item_id'],
+            update_columns=ORDER_ITEM_UPDATE_COLUMNS,
+            batch_size=batch_size
+        )
+
+    def _fetch_items(self, amazon_order_id: str):
+        try:
+            return self.sp_api.fetch_order_items(amazon_order_id)
+        except Exception as e:
+            current_app.logger.error(f"Error fetching items for order {amazon_order_id}: {str(e)}")
+            return FETCH_FAILED
+
+def _iso(value: datetime):
+    return value.replace(microsecond=0).isoformat() + 'Z'
+
+def _parse_datetime(value: str):
+    """Parse an ISO 8601 timestamp from the Orders API into a naive UTC datetime."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _amount(money: dict):
+    if not money or money.get('Amount') in (None, ''):
+        return None
+    return float(money['Amount'])
@@ -0,0 +1,237 @@
+import math
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+from flask import current_app
+from sqlalchemy import tuple_
+from app import db
+from app.models import CompetitorPrice, CompetitorPriceRollup
+from app.utils.bulk import bulk_upsert
+
+# pandas offset alias for each rollup resolution
+RESOLUTIONS = {'hour': 'h', 'day': 'D'}
+ROLLUP_KEY_COLUMNS = ['product_id', 'resolution', 'bucket_start', 'marketplace', 'competitor_asin']
+ARCHIVE_TMP_SUFFIX = '.tmp'
+
+class PriceRetention:
+    """Downsamples expired competitor prices into hourly and daily rollups and purges what has expired.
+
+    Raw rows last seen before the raw retention window, rounded down to
+    midnight, are merged into hour and day buckets and deleted in the same
+    transaction, a batch at a time, so every row is counted either raw or in
+    a rollup, never both. Hourly rollups are purged after the hourly retention window; daily
+    rollups are kept.
+    """
+    def __init__(self):
+        self.raw_retention = timedelta(days=current_app.config['COMPETITOR_PRICE_RAW_RETENTION_DAYS'])
+        self.hourly_retention = timedelta(days=current_app.config['COMPETITOR_PRICE_HOURLY_RETENTION_DAYS'])
+        self.batch_size = current_app.config['COMPETITOR_PRICE_PURGE_BATCH_SIZE']
+        self.archive = current_app.config['COMPETITOR_PRICE_ARCHIVE']
+
+    def raw_cutoff(self, now: datetime = None):
+        """Raw rows before this time are due for downsampling."""
+        now = now or datetime.utcnow()
+        return datetime.combine((now - self.raw_retention).date(), datetime.min.time())
+
+    def hourly_cutoff(self, now: datetime = None):
+        """Hourly rollups before this time are due for purging."""
+        now = now or datetime.utcnow()
+        return datetime.combine((now - self.hourly_retention).date(), datetime.min.time())
+
+    def compact(self, now: datetime = None):
+        """Downsample and purge expired history, returning counts of rows compacted and purged."""
+        cutoff = self.raw_cutoff(now)
+        product_ids = [row.product_id for row in db.session.query(CompetitorPrice.product_id).filter(
+            CompetitorPrice.last_seen_at < cutoff
+        ).distinct().all()]
+
+        compacted = 0
+        for product_id in product_ids:
+            compacted += self.compact_product(product_id, cutoff)
+
+        return {
+            'products': len(product_ids),
+            'raw_rows_compacted': compacted,
+            'hourly_rollups_purged': self.purge_hourly_rollups(self.hourly_cutoff(now))
+        }
+
+    def compact_product(self, product_id: int, cutoff: datetime):
+        """Roll up and delete one product's raw prices last seen before cutoff, returning the number compacted.
+
+        Rows are read a batch at a time in (timestamp, id) order, and each
+        batch is rolled up and deleted in its own transaction.
+        """
+        compacted = 0
+        last_key = None
+        while True:
+            query = db.session.query(
+                CompetitorPrice.id,
+                CompetitorPrice.competitor_asin,
+                CompetitorPrice.marketplace,
+                CompetitorPrice.price,
+                CompetitorPrice.shipping_price,
+                CompetitorPrice.is_prime,
+                CompetitorPrice.is_fba,
+                CompetitorPrice.condition,
+                CompetitorPrice.sample_count,
+                CompetitorPrice.timestamp,
+                CompetitorPrice.last_seen_at,
+                CompetitorPrice.valid_to
+            ).filter(
+                CompetitorPrice.product_id == product_id,
+                CompetitorPrice.last_seen_at < cutoff
+            )
+            if last_key:
+                query = query.filter(tuple_(CompetitorPrice.timestamp, CompetitorPrice.id) > tuple_(*last_key))
+            query = query.order_by(CompetitorPrice.timestamp, CompetitorPrice.id).limit(self.batch_size)
+            df = pd.DataFrame(query.all(), columns=[column['name'] for column in query.column_descriptions])
+            if df.empty or not self.compact_batch(df, product_id):
+                return compacted
+            compacted += len(df)
+            last_key = (df['timestamp'].iloc[-1].to_pydatetime(), int(df['id'].iloc[-1]))
+
+    def compact_batch(self, df: pd.DataFrame, product_id: int):
+        """Merge a batch of a product's raw prices into its rollups and delete them, returning True once committed.
+
+        With archiving on, the rows are written to temporary archive files
+        that are only renamed into place after the commit, so a failed batch
+        is never archived twice.
+        """
+        archived = []
+        try:
+            for resolution in RESOLUTIONS:
+                bulk_upsert(
+                    CompetitorPriceRollup,
+                    self.downsample(df, product_id, resolution),
+                    index_elements=ROLLUP_KEY_COLUMNS,
+                    # Later rows of a bucket can be compacted in a later batch or run, e.g. an
+                    # interval still being extended by change-only storage, so merge into the bucket
+                    increment_columns=['sample_count'],
+                    greatest_columns=['high_price'],
+                    least_columns=['low_price'],
+                    latest_columns=['close_price', 'is_prime', 'is_fba'],
+                    latest_by='close_at',
+                    batch_size=current_app.config['BULK_INSERT_BATCH_SIZE']
+                )
+
+            if self.archive:
+                archived = self._archive(df, product_id)
+
+            CompetitorPrice.query.filter(CompetitorPrice.id.in_(df['id'].tolist())).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for tmp_path in archived:
+                os.remove(tmp_path)
+            current_app.logger.error(f"Error compacting competitor prices for product {product_id}: {str(e)}")
+            return False
+
+        for tmp_path in archived:
+            os.replace(tmp_path, tmp_path[:-len(ARCHIVE_TMP_SUFFIX)])
+        return True
+
+    def downsample(self, df: pd.DataFrame, product_id: int, resolution: str):
+        """OHLC rollup rows per competitor, marketplace and bucket for raw prices.
+
+        A row stands for sample_count polls from its timestamp to its
+        last_seen_at. They are taken as evenly spaced and counted in every
+        bucket they fall in, as dense storage would have stored them.
+        """
+        samples = _bucket_samples(df, RESOLUTIONS[resolution])
+        keys = ['marketplace', 'competitor_asin', 'bucket_start']
+        rollups = samples.sort_values(['first_sample_at', 'id']).groupby(keys, as_index=False).agg(
+            open_price=('price', 'first'),
+            high_price=('price', 'max'),
+            low_price=('price', 'min'),
+            sample_count=('samples', 'sum')
+        ).merge(samples.sort_values(['last_sample_at', 'id']).groupby(keys, as_index=False).agg(
+            close_price=('price', 'last'),
+            close_at=('last_sample_at', 'last'),
+            is_prime=('is_prime', 'last'),
+            is_fba=('is_fba', 'last')
+        ), on=keys)
+        return [{
+            'product_id': product_id,
+            'resolution': resolution,
+            'competitor_asin': row.competitor_asin,
+            'marketplace': row.marketplace,
+            'bucket_start': row.bucket_start.to_pydatetime(),
+            'open_price': float(row.open_price),
+            'high_price': float(row.high_price),
+            'low_price': float(row.low_price),
+            'close_price': float(row.close_price),
+            'close_at': row.close_at.to_pydatetime(),
+            'sample_count': int(row.sample_count),
+            'is_prime': bool(row.is_prime),
+            'is_fba': bool(row.is_fba)
+        } for row in rollups.itertuples(index=False)]
+
+    def purge_hourly_rollups(self, cutoff: datetime):
+        """Delete hourly rollups older than cutoff in batches, returning the number deleted."""
+        purged = 0
+        while True:
+            ids = [row.id for row in db.session.query(CompetitorPriceRollup.id).filter(
+                CompetitorPriceRollup.resolution == 'hour',
+                CompetitorPriceRollup.bucket_start < cutoff
+            ).limit(self.batch_size).all()]
+            if not ids:
+                return purged
+            CompetitorPriceRollup.query.filter(CompetitorPriceRollup.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            purged += len(ids)
+
+    def _archive(self, df: pd.DataFrame, product_id: int):
+        """Write raw rows to temporary gzipped CSVs, one per month under the instance folder, returning their paths.
+
+        Each batch gets its own file in the month's folder once renamed, named
+        after the product and the batch's first row id. If any write fails,
+        the files already written are removed before the error is raised.
+        """
+        paths = []
+        try:
+            for month, rows in df.groupby(df['timestamp'].dt.strftime('%Y-%m')):
+                directory = os.path.join(current_app.instance_path, 'archive', 'competitor_prices', month)
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f"product-{product_id}-{int(rows['id'].iloc[0])}.csv.gz{ARCHIVE_TMP_SUFFIX}")
+                paths.append(path)
+                rows.assign(product_id=product_id).to_csv(path, index=False, compression='gzip')
+        except Exception:
+            # Leave nothing of a failed batch behind; the caller keeps its raw rows
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        return paths
+
+def _bucket_samples(df: pd.DataFrame, freq: str):
+    """One row per raw price and bucket its polls fall in, with the number of polls and the first and last poll time."""
+    records = [
+        (row.id, row.marketplace, row.competitor_asin, row.price, row.is_prime, row.is_fba,
+         bucket_start, samples, first_sample_at, last_sample_at)
+        for row in df.itertuples(index=False)
+        for bucket_start, samples, first_sample_at, last_sample_at in _poll_buckets(
+            row.timestamp, row.last_seen_at, int(row.sample_count), freq
+        )
+    ]
+    return pd.DataFrame(records, columns=[
+        'id', 'marketplace', 'competitor_asin', 'price', 'is_prime', 'is_fba',
+        'bucket_start', 'samples', 'first_sample_at', 'last_sample_at'
+    ])
+
+def _poll_buckets(start: pd.Timestamp, end: pd.Timestamp, count: int, freq: str):
+    """Split count polls spread evenly from start to end into (bucket_start, polls, first poll, last poll) per bucket."""
+    if count <= 1 or end <= start:
+        return [(start.floor(freq), max(count, 1), start, end)]
+
+    step = (end - start) / (count - 1)
+    width = pd.to_timedelta(1, unit=freq)
+    buckets = []
+    first = 0
+    while first < count:
+        first_at = start + first * step
+        bucket_start = first_at.floor(freq)
+        # Polls before the end of the bucket, skipping buckets no poll falls in
+        last = max(first, min(count - 1, math.ceil((bucket_start + width - start) / step) - 1))
+        buckets.append((bucket_start, last - first + 1, first_at, end if last == count - 1 else start + last * step))
+        first = last + 1
+    return buckets
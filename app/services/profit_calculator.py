@@ -1,11 +1,16 @@
 from datetime import datetime
-from app import db
+from flask import current_app
+from sqlalchemy import func
+from app import db, response_cache
 from app.models import Product, ProfitMargin, Sale
 from app.services.amazon_sp_api import AmazonSPAPIService
+from app.services.catalog_cache import CatalogCache
+from app.utils.aggregates import aggregate_metrics, count, mean
 
 class ProfitCalculator:
     def __init__(self, sp_api_service: AmazonSPAPIService):
         self.sp_api = sp_api_service
+        self.catalog = CatalogCache(sp_api_service)
 
     def calculate_profit_margin(self, product: Product, date: datetime = None):
         """Calculate profit margin for a product on a specific date."""
@@ -13,8 +18,8 @@ class ProfitCalculator:
             date = datetime.utcnow().date()
 
         try:
-            # Get product details from Amazon
-            product_details = self.sp_api.get_product_details(product.asin)
+            # Get product details from Amazon, cached
+            product_details = self.catalog.get_details(product.asin, fields=['price'])
             
             # Get sales data for the date
             sales = Sale.query.filter(
@@ -56,23 +61,24 @@ class ProfitCalculator:
             net_profit = total_revenue - total_costs
             margin_percentage = (net_profit / total_revenue * 100) if total_revenue > 0 else 0
 
-            # Create profit margin record
-            profit_margin = ProfitMargin(
-                product_id=product.id,
-                date=date,
-                selling_price=product_details.get('price', 0),
-                amazon_fees=amazon_fees,
-                shipping_cost=shipping_cost,
-                product_cost=product_cost,
-                storage_fees=storage_fees,
-                advertising_cost=advertising_cost,
-                returns_cost=returns_cost,
-                net_profit=net_profit,
-                margin_percentage=margin_percentage
-            )
+            # Create or update the profit margin record for the date
+            profit_margin = ProfitMargin.query.filter_by(product_id=product.id, date=date).first()
+            if profit_margin is None:
+                profit_margin = ProfitMargin(product_id=product.id, date=date)
+                db.session.add(profit_margin)
+
+            profit_margin.selling_price = product_details.get('price', 0)
+            profit_margin.amazon_fees = amazon_fees
+            profit_margin.shipping_cost = shipping_cost
+            profit_margin.product_cost = product_cost
+            profit_margin.storage_fees = storage_fees
+            profit_margin.advertising_cost = advertising_cost
+            profit_margin.returns_cost = returns_cost
+            profit_margin.net_profit = net_profit
+            profit_margin.margin_percentage = margin_percentage
 
-            db.session.add(profit_margin)
             db.session.commit()
+            response_cache.invalidate_product(product.id)
 
             return profit_margin
 
@@ -86,8 +92,8 @@ class ProfitCalculator:
         # This would need to be implemented based on Amazon's fee structure
         # For now, using a simplified calculation
         total_units = sum(sale.quantity for sale in sales)
-        referral_fee = product_details.get('price', 0) * 0.15  # 15% referral fee
-        fba_fee = 3.31  # Example FBA fee per unit
+        referral_fee = product_details.get('price', 0) * current_app.config['PROFIT_REFERRAL_FEE_RATE']
+        fba_fee = current_app.config['PROFIT_FBA_FEE_PER_UNIT']
         return (referral_fee + fba_fee) * total_units
 
     def _calculate_shipping_cost(self, product_details, sales):
@@ -95,7 +101,7 @@ class ProfitCalculator:
         # This would need to be implemented based on your shipping costs
         # For now, using a simplified calculation
         total_units = sum(sale.quantity for sale in sales)
-        return total_units * 2.50  # Example shipping cost per unit
+        return total_units * current_app.config['PROFIT_SHIPPING_COST_PER_UNIT']
 
     def _get_product_cost(self, product):
         """Get the cost of the product."""
@@ -131,17 +137,23 @@ class ProfitCalculator:
 
     def get_product_performance(self, product_id: int):
         """Get overall product performance metrics."""
-        margins = ProfitMargin.query.filter(
-            ProfitMargin.product_id == product_id
-        ).all()
-
-        if not margins:
+        margins = aggregate_metrics(
+            ProfitMargin,
+            [ProfitMargin.product_id == product_id],
+            count=count(),
+            total_margin=func.sum(ProfitMargin.margin_percentage),
+            highest_margin=func.max(ProfitMargin.margin_percentage),
+            lowest_margin=func.min(ProfitMargin.margin_percentage),
+            total_profit=func.sum(ProfitMargin.net_profit)
+        )
+
+        if not margins.count:
             return None
 
         return {
-            'average_margin': sum(m.margin_percentage for m in margins) / len(margins),
-            'highest_margin': max(m.margin_percentage for m in margins),
-            'lowest_margin': min(m.margin_percentage for m in margins),
-            'total_profit': sum(m.net_profit for m in margins),
-            'average_profit': sum(m.net_profit for m in margins) / len(margins)
+            'average_margin': mean(margins.total_margin, margins.count),
+            'highest_margin': margins.highest_margin,
+            'lowest_margin': margins.lowest_margin,
+            'total_profit': margins.total_profit,
+            'average_profit': mean(margins.total_profit, margins.count)
         } 
\ No newline at end of file
@@ -0,0 +1,132 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sp_api.base.exceptions import SellingApiRequestThrottledException
+
+# SP-API usage plans: (requests per second, burst) per operation
+OPERATION_RATE_LIMITS = {
+    'getOrders': (0.0167, 20),
+    'getOrderItems': (0.5, 30),
+    'createReport': (0.0167, 15),
+    'getReport': (2.0, 15),
+    'getReports': (0.0222, 10),
+    'getReportDocument': (0.0167, 15),
+    'getCatalogItem': (2.0, 2),
+    'getCompetitivePricing': (0.5, 1),
+}
+DEFAULT_RATE_LIMIT = (1.0, 1)
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request token is available and take it."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self, rate: float = None):
+        """Empty the bucket after a throttled call, optionally adopting the rate Amazon reported."""
+        with self.lock:
+            self._refill()
+            if rate:
+                self.rate = rate
+            self.tokens = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+class SPAPIRateLimiter:
+    def __init__(self, limits: dict = None, max_workers: int = 8, max_retries: int = 5, backoff: float = 1.0):
+        self.limits = dict(OPERATION_RATE_LIMITS, **(limits or {}))
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self._executor = None
+
+    def bucket(self, operation: str):
+        """Return the token bucket shared by all calls to an operation."""
+        with self.lock:
+            if operation not in self.buckets:
+                self.buckets[operation] = TokenBucket(*self.limits.get(operation, DEFAULT_RATE_LIMIT))
+            return self.buckets[operation]
+
+    def call(self, operation: str, fn, *args, **kwargs):
+        """Call fn within the operation's rate limit, retrying throttled calls with backoff."""
+        bucket = self.bucket(operation)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except SellingApiRequestThrottledException as e:
+                if attempt == self.max_retries:
+                    raise
+                bucket.drain(_reported_rate(e))
+                time.sleep(self.backoff * 2 ** attempt + random.uniform(0, self.backoff))
+
+    def map(self, fn, items):
+        """Call fn(item) for every item on the limiter's thread pool and return the results in order.
+
+        fn should make its SP-API requests through call(), which keeps the
+        concurrent requests within each operation's limit, and must not call
+        map() itself. Each call runs in its own application context. The pool
+        lives as long as the limiter, so its threads keep their SP-API
+        clients from one call to the next.
+        """
+        app = current_app._get_current_object()
+
+        def run(item):
+            with app.app_context():
+                return fn(item)
+
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        return list(self.executor().map(run, items))
+
+    def executor(self):
+        """Return the limiter's thread pool, starting it on first use."""
+        with self.lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sp-api')
+            return self._executor
+
+_rate_limiters = {}
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter(scope: str = None):
+    """Return the process-wide SP-API rate limiter for a scope, e.g. a marketplace.
+
+    Every service in a scope shares its buckets; each scope is limited separately.
+    """
+    with _rate_limiter_lock:
+        if scope not in _rate_limiters:
+            _rate_limiters[scope] = SPAPIRateLimiter(
+                max_workers=current_app.config['SP_API_MAX_WORKERS'],
+                max_retries=current_app.config['SP_API_MAX_RETRIES'],
+                backoff=current_app.config['SP_API_RETRY_BACKOFF']
+            )
+        return _rate_limiters[scope]
+
+def _reported_rate(error):
+    """Read the x-amzn-RateLimit-Limit header from a throttled response, if present."""
+    try:
+        return float((error.headers or {}).get('x-amzn-RateLimit-Limit'))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,159 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from flask import current_app
+from app import db
+from app.models import Report
+from .amazon_sp_api import AmazonSPAPIService, get_sp_api_service
+from .report_processor import ReportProcessor
+
+REPORT_DONE = 'DONE'
+REPORT_CANCELLED = 'CANCELLED'
+REPORT_FAILED_STATUSES = (REPORT_CANCELLED, 'FATAL')
+
+logger = logging.getLogger(__name__)
+
+# Application used by report worker processes, created once per process
+_worker_app = None
+
+class ReportJobError(Exception):
+    """Raised when a report job cannot be completed."""
+
+class ReportCancelledError(ReportJobError):
+    """Raised when Amazon cancels a report, which it does when the report has no data."""
+
+class ReportJobRunner:
+    def __init__(self, amazon_api: AmazonSPAPIService = None, report_processor: ReportProcessor = None):
+        self.amazon_api = amazon_api or get_sp_api_service()
+        self.report_processor = report_processor or ReportProcessor()
+        self.poll_interval = current_app.config['REPORT_POLL_INTERVAL']
+        self.poll_timeout = current_app.config['REPORT_POLL_TIMEOUT']
+
+    def run(self, report_id: int):
+        """Request, wait for and process a report, tracking its job state."""
+        report = db.session.get(Report, report_id)
+        if not report:
+            return False
+
+        report.status = 'running'
+        report.error = None
+        report.started_at = datetime.utcnow()
+        db.session.commit()
+
+        try:
+            if not report.amazon_report_id:
+                amazon_report = self._request_report(report)
+                if not amazon_report:
+                    raise ReportJobError('Failed to request report from Amazon')
+                report.amazon_report_id = amazon_report.get('reportId')
+                db.session.commit()
+
+            report_status = self.wait_for_report(report.amazon_report_id)
+            report.report_document_id = report_status.get('reportDocumentId')
+            db.session.commit()
+
+            if not self.report_processor.process_report(report.id):
+                raise ReportJobError('Failed to process report document')
+
+            report.status = 'done'
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error running report job {report_id}: {str(e)}")
+            report = db.session.get(Report, report_id)
+            report.status = 'failed'
+            report.error = str(e)
+
+        report.completed_at = datetime.utcnow()
+        db.session.commit()
+        return report.status == 'done'
+
+    def _request_report(self, report: Report):
+        """Ask Amazon to generate the report matching the job's type."""
+        if report.type == 'sales':
+            return self.amazon_api.get_sales_report(report.start_date, report.end_date)
+        elif report.type == 'orders':
+            return self.amazon_api.get_orders_report(report.start_date, report.end_date)
+        elif report.type == 'inventory':
+            return self.amazon_api.get_inventory_report()
+        raise ReportJobError(f"Invalid report type: {report.type}")
+
+    def wait_for_report(self, amazon_report_id: str):
+        """Poll the report status until Amazon has finished generating it."""
+        deadline = time.monotonic() + self.poll_timeout
+        while True:
+            report_status = self.amazon_api.get_report_status(amazon_report_id) or {}
+            processing_status = report_status.get('processingStatus')
+
+            if processing_status == REPORT_DONE:
+                return report_status
+            if processing_status == REPORT_CANCELLED:
+                raise ReportCancelledError(f"Amazon report {amazon_report_id} was cancelled")
+            if processing_status in REPORT_FAILED_STATUSES:
+                raise ReportJobError(f"Amazon report {amazon_report_id} finished with status {processing_status}")
+            if time.monotonic() >= deadline:
+                raise ReportJobError(f"Timed out waiting for Amazon report {amazon_report_id}")
+
+            time.sleep(self.poll_interval)
+
+class ReportJobQueue:
+    def __init__(self, max_workers: int):
+        # Workers build their own app and database engine, so don't inherit ours via fork
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+
+    def enqueue(self, report_id: int):
+        """Queue a report job for processing in a worker process."""
+        future = self.executor.submit(_run_report_job, report_id)
+        future.add_done_callback(partial(_handle_job_failure, current_app._get_current_object(), report_id))
+        return future
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes."""
+        self.executor.shutdown(wait=wait)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_report_queue():
+    """Return the process-wide report job queue, starting it on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ReportJobQueue(current_app.config['REPORT_WORKERS'])
+        return _queue
+
+def _init_worker():
+    """Create the application a report worker process runs jobs in."""
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app()
+
+def _run_report_job(report_id: int):
+    with _worker_app.app_context():
+        return ReportJobRunner().run(report_id)
+
+def _handle_job_failure(app, report_id: int, future):
+    """Mark a report failed when its worker crashed before recording the outcome."""
+    # Job errors are recorded on the report; this only catches a crashed or cancelled worker
+    error = 'Report job was cancelled' if future.cancelled() else future.exception()
+    if error is None:
+        return
+
+    logger.error(f"Report worker failed for report {report_id}: {str(error)}")
+    try:
+        with app.app_context():
+            report = db.session.get(Report, report_id)
+            if report and report.status in ('queued', 'running'):
+                report.status = 'failed'
+                report.error = f"Report worker failed: {str(error)}"
+                report.completed_at = datetime.utcnow()
+                db.session.commit()
+    except Exception as e:
+        logger.error(f"Error marking report {report_id} failed: {str(e)}")
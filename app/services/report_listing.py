@@ -0,0 +1,38 @@
+from datetime import datetime
+from app.models import Report
+
+# Columns report listings can be sorted by; id is appended to break ties
+REPORT_SORT_COLUMNS = {
+    'created_at': Report.created_at,
+    'start_date': Report.start_date,
+    'end_date': Report.end_date,
+    'name': Report.name,
+}
+
+def report_list_query(args):
+    """Return (query, sort_columns, descending) listing the reports matching request args.
+
+    type filters by report type, and start_date/end_date (YYYY-MM-DD) keep
+    reports covering only days within the range. sort names a column of
+    REPORT_SORT_COLUMNS, newest first unless order=asc. The processed data
+    is never loaded. Raises ValueError for invalid arguments.
+    """
+    sort = args.get('sort', 'created_at')
+    if sort not in REPORT_SORT_COLUMNS:
+        raise ValueError(f'Invalid sort column: {sort}')
+    descending = args.get('order', 'desc') != 'asc'
+    sort_columns = [REPORT_SORT_COLUMNS[sort], Report.id]
+
+    query = Report.query
+    if args.get('type'):
+        query = query.filter(Report.type == args['type'])
+    try:
+        if args.get('start_date'):
+            query = query.filter(Report.start_date >= datetime.strptime(args['start_date'], '%Y-%m-%d').date())
+        if args.get('end_date'):
+            query = query.filter(Report.end_date <= datetime.strptime(args['end_date'], '%Y-%m-%d').date())
+    except ValueError:
+        raise ValueError('Invalid date format. Use YYYY-MM-DD')
+
+    query = query.order_by(*[column.desc() if descending else column for column in sort_columns])
+    return query, sort_columns, descending
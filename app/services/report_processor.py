@@ -1,70 +1,157 @@
+import time
 from datetime import datetime
+from flask import current_app
 from app import db
 from app.models import Report, Product, Sale
-from .amazon_sp_api import AmazonSPAPIService
+from app.utils.bulk import bulk_upsert, chunked
+from app.utils.data_processing import aggregate_sales, iter_flat_file_batches
+from .amazon_sp_api import AmazonSPAPIService, get_sp_api_service
+from .report_store import ReportStore
+from .sales_rollup import SalesRollup
+import pandas as pd
 import json
 
 class ReportProcessor:
-    def __init__(self):
-        self.amazon_api = AmazonSPAPIService()
+    def __init__(self, amazon_api: AmazonSPAPIService = None):
+        self.amazon_api = amazon_api or get_sp_api_service()
+        self.sales_rollup = SalesRollup()
+        self.store = ReportStore()
 
     def process_report(self, report_id):
         """Process a report and store its data"""
+        started = time.monotonic()
         try:
             report = Report.query.get(report_id)
             if not report:
                 return False
 
+            # Sales flat files can be very large, so stream them batch by batch
+            if report.type == 'sales':
+                with self.amazon_api.stream_report_document(report.report_document_id) as document:
+                    processed_data = self._process_sales_report_stream(document)
+                return self._save_report_data(report, processed_data, started)
+
             # Get report data from Amazon
             report_data = self.amazon_api.get_report_document(report.report_document_id)
             if not report_data:
                 return False
 
             # Process the data based on report type
-            if report.type == 'sales':
-                processed_data = self._process_sales_report(report_data)
-            elif report.type == 'orders':
+            if report.type == 'orders':
                 processed_data = self._process_orders_report(report_data)
             elif report.type == 'inventory':
                 processed_data = self._process_inventory_report(report_data)
             else:
                 return False
 
-            # Update report with processed data
-            report.data = processed_data
-            report.updated_at = datetime.utcnow()
-            db.session.commit()
-
-            return True
+            return self._save_report_data(report, processed_data, started)
         except Exception as e:
             current_app.logger.error(f"Error processing report {report_id}: {str(e)}")
             return False
 
-    def _process_sales_report(self, report_data):
-        """Process sales report data"""
+    def _save_report_data(self, report, processed_data, started: float):
+        """Write processed data to the report store and record its summary on the report"""
+        if processed_data is None:
+            return False
+
+        report.data_file = self.store.write(report.id, processed_data, report.type)
+        report.data = db.null()
+        report.row_count = len(processed_data)
+        report.byte_size = self.store.size(report.data_file)
+        report.processing_seconds = time.monotonic() - started
+        report.updated_at = datetime.utcnow()
+        db.session.commit()
+
+        return True
+
+    def ingest_sales_report(self, report_document_id):
+        """Store the sales in a sales report document, returning the number of daily sales rows or None on error"""
+        with self.amazon_api.stream_report_document(report_document_id) as document:
+            processed_data = self._process_sales_report_stream(document)
+        return None if processed_data is None else len(processed_data)
+
+    def _process_sales_report_stream(self, document):
+        """Process a sales flat file incrementally, one bounded batch of rows at a time.
+
+        Each batch is committed as it is stored, so no write transaction stays
+        open while the rest of the document downloads. A retried report starts
+        over and its first batch for each key replaces what was committed.
+        """
         try:
-            # Process sales data using pandas
-            processed_data = self.amazon_api.process_sales_data(report_data)
-            
-            # Store sales data in database
-            for sale in processed_data:
-                product = Product.query.filter_by(asin=sale['asin']).first()
-                if product:
-                    new_sale = Sale(
-                        product_id=product.id,
-                        date=datetime.strptime(sale['date'], '%Y-%m-%d').date(),
-                        quantity=sale['quantity'],
-                        revenue=sale['revenue'],
-                        marketplace=sale.get('marketplace', 'Unknown')
-                    )
-                    db.session.add(new_sale)
+            totals = {}
+            seen_keys = set()
+            for batch in iter_flat_file_batches(document, current_app.config['REPORT_CHUNK_SIZE']):
+                daily_sales = aggregate_sales(batch, self.amazon_api.marketplace_id)
+                self._store_sales(daily_sales, seen_keys)
+                db.session.commit()
+                
+                # Keep only the running per-key totals, never the raw rows
+                for sale in daily_sales.itertuples(index=False):
+                    key = (sale.asin, sale.date.isoformat(), sale.marketplace)
+                    quantity, revenue = totals.get(key, (0, 0.0))
+                    totals[key] = (quantity + int(sale.quantity), revenue + float(sale.revenue))
             
+            self._refresh_rollup(seen_keys)
             db.session.commit()
-            return processed_data
+            
+            return [{
+                'asin': asin,
+                'date': date,
+                'marketplace': marketplace,
+                'quantity': quantity,
+                'revenue': revenue
+            } for (asin, date, marketplace), (quantity, revenue) in totals.items()]
         except Exception as e:
-            current_app.logger.error(f"Error processing sales report: {str(e)}")
+            db.session.rollback()
+            current_app.logger.error(f"Error processing sales report stream: {str(e)}")
             return None
 
+    def _store_sales(self, daily_sales: pd.DataFrame, seen_keys: set = None):
+        """Upsert aggregated sales rows keyed on (product, date, marketplace).
+
+        When seen_keys is given, keys already written earlier in the same run
+        are added to instead of replaced, so a day split across batches is
+        still counted once in full.
+        """
+        product_ids = self._get_product_ids(daily_sales['asin'].unique())
+        
+        sales = daily_sales.assign(product_id=daily_sales['asin'].map(product_ids))
+        sales = sales.dropna(subset=['product_id'])
+        sales['product_id'] = sales['product_id'].astype(int)
+        
+        rows = sales[['product_id', 'date', 'marketplace', 'quantity', 'revenue']].to_dict('records')
+        if seen_keys is None:
+            new_rows, seen_rows = rows, []
+        else:
+            new_rows, seen_rows = [], []
+            for row in rows:
+                key = (row['product_id'], row['date'], row['marketplace'])
+                (seen_rows if key in seen_keys else new_rows).append(row)
+                seen_keys.add(key)
+        
+        batch_size = current_app.config['BULK_INSERT_BATCH_SIZE']
+        index_elements = ['product_id', 'date', 'marketplace']
+        count = bulk_upsert(Sale, new_rows, index_elements,
+                            update_columns=['quantity', 'revenue'], batch_size=batch_size)
+        count += bulk_upsert(Sale, seen_rows, index_elements,
+                             increment_columns=['quantity', 'revenue'], batch_size=batch_size)
+        return count
+
+    def _refresh_rollup(self, sale_keys: set):
+        """Bring the daily sales rollup up to date for the stored sale keys."""
+        if not sale_keys:
+            return
+        product_ids = {product_id for product_id, _, _ in sale_keys}
+        dates = [date for _, date, _ in sale_keys]
+        self.sales_rollup.refresh(product_ids, min(dates), max(dates))
+
+    def _get_product_ids(self, asins):
+        """Map ASINs to product ids with one query per batch of ASINs."""
+        product_ids = {}
+        for batch in chunked(asins, current_app.config['BULK_INSERT_BATCH_SIZE']):
+            product_ids.update(db.session.query(Product.asin, Product.id).filter(Product.asin.in_(batch)).all())
+        return product_ids
+
     def _process_orders_report(self, report_data):
         """Process orders report data"""
         try:
@@ -0,0 +1,166 @@
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+from flask import current_app
+
+# Filter operators accepted on the report endpoint, as understood by pyarrow
+FILTER_OPERATORS = ('==', '!=', '<', '<=', '>', '>=', 'in')
+
+# Schema of each report type's processed records. Amazon sends amounts as
+# strings, and a missing amount is processed as 0, so values are coerced to it.
+REPORT_SCHEMAS = {
+    'sales': pa.schema([
+        ('asin', pa.string()),
+        ('date', pa.string()),
+        ('marketplace', pa.string()),
+        ('quantity', pa.int64()),
+        ('revenue', pa.float64()),
+    ]),
+    'orders': pa.schema([
+        ('order_id', pa.string()),
+        ('purchase_date', pa.string()),
+        ('order_status', pa.string()),
+        ('order_total', pa.float64()),
+        ('items', pa.list_(pa.struct([
+            ('asin', pa.string()),
+            ('title', pa.string()),
+            ('quantity', pa.int64()),
+            ('price', pa.float64()),
+        ]))),
+    ]),
+    'inventory': pa.schema([
+        ('asin', pa.string()),
+        ('sku', pa.string()),
+        ('quantity', pa.int64()),
+        ('condition', pa.string()),
+        ('last_updated', pa.string()),
+    ]),
+}
+
+class ReportStore:
+    """Processed report data as one Parquet file per report.
+
+    Only the file name is kept on the Report row. Reads are memory-mapped
+    and push column projection and row filters down into the file, so a
+    request for a few columns of a large report doesn't read all of it.
+    """
+    def __init__(self, directory: str = None):
+        self.directory = directory or current_app.config['REPORT_STORE_DIR'] or os.path.join(current_app.instance_path, 'reports')
+
+    def path(self, data_file: str):
+        return os.path.join(self.directory, data_file)
+
+    def write(self, report_id: int, records: list, report_type: str = None):
+        """Write report records to the report's Parquet file, returning its file name."""
+        os.makedirs(self.directory, exist_ok=True)
+        data_file = f'report-{report_id}.parquet'
+        # Write beside the final file and rename, so readers never see a partial file
+        tmp_path = self.path(data_file) + '.tmp'
+        pq.write_table(to_table(records, report_type), tmp_path)
+        os.replace(tmp_path, self.path(data_file))
+        return data_file
+
+    def exists(self, data_file: str):
+        return os.path.isfile(self.path(data_file))
+
+    def size(self, data_file: str):
+        return os.path.getsize(self.path(data_file))
+
+    def schema(self, data_file: str):
+        return pq.read_schema(self.path(data_file), memory_map=True)
+
+    def read(self, data_file: str, columns: list = None, filters: list = None):
+        """Read a report's rows as an Arrow table, keeping only the given columns and matching rows."""
+        return pq.read_table(self.path(data_file), columns=columns, filters=filters or None, memory_map=True)
+
+    def query(self, report, columns: list = None, where: list = None):
+        """A report's rows as an Arrow table with only the given columns and rows matching every where filter.
+
+        where holds "column,op,value" strings. Reports processed before the
+        store still hold their rows in Report.data and are read from there.
+        Raises ValueError for unknown columns and invalid filters.
+        """
+        if report.data_file:
+            schema = self.schema(report.data_file)
+            _check_columns(columns, schema)
+            return self.read(report.data_file, columns, parse_filters(where or [], schema))
+
+        table = to_table(report.data or [], report.type)
+        _check_columns(columns, table.schema)
+        filters = parse_filters(where or [], table.schema)
+        if filters:
+            table = table.filter(pq.filters_to_expression(filters))
+        return table.select(columns) if columns else table
+
+    def delete(self, data_file: str):
+        try:
+            os.remove(self.path(data_file))
+        except FileNotFoundError:
+            pass
+
+def to_table(records: list, report_type: str = None):
+    """Report records as an Arrow table with the report type's schema, or an inferred one for other types."""
+    schema = REPORT_SCHEMAS.get(report_type)
+    if schema is None:
+        return pa.Table.from_pylist(records)
+    return pa.Table.from_pylist([_coerce_record(record, schema) for record in records], schema=schema)
+
+def parse_filters(values: list, schema: pa.Schema):
+    """Parse "column,op,value" strings into pyarrow filters, casting values to the column type.
+
+    Raises ValueError for unknown columns or operators and values that don't fit the column.
+    """
+    filters = []
+    for value in values:
+        parts = value.split(',', 2)
+        if len(parts) != 3:
+            raise ValueError(f'Invalid filter: {value}')
+        column, op, operand = parts
+        if column not in schema.names:
+            raise ValueError(f'Unknown column: {column}')
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f'Invalid filter operator: {op}')
+
+        field_type = schema.field(column).type
+        if op == 'in':
+            filters.append((column, op, [_cast(item, field_type) for item in operand.split('|')]))
+        else:
+            filters.append((column, op, _cast(operand, field_type)))
+    return filters
+
+def _check_columns(columns: list, schema: pa.Schema):
+    for column in columns or []:
+        if column not in schema.names:
+            raise ValueError(f'Unknown column: {column}')
+
+def _cast(value: str, field_type: pa.DataType):
+    if pa.types.is_boolean(field_type):
+        return value.lower() == 'true'
+    if pa.types.is_integer(field_type):
+        return int(value)
+    if pa.types.is_floating(field_type):
+        return float(value)
+    if pa.types.is_string(field_type) or pa.types.is_large_string(field_type):
+        return value
+    raise ValueError(f'Column type {field_type} cannot be filtered')
+
+def _coerce_record(record: dict, fields):
+    return {field.name: _coerce(record.get(field.name), field.type) for field in fields}
+
+def _coerce(value, field_type: pa.DataType):
+    """Convert a record value to the Python type Arrow expects for field_type; missing amounts become null."""
+    if value is None:
+        return None
+    if pa.types.is_struct(field_type):
+        return _coerce_record(value, field_type)
+    if pa.types.is_list(field_type):
+        return [_coerce(item, field_type.value_type) for item in value]
+    if pa.types.is_string(field_type):
+        return str(value)
+    if value == '':
+        return None
+    if pa.types.is_floating(field_type):
+        return float(value)
+    if pa.types.is_integer(field_type):
+        return int(value)
+    return value
@@ -0,0 +1,192 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, case, exists, func, insert
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import Sale, DailySalesRollup, DailyMarketplaceSalesRollup
+from app.utils.bulk import bulk_upsert, chunked
+from app.utils.data_processing import MARKETPLACE_TAGS
+
+ROLLUP_KEY_COLUMNS = ['product_id', 'date', 'marketplace']
+MARKETPLACE_ROLLUP_KEY_COLUMNS = ['date', 'marketplace']
+
+class SalesRollup:
+    """Sales pre-aggregated per product, day and marketplace, and per day and marketplace for the whole catalog.
+
+    The dashboard reads the per-marketplace rollup, so its totals cost the
+    same however many products and sales there are.
+    """
+    def refresh(self, product_ids, start_date, end_date):
+        """Recompute the rollup rows for the given products and date range from Sale.
+
+        Called whenever sales are ingested; the caller commits.
+        """
+        count = 0
+        for batch in chunked(product_ids, current_app.config['BULK_INSERT_BATCH_SIZE']):
+            totals = self._sales_totals().filter(
+                Sale.product_id.in_(batch),
+                Sale.date >= start_date,
+                Sale.date <= end_date
+            ).all()
+
+            rows = [{
+                'product_id': product_id,
+                'date': date,
+                'marketplace': marketplace,
+                'units': units,
+                'revenue': revenue,
+                'updated_at': datetime.utcnow()
+            } for product_id, date, marketplace, units, revenue in totals]
+
+            count += bulk_upsert(
+                DailySalesRollup,
+                rows,
+                index_elements=ROLLUP_KEY_COLUMNS,
+                update_columns=['units', 'revenue', 'updated_at'],
+                batch_size=current_app.config['BULK_INSERT_BATCH_SIZE']
+            )
+
+        self.refresh_marketplace_totals(start_date, end_date)
+        return count
+
+    def refresh_marketplace_totals(self, start_date, end_date):
+        """Recompute the per-marketplace rows for a date range from the product rollup; the caller commits."""
+        rows = [{
+            'date': date,
+            'marketplace': marketplace,
+            'units': units,
+            'revenue': revenue,
+            'updated_at': datetime.utcnow()
+        } for date, marketplace, units, revenue in self._marketplace_totals().filter(
+            DailySalesRollup.date >= start_date,
+            DailySalesRollup.date <= end_date
+        ).all()]
+
+        return bulk_upsert(
+            DailyMarketplaceSalesRollup,
+            rows,
+            index_elements=MARKETPLACE_ROLLUP_KEY_COLUMNS,
+            update_columns=['units', 'revenue', 'updated_at'],
+            batch_size=current_app.config['BULK_INSERT_BATCH_SIZE']
+        )
+
+    def rebuild(self):
+        """Rebuild both rollups from Sale with an INSERT ... SELECT each."""
+        db.session.query(DailyMarketplaceSalesRollup).delete()
+        db.session.query(DailySalesRollup).delete()
+        db.session.execute(
+            insert(DailySalesRollup).from_select(
+                ROLLUP_KEY_COLUMNS + ['units', 'revenue'],
+                self._sales_totals().statement
+            )
+        )
+        db.session.execute(
+            insert(DailyMarketplaceSalesRollup).from_select(
+                MARKETPLACE_ROLLUP_KEY_COLUMNS + ['units', 'revenue'],
+                self._marketplace_totals().statement
+            )
+        )
+        db.session.commit()
+        return DailySalesRollup.query.count()
+
+    def get_totals(self, product_id: int = None, start_date=None):
+        """Return (units, revenue) summed over the rollup."""
+        query = db.session.query(
+            func.coalesce(func.sum(DailySalesRollup.units), 0),
+            func.coalesce(func.sum(DailySalesRollup.revenue), 0.0)
+        )
+        if product_id is not None:
+            query = query.filter(DailySalesRollup.product_id == product_id)
+        if start_date is not None:
+            query = query.filter(DailySalesRollup.date >= start_date)
+        return query.one()
+
+    def get_marketplace_totals(self, recent_since=None):
+        """Return rows of (marketplace, units, revenue, recent_revenue) per marketplace.
+
+        Summed from the per-marketplace rollup, one row per day and
+        marketplace; recent_revenue only counts days on or after recent_since.
+        """
+        recent_revenue = DailyMarketplaceSalesRollup.revenue
+        if recent_since is not None:
+            recent_revenue = case(
+                (DailyMarketplaceSalesRollup.date >= recent_since, DailyMarketplaceSalesRollup.revenue), else_=0.0
+            )
+        return db.session.query(
+            DailyMarketplaceSalesRollup.marketplace,
+            func.sum(DailyMarketplaceSalesRollup.units).label('units'),
+            func.sum(DailyMarketplaceSalesRollup.revenue).label('revenue'),
+            func.sum(recent_revenue).label('recent_revenue')
+        ).group_by(DailyMarketplaceSalesRollup.marketplace).order_by(DailyMarketplaceSalesRollup.marketplace).all()
+
+    def _sales_totals(self):
+        return db.session.query(
+            Sale.product_id,
+            Sale.date,
+            Sale.marketplace,
+            func.sum(Sale.quantity),
+            func.sum(Sale.revenue)
+        ).group_by(Sale.product_id, Sale.date, Sale.marketplace)
+
+    def _marketplace_totals(self):
+        return db.session.query(
+            DailySalesRollup.date,
+            DailySalesRollup.marketplace,
+            func.sum(DailySalesRollup.units),
+            func.sum(DailySalesRollup.revenue)
+        ).group_by(DailySalesRollup.date, DailySalesRollup.marketplace)
+
+def backfill_sale_marketplaces(default_marketplace: str, batch_size: int):
+    """Move sales stored under 'Unknown' or a report's own tag to marketplace IDs, returning the number of rows moved.
+
+    'Unknown' rows predate marketplace tagging and go to default_marketplace,
+    unless the day has been synced under it since, which makes them stale
+    copies to drop. Rows under another tag, e.g. a sales channel, are the
+    rest of a day that was split by tag, so they are added to the ID's row.
+    The rollup is rebuilt afterwards.
+    """
+    marketplace_ids = set(MARKETPLACE_TAGS.values())
+    tags = [row.marketplace for row in db.session.query(Sale.marketplace).distinct().all()
+            if row.marketplace not in marketplace_ids]
+
+    moved = 0
+    if 'Unknown' in tags:
+        synced = aliased(Sale)
+        db.session.query(Sale).filter(
+            Sale.marketplace == 'Unknown',
+            exists().where(and_(
+                synced.product_id == Sale.product_id,
+                synced.date == Sale.date,
+                synced.marketplace == default_marketplace
+            ))
+        ).delete(synchronize_session=False)
+        moved += db.session.query(Sale).filter(Sale.marketplace == 'Unknown').update(
+            {Sale.marketplace: default_marketplace}, synchronize_session=False
+        )
+        db.session.commit()
+
+    for tag in tags:
+        if tag == 'Unknown':
+            continue
+        marketplace = MARKETPLACE_TAGS.get(tag.strip().lower(), default_marketplace)
+        while True:
+            sales = db.session.query(Sale.id, Sale.product_id, Sale.date, Sale.quantity, Sale.revenue).filter(
+                Sale.marketplace == tag
+            ).limit(batch_size).all()
+            if not sales:
+                break
+            bulk_upsert(Sale, [{
+                'product_id': sale.product_id,
+                'date': sale.date,
+                'marketplace': marketplace,
+                'quantity': sale.quantity,
+                'revenue': sale.revenue
+            } for sale in sales], index_elements=ROLLUP_KEY_COLUMNS,
+                increment_columns=['quantity', 'revenue'], batch_size=batch_size)
+            Sale.query.filter(Sale.id.in_([sale.id for sale in sales])).delete(synchronize_session=False)
+            db.session.commit()
+            moved += len(sales)
+
+    if tags:
+        SalesRollup().rebuild()
+    return moved
@@ -0,0 +1,182 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import tuple_
+from app import db
+from app.models import SyncCheckpoint, SyncWindow
+from app.utils.bulk import bulk_upsert
+from .amazon_sp_api import AmazonSPAPIService
+from .report_jobs import ReportCancelledError, ReportJobError, ReportJobRunner
+from .report_processor import ReportProcessor
+
+class SalesSync:
+    """Incrementally ingests sales reports for a marketplace, window by window.
+
+    The checkpoint is the first day not yet planned. A run records windows
+    of SALES_SYNC_WINDOW_DAYS from the checkpoint, less SALES_SYNC_LOOKBACK_DAYS
+    that Amazon may still revise, up to yesterday, and syncs them
+    concurrently along with any window an earlier run didn't finish. A
+    window's sales are committed batch by batch, so concurrent windows never
+    wait on one another's whole report, and the window is marked done once
+    its report is fully ingested, so a crashed run resumes from the windows
+    still outstanding.
+    """
+    SYNC_TYPE = 'sales'
+
+    def __init__(self, sp_api_service: AmazonSPAPIService):
+        self.sp_api = sp_api_service
+        self.marketplace = sp_api_service.marketplace_id
+        self.window_days = current_app.config['SALES_SYNC_WINDOW_DAYS']
+        self.lookback_days = current_app.config['SALES_SYNC_LOOKBACK_DAYS']
+        self.workers = current_app.config['SALES_SYNC_WORKERS']
+
+    def sync(self, end_date=None):
+        """Sync sales through end_date (yesterday by default), returning window counts or None on error."""
+        end_date = end_date or datetime.utcnow().date() - timedelta(days=1)
+        try:
+            window_ids = self.plan(end_date)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error planning sales sync: {str(e)}")
+            return None
+
+        app = current_app._get_current_object()
+
+        def run(window_id):
+            with app.app_context():
+                return self.sync_window(window_id)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(window_ids)))) as executor:
+            results = list(executor.map(run, window_ids))
+
+        return {
+            'windows': len(window_ids),
+            'done': sum(1 for done in results if done),
+            'failed': sum(1 for done in results if not done),
+            'synced_through': self.synced_through(end_date)
+        }
+
+    def plan(self, end_date):
+        """Record the windows due up to end_date and return the ids of every outstanding window, oldest first.
+
+        The windows and the advanced checkpoint are committed together, so
+        a planned window is never lost, only retried until it is done.
+        """
+        checkpoint = self._checkpoint()
+        if checkpoint is None:
+            start_date = end_date - timedelta(days=current_app.config['SALES_SYNC_INITIAL_DAYS'] - 1)
+        else:
+            start_date = checkpoint.high_water_mark.date() - timedelta(days=self.lookback_days)
+
+        now = datetime.utcnow()
+        windows = []
+        while start_date <= end_date:
+            window_end = min(start_date + timedelta(days=self.window_days - 1), end_date)
+            windows.append({
+                'sync_type': self.SYNC_TYPE,
+                'marketplace': self.marketplace,
+                'start_date': start_date,
+                'end_date': window_end,
+                'status': 'pending',
+                'attempts': 0,
+                'updated_at': now
+            })
+            start_date = window_end + timedelta(days=1)
+
+        bulk_upsert(
+            SyncWindow,
+            windows,
+            index_elements=['sync_type', 'marketplace', 'start_date', 'end_date'],
+            update_columns=['updated_at']
+        )
+        if windows:
+            # Re-planned windows request a fresh report, so revised sales are fetched. A window
+            # another run is syncing is left to it.
+            SyncWindow.query.filter(
+                *self._window_filter(),
+                tuple_(SyncWindow.start_date, SyncWindow.end_date).in_(
+                    [(window['start_date'], window['end_date']) for window in windows]
+                ),
+                SyncWindow.status != 'running'
+            ).update({
+                'status': 'pending',
+                'amazon_report_id': None,
+                'error': None,
+                'updated_at': now
+            }, synchronize_session=False)
+            self._save_checkpoint(end_date + timedelta(days=1))
+        db.session.commit()
+
+        return [row.id for row in db.session.query(SyncWindow.id).filter(
+            *self._window_filter(),
+            SyncWindow.status != 'done'
+        ).order_by(SyncWindow.start_date).all()]
+
+    def sync_window(self, window_id: int):
+        """Request, wait for and ingest the sales report of one window, returning True once committed."""
+        window = db.session.get(SyncWindow, window_id)
+        window.status = 'running'
+        window.attempts += 1
+        window.error = None
+        db.session.commit()
+
+        processor = ReportProcessor(self.sp_api)
+        try:
+            # A window interrupted while Amazon generated its report picks the same report back up
+            if not window.amazon_report_id:
+                amazon_report = self.sp_api.get_sales_report(window.start_date, window.end_date)
+                if not amazon_report:
+                    raise ReportJobError('Failed to request sales report from Amazon')
+                window.amazon_report_id = amazon_report.get('reportId')
+                db.session.commit()
+
+            try:
+                report_status = ReportJobRunner(self.sp_api, processor).wait_for_report(window.amazon_report_id)
+            except ReportCancelledError:
+                # Amazon cancels the report of a window without sales
+                rows = 0
+            else:
+                rows = processor.ingest_sales_report(report_status.get('reportDocumentId'))
+                if rows is None:
+                    raise ReportJobError('Failed to process sales report document')
+
+            window.status = 'done'
+            window.rows = rows
+            window.completed_at = datetime.utcnow()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error syncing sales for {window.start_date} to {window.end_date}: {str(e)}")
+            window = db.session.get(SyncWindow, window_id)
+            window.status = 'failed'
+            window.amazon_report_id = None
+            window.error = str(e)
+
+        db.session.commit()
+        return window.status == 'done'
+
+    def synced_through(self, end_date):
+        """The last day before the oldest unfinished window, up to end_date."""
+        next_date = db.session.query(db.func.min(SyncWindow.start_date)).filter(
+            *self._window_filter(),
+            SyncWindow.status != 'done'
+        ).scalar()
+        return min(next_date - timedelta(days=1), end_date) if next_date else end_date
+
+    def _save_checkpoint(self, next_date):
+        bulk_upsert(
+            SyncCheckpoint,
+            [{
+                'sync_type': self.SYNC_TYPE,
+                'marketplace': self.marketplace,
+                'high_water_mark': datetime.combine(next_date, datetime.min.time()),
+                'updated_at': datetime.utcnow()
+            }],
+            index_elements=['sync_type', 'marketplace'],
+            update_columns=['high_water_mark', 'updated_at']
+        )
+
+    def _checkpoint(self):
+        return SyncCheckpoint.query.filter_by(sync_type=self.SYNC_TYPE, marketplace=self.marketplace).first()
+
+    def _window_filter(self):
+        return SyncWindow.sync_type == self.SYNC_TYPE, SyncWindow.marketplace == self.marketplace
@@ -0,0 +1,83 @@
+import hashlib
+import threading
+import time
+import requests
+# sp_api.auth and sp_api.base import each other; loading sp_api.base first lets this module be imported on its own
+import sp_api.base  # noqa: F401
+from sp_api.auth import AccessTokenClient, AccessTokenResponse
+from sp_api.auth.exceptions import AuthorizationError
+
+TOKEN_REFRESH_MARGIN = 60  # seconds before expiry to fetch a new LWA access token
+DEFAULT_TOKEN_LIFETIME = 3600  # seconds, used when LWA omits expires_in
+
+# Shared HTTP connection pool for LWA token exchanges and report document downloads
+http_session = requests.Session()
+
+class CachedAccessTokenClient(AccessTokenClient):
+    """LWA token client that shares access tokens process-wide until shortly before they expire."""
+    _tokens = {}
+    _lock = threading.Lock()
+
+    def get_auth(self) -> AccessTokenResponse:
+        cache_key = self._get_cache_key()
+        with self._lock:
+            token, expires_at = self._tokens.get(cache_key, (None, 0))
+        if token is None or time.monotonic() >= expires_at:
+            # Exchange outside the lock, so a slow LWA call never holds up threads using other tokens
+            token = self._request(self.scheme + self.host + self.path, self.data, self.headers)
+            lifetime = int(token.get('expires_in') or DEFAULT_TOKEN_LIFETIME)
+            expires_at = time.monotonic() + max(lifetime - TOKEN_REFRESH_MARGIN, 0)
+            with self._lock:
+                # Keep a token another thread stored meanwhile if it lasts longer
+                stored_token, stored_expires_at = self._tokens.get(cache_key, (None, 0))
+                if stored_token is not None and stored_expires_at > expires_at:
+                    token = stored_token
+                else:
+                    self._tokens[cache_key] = (token, expires_at)
+        return AccessTokenResponse(**token)
+
+    def _request(self, url, data, headers):
+        response = http_session.post(url, data=data, headers=headers, proxies=self.proxies, verify=self.verify)
+        response_data = response.json()
+        if response.status_code != 200:
+            raise AuthorizationError(
+                response_data.get('error'),
+                response_data.get('error_description'),
+                response.status_code
+            )
+        return response_data
+
+    def _get_cache_key(self, token_flavor=''):
+        # Key on the LWA app as well as the refresh token, so credential sets never share tokens
+        return 'access_token_' + hashlib.md5(
+            (token_flavor + (self.cred.client_id or '') + (self.cred.refresh_token or '__grantless__')).encode('utf-8')
+        ).hexdigest()
+
+class SPAPIClientRegistry:
+    """Process-wide cache of SP-API clients per API, marketplace and credential set.
+
+    python-amazon-sp-api clients keep per-request state on the instance, so
+    each thread gets its own client; access tokens are shared by all of them.
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def client(self, api_class, credentials: dict, marketplace):
+        """Return this thread's client for an API class, building it on first use."""
+        clients = getattr(self._local, 'clients', None)
+        if clients is None:
+            clients = self._local.clients = {}
+
+        key = (api_class, marketplace, _credentials_key(credentials))
+        if key not in clients:
+            clients[key] = api_class(
+                marketplace=marketplace,
+                credentials=dict(credentials),
+                auth_token_client_class=CachedAccessTokenClient
+            )
+        return clients[key]
+
+registry = SPAPIClientRegistry()
+
+def _credentials_key(credentials: dict):
+    return tuple(sorted((name, value or '') for name, value in credentials.items()))
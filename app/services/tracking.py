@@ -0,0 +1,253 @@
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, case, func, insert, literal, update
+from app import db
+from app.models import Product, DailySalesRollup, TrackingSchedule
+from app.utils.aggregates import aggregate_metrics, count, count_if
+from app.utils.bulk import bulk_upsert
+from .amazon_sp_api import for_each_marketplace, get_sp_api_service
+from .competitor_tracker import CompetitorTracker
+from .keyword_tracker import KeywordTracker
+from .profit_engine import ProfitEngine
+
+TRACKING_DATA_TYPES = ('prices', 'keywords', 'profit')
+PRIORITY_WINDOW_DAYS = 30  # best sellers are ranked by units sold over this window
+
+def track_prices(products: list):
+    """Track competitor prices for a batch of products in every marketplace, returning {product_id: success}."""
+    stored = for_each_marketplace(lambda service: CompetitorTracker(service).track_catalog_prices(products))
+    return {
+        product.id: all(product_ids is not None and product.id in product_ids for product_ids in stored.values())
+        for product in products
+    }
+
+def track_keywords(products: list):
+    """Track keyword performance for a batch of products, returning {product_id: success}."""
+    stored = KeywordTracker(get_sp_api_service()).track_catalog_keywords(products)
+    return {product.id: stored is not None for product in products}
+
+def track_profit(products: list):
+    """Calculate today's profit margin for a batch of products, returning {product_id: success}."""
+    today = datetime.utcnow().date()
+    stored = ProfitEngine(get_sp_api_service()).calculate_profit_margins(products, today, today) or set()
+    return {product.id: product.id in stored for product in products}
+
+# Tracking pipeline for each data type; each takes a batch of products
+PIPELINES = {
+    'prices': track_prices,
+    'keywords': track_keywords,
+    'profit': track_profit,
+}
+
+def run_pipeline(data_type: str, product_ids: list):
+    """Run one data type's tracking pipeline for products, returning {product_id: success}."""
+    products = Product.query.filter(Product.id.in_(product_ids)).all()
+    try:
+        return PIPELINES[data_type](products)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error tracking {data_type}: {str(e)}")
+        return {}
+
+def track_products(product_ids: list, data_types=TRACKING_DATA_TYPES):
+    """Track products now, running the data type pipelines concurrently.
+
+    Each pipeline runs in its own thread and application context, and so
+    with its own database session, so one pipeline's remote calls overlap
+    the others' and a failure in one never rolls back another. The products'
+    schedules are updated so the scheduler skips the fresh data. Returns
+    {data_type: {product_id: success}}.
+    """
+    app = current_app._get_current_object()
+    now = datetime.utcnow()
+
+    def run(data_type):
+        with app.app_context():
+            results = run_pipeline(data_type, product_ids)
+            TrackingScheduler().record_results(data_type, product_ids, results, now)
+            return {product_id: bool(results.get(product_id)) for product_id in product_ids}
+
+    with ThreadPoolExecutor(max_workers=len(data_types)) as executor:
+        return dict(zip(data_types, executor.map(run, data_types)))
+
+class TrackingScheduler:
+    """Refreshes tracked data for the catalog whenever a product's data of a type falls due.
+
+    The catalog is split into shard_count shards by product id, so several
+    schedulers can run side by side without picking up the same product.
+    """
+    def __init__(self, shard: int = 0, shard_count: int = 1):
+        self.shard = shard
+        self.shard_count = shard_count
+        self.batch_size = current_app.config['TRACKING_BATCH_SIZE']
+        self.retry_interval = timedelta(seconds=current_app.config['TRACKING_RETRY_INTERVAL'])
+        self.intervals = {
+            'prices': timedelta(seconds=current_app.config['TRACKING_PRICE_INTERVAL']),
+            'keywords': timedelta(seconds=current_app.config['TRACKING_KEYWORD_INTERVAL']),
+            'profit': timedelta(seconds=current_app.config['TRACKING_PROFIT_INTERVAL']),
+        }
+
+    def run_forever(self, poll_interval: int):
+        """Run scheduler passes until interrupted, carrying on after a failed pass."""
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Error in tracking scheduler pass: {str(e)}")
+            time.sleep(poll_interval)
+
+    def run_once(self):
+        """Track every product in the shard whose data is due, returning {data_type: products tracked}."""
+        self.sync_schedules()
+        self.update_priorities()
+        tracked = {}
+        for data_type in TRACKING_DATA_TYPES:
+            tracked[data_type] = 0
+            while True:
+                batch_count = self.run_batch(data_type)
+                if not batch_count:
+                    break
+                tracked[data_type] += batch_count
+        return tracked
+
+    def run_batch(self, data_type: str):
+        """Track the highest-priority batch of due products for a data type."""
+        now = datetime.utcnow()
+        schedules = self.due_query(data_type, now).limit(self.batch_size).all()
+        if not schedules:
+            return 0
+
+        product_ids = [schedule.product_id for schedule in schedules]
+        results = run_pipeline(data_type, product_ids)
+        self.record_results(data_type, product_ids, results, now)
+        return len(schedules)
+
+    def record_results(self, data_type: str, product_ids: list, results: dict, tracked_at: datetime):
+        """Schedule the next run for each product: a full interval after success, a retry after failure."""
+        rows = []
+        for product_id in product_ids:
+            row = {'product_id': product_id, 'data_type': data_type}
+            if results.get(product_id):
+                row.update(status='ok', error=None, last_tracked_at=tracked_at,
+                           next_due_at=tracked_at + self.intervals[data_type])
+            else:
+                row.update(status='failed', error=f"{data_type} tracking failed",
+                           next_due_at=tracked_at + self.retry_interval)
+            rows.append(row)
+
+        # Failures keep the time of the last successful run
+        bulk_upsert(TrackingSchedule, [row for row in rows if row['status'] == 'ok'],
+                    index_elements=['product_id', 'data_type'],
+                    update_columns=['status', 'error', 'last_tracked_at', 'next_due_at'])
+        bulk_upsert(TrackingSchedule, [row for row in rows if row['status'] == 'failed'],
+                    index_elements=['product_id', 'data_type'],
+                    update_columns=['status', 'error', 'next_due_at'])
+        db.session.commit()
+
+    def due_query(self, data_type: str, now: datetime):
+        """Schedules in this shard that are due, best sellers first."""
+        return TrackingSchedule.query.filter(
+            TrackingSchedule.data_type == data_type,
+            TrackingSchedule.next_due_at <= now,
+            *self._shard_filter(TrackingSchedule.product_id)
+        ).order_by(
+            TrackingSchedule.priority.desc(),
+            TrackingSchedule.next_due_at,
+            TrackingSchedule.id
+        )
+
+    def update_priorities(self):
+        """Set each schedule's priority in the shard to its product's units sold over the priority window.
+
+        Runs once per pass, so batches order by the stored priority instead
+        of summing the sales rollup for the whole catalog each time.
+        """
+        units = db.session.query(
+            func.coalesce(func.sum(DailySalesRollup.units), 0)
+        ).filter(
+            DailySalesRollup.product_id == TrackingSchedule.product_id,
+            DailySalesRollup.date >= datetime.utcnow().date() - timedelta(days=PRIORITY_WINDOW_DAYS)
+        ).scalar_subquery()
+        db.session.execute(
+            update(TrackingSchedule).where(*self._shard_filter(TrackingSchedule.product_id)).values(priority=units)
+        )
+        db.session.commit()
+
+    def sync_schedules(self):
+        """Create schedules, due immediately, for products in the shard that have none."""
+        now = datetime.utcnow()
+        for data_type in TRACKING_DATA_TYPES:
+            missing = db.session.query(
+                Product.id, literal(data_type), literal('pending'), literal(now)
+            ).outerjoin(TrackingSchedule, and_(
+                TrackingSchedule.product_id == Product.id,
+                TrackingSchedule.data_type == data_type
+            )).filter(
+                TrackingSchedule.id.is_(None),
+                *self._shard_filter(Product.id)
+            )
+            db.session.execute(insert(TrackingSchedule).from_select(
+                ['product_id', 'data_type', 'status', 'next_due_at'], missing
+            ))
+        db.session.commit()
+
+    def queue_status(self):
+        """Queue depth and lag per data type for the shard."""
+        now = datetime.utcnow()
+        status = {}
+        for data_type in TRACKING_DATA_TYPES:
+            metrics = aggregate_metrics(
+                TrackingSchedule,
+                [TrackingSchedule.data_type == data_type, *self._shard_filter(TrackingSchedule.product_id)],
+                scheduled=count(),
+                due=count_if(TrackingSchedule.next_due_at <= now),
+                failed=count_if(TrackingSchedule.status == 'failed'),
+                oldest_due=func.min(case((TrackingSchedule.next_due_at <= now, TrackingSchedule.next_due_at)))
+            )
+            status[data_type] = {
+                'scheduled': metrics.scheduled,
+                'due': metrics.due,
+                'failed': metrics.failed,
+                'lag_seconds': (now - metrics.oldest_due).total_seconds() if metrics.oldest_due else 0.0
+            }
+        return status
+
+    def _shard_filter(self, product_id_column):
+        if self.shard_count <= 1:
+            return ()
+        return (product_id_column % self.shard_count == self.shard,)
+
+def run_tracking_workers(workers: int, poll_interval: int, once: bool = False):
+    """Run one scheduler process per catalog shard and wait for them to exit."""
+    # Workers build their own app and database engine, so don't inherit ours via fork
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=_run_shard, args=(shard, workers, poll_interval, once), daemon=True)
+        for shard in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    return all(process.exitcode == 0 for process in processes)
+
+def _run_shard(shard: int, shard_count: int, poll_interval: int, once: bool):
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        scheduler = TrackingScheduler(shard, shard_count)
+        try:
+            if once:
+                scheduler.run_once()
+            else:
+                scheduler.run_forever(poll_interval)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,28 @@
+from sqlalchemy import case, func
+from app import db
+
+def aggregate_metrics(model, filters, **metrics):
+    """Evaluate named aggregate expressions over matching rows in a single statement.
+
+    Returns a plain result row (a named tuple), so no ORM objects are loaded:
+
+        aggregate_metrics(Sale, [Sale.product_id == 1], rows=count(), revenue=func.sum(Sale.revenue))
+    """
+    columns = [expression.label(name) for name, expression in metrics.items()]
+    return db.session.query(*columns).select_from(model).filter(*filters).one()
+
+def count():
+    """COUNT(*) aggregate for use with aggregate_metrics."""
+    return func.count()
+
+def count_distinct(column):
+    """COUNT(DISTINCT column) aggregate for use with aggregate_metrics."""
+    return func.count(column.distinct())
+
+def count_if(condition):
+    """Number of rows matching condition, for use with aggregate_metrics."""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def mean(total, row_count):
+    """Average computed like sum(values) / len(values), None when there are no rows."""
+    return total / row_count if row_count else None
@@ -0,0 +1,82 @@
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from app import db
+
+def chunked(items, size: int):
+    """Yield successive lists of at most size items."""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def bulk_upsert(model, rows: list, index_elements: list, update_columns: list = (),
+                increment_columns: list = (), greatest_columns: list = (), least_columns: list = (),
+                latest_columns: list = (), latest_by: str = None, batch_size: int = 1000):
+    """Insert rows in batches, updating existing rows that match index_elements.
+
+    update_columns are overwritten with the new values, increment_columns
+    have the new values added to them, and greatest_columns and least_columns
+    keep the larger or smaller of the two values. latest_columns take the new
+    values only when the new latest_by is at least the stored one, which
+    latest_by then keeps. Each batch is sent as a single executemany
+    INSERT ... ON CONFLICT statement. The caller is responsible for committing.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    def updates(new_values):
+        values = {column: new_values[column] for column in update_columns}
+        values.update({column: table.c[column] + new_values[column] for column in increment_columns})
+        values.update({
+            column: case((new_values[column] > table.c[column], new_values[column]), else_=table.c[column])
+            for column in greatest_columns
+        })
+        values.update({
+            column: case((new_values[column] < table.c[column], new_values[column]), else_=table.c[column])
+            for column in least_columns
+        })
+        if latest_by:
+            is_latest = or_(table.c[latest_by].is_(None), new_values[latest_by] >= table.c[latest_by])
+            # MySQL applies assignments in order, so latest_by has to change last
+            for column in [*latest_columns, latest_by]:
+                values[column] = case((is_latest, new_values[column]), else_=table.c[column])
+        return values
+
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=updates(stmt.excluded))
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=updates(stmt.excluded))
+    elif dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update(updates(stmt.inserted))
+    else:
+        raise ValueError(f"Bulk upserts are not supported for the {dialect} dialect")
+
+    count = 0
+    for batch in chunked(rows, batch_size):
+        db.session.execute(stmt, batch)
+        count += len(batch)
+    return count
+
+def delete_duplicates(model, key_columns: list, batch_size: int = 1000):
+    """Delete all but the newest row (highest id) of each group of rows sharing key_columns, returning the number deleted.
+
+    Readies a table written by an append-only writer for a unique
+    constraint on key_columns; each batch is committed.
+    """
+    keys = [getattr(model, column) for column in key_columns]
+    newest = db.session.query(*keys, func.max(model.id).label('id')).group_by(*keys).having(
+        func.count() > 1
+    ).subquery()
+    deleted = 0
+    while True:
+        row_ids = [row.id for row in db.session.query(model.id).join(newest, and_(
+            *[key == newest.c[column] for key, column in zip(keys, key_columns)],
+            model.id < newest.c.id
+        )).limit(batch_size).all()]
+        if not row_ids:
+            return deleted
+        model.query.filter(model.id.in_(row_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(row_ids)
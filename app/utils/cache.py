@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import jsonify, request
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a TTL per entry."""
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: int = None):
+        with self.lock:
+            self._store(key, value, ttl)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def add(self, key: str, value, ttl: int = None):
+        """Store value unless key already holds one; return the value now stored."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                return entry[0]
+            self._store(key, value, ttl)
+            return value
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _store(self, key, value, ttl):
+        self.entries[key] = (value, time.monotonic() + ttl if ttl else None)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+class RedisCacheBackend:
+    """Cache shared between processes in Redis; configure maxmemory-policy allkeys-lru for LRU eviction."""
+    name = 'redis'
+
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value, ttl: int = None):
+        self.client.set(key, json.dumps(value), ex=ttl)
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+    def add(self, key: str, value, ttl: int = None):
+        if self.client.set(key, json.dumps(value), ex=ttl, nx=True):
+            return value
+        return self.get(key)
+
+    def __len__(self):
+        return self.client.dbsize()
+
+class ResponseCache:
+    """Caches JSON responses per product, invalidated when new data is written for the product.
+
+    Each product has a generation that is part of every cache key; invalidating
+    the product moves it to a new generation, so old entries are never read
+    again and age out through TTL or LRU eviction.
+    """
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config['RESPONSE_CACHE_BACKEND']
+        if backend == 'memory':
+            self.backend = MemoryCacheBackend(app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        elif backend == 'redis':
+            self.backend = RedisCacheBackend(app.config['RESPONSE_CACHE_URL'])
+        elif backend != 'none':
+            raise ValueError(f"Unknown response cache backend: {backend}")
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        app.extensions['response_cache'] = self
+
+    def cached_product_response(self, endpoint: str):
+        """Cache a view taking product_id, keyed by product, endpoint and query parameters."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(product_id, **kwargs):
+                if self.backend is None:
+                    return view(product_id, **kwargs)
+
+                key = self._key(product_id, endpoint, sorted(request.args.items(multi=True)))
+                cached = self.backend.get(key)
+                self._count(cached is not None)
+                if cached is not None:
+                    return jsonify(cached)
+
+                response = view(product_id, **kwargs)
+                if getattr(response, 'status_code', None) == 200 and response.is_json:
+                    self.backend.set(key, response.get_json(), self.ttl)
+                return response
+            return wrapper
+        return decorator
+
+    @property
+    def shared(self):
+        """Whether invalidations made in this process reach every process's cache."""
+        return self.backend is None or self.backend.name != 'memory'
+
+    def invalidate_product(self, product_id: int):
+        """Drop every cached response for a product."""
+        if self.backend is not None:
+            self.backend.set(self._generation_key(product_id), time.time_ns())
+
+    def stats(self):
+        """Hit and miss counters for this process."""
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        return {
+            'backend': self.backend.name if self.backend else None,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'entries': len(self.backend) if self.backend else 0
+        }
+
+    def _key(self, product_id, endpoint, params):
+        # A missing generation starts a new one, so an evicted generation can never revive stale entries
+        generation = self.backend.add(self._generation_key(product_id), time.time_ns())
+        return f"response:product:{product_id}:{generation}:{endpoint}:{json.dumps(params)}"
+
+    def _generation_key(self, product_id):
+        return f"response:product:{product_id}:generation"
+
+    def _count(self, hit: bool):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -0,0 +1,64 @@
+import gzip
+import io
+import pandas as pd
+from sp_api.base import Marketplaces
+
+SALES_KEY_COLUMNS = ['asin', 'date', 'marketplace']
+
+# Sales channel domain of each marketplace, e.g. 'Amazon.co.uk'
+SALES_CHANNEL_DOMAINS = {
+    'US': 'com', 'CA': 'ca', 'MX': 'com.mx', 'BR': 'com.br',
+    'GB': 'co.uk', 'DE': 'de', 'FR': 'fr', 'IT': 'it', 'ES': 'es', 'NL': 'nl', 'BE': 'com.be', 'IE': 'ie',
+    'SE': 'se', 'PL': 'pl', 'TR': 'com.tr', 'AE': 'ae', 'SA': 'sa', 'EG': 'eg', 'IN': 'in', 'ZA': 'co.za',
+    'JP': 'co.jp', 'AU': 'com.au', 'SG': 'sg',
+}
+
+# Marketplace ID for each way reports tag a marketplace: ID, country code or sales channel, lowercased
+MARKETPLACE_TAGS = {
+    **{marketplace.marketplace_id.lower(): marketplace.marketplace_id for marketplace in Marketplaces},
+    **{marketplace.name.lower(): marketplace.marketplace_id for marketplace in Marketplaces},
+    'uk': Marketplaces.GB.marketplace_id,
+    **{f'amazon.{domain}': Marketplaces[code].marketplace_id for code, domain in SALES_CHANNEL_DOMAINS.items()},
+}
+
+def normalize_columns(df: pd.DataFrame):
+    """Normalize flat file headers, e.g. 'Item-Price' -> 'item_price'."""
+    df.columns = [str(column).strip().lower().replace('-', '_').replace(' ', '_') for column in df.columns]
+    return df
+
+def marketplace_ids(tags: pd.Series, default_marketplace: str):
+    """Map report marketplace tags to marketplace IDs, attributing missing or unknown tags to default_marketplace."""
+    return tags.astype('string').str.strip().str.lower().map(MARKETPLACE_TAGS).fillna(default_marketplace)
+
+def aggregate_sales(df: pd.DataFrame, default_marketplace: str = 'Unknown'):
+    """Sum quantity and revenue per ASIN, day and marketplace ID.
+
+    The marketplace comes from the marketplace or sales channel column;
+    rows without one, or with one that is not an Amazon marketplace, are
+    attributed to default_marketplace.
+    """
+    df = normalize_columns(df)
+    if 'marketplace' not in df.columns:
+        df['marketplace'] = df['sales_channel'] if 'sales_channel' in df.columns else None
+
+    df['marketplace'] = marketplace_ids(df['marketplace'], default_marketplace)
+    df['date'] = pd.to_datetime(df['date']).dt.date
+    df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce').fillna(0).astype(int)
+    df['revenue'] = pd.to_numeric(df['revenue'], errors='coerce').fillna(0.0).astype(float)
+
+    return df.groupby(SALES_KEY_COLUMNS, as_index=False).agg({
+        'quantity': 'sum',
+        'revenue': 'sum'
+    })
+
+def open_text_stream(fileobj, compression: str = None, encoding: str = 'utf-8'):
+    """Wrap a binary file-like object as a text stream, decompressing gzip on the fly."""
+    if compression and compression.upper() == 'GZIP':
+        fileobj = gzip.GzipFile(fileobj=fileobj, mode='rb')
+    return io.TextIOWrapper(fileobj, encoding=encoding, newline='')
+
+def iter_flat_file_batches(source, batch_size: int):
+    """Parse a tab-separated flat file from a file-like source in batches of at most batch_size rows."""
+    with pd.read_csv(source, sep='\t', chunksize=batch_size, dtype=str) as reader:
+        for batch in reader:
+            yield batch
@@ -0,0 +1,42 @@
+import re
+
+# Words that never make a useful search keyword on their own, nor start or end a phrase
+STOP_WORDS = frozenset('''
+a about above after all also an and any are as at be because been before being below between both but by
+can did do does doing down during each few for from further had has have having he her here hers him his
+how i if in into is it its itself just me more most my no nor not now of off on once only or other our out
+over own same she should so some such than that the their them then there these they this those through to
+too under until up very was we were what when where which while who whom why will with you your
+pack pcs pc piece pieces set count ct new
+'''.split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['&+][a-z0-9]+)*")
+# Title separators that end a phrase, e.g. "Brand - Widget, Red | 2 Pack"
+PHRASE_BREAK_PATTERN = re.compile(r"[,;:|/()\[\]{}!?.–—]|\s-\s")
+
+def normalize_keyword(text: str):
+    """Lowercase a keyword, drop punctuation and collapse whitespace."""
+    return ' '.join(TOKEN_PATTERN.findall(text.lower()))
+
+def extract_keywords(text: str, max_ngram: int = 3, max_keywords: int = None):
+    """Extract unique search keywords and phrases from product text, in order of appearance.
+
+    Single words are kept unless they are stop words, one character long or
+    purely numeric. Phrases of up to max_ngram words never cross title
+    separators and never start or end with a stop word.
+    """
+    keywords = {}
+    for segment in PHRASE_BREAK_PATTERN.split((text or '').lower()):
+        tokens = TOKEN_PATTERN.findall(segment)
+        for start in range(len(tokens)):
+            for size in range(1, max_ngram + 1):
+                phrase = tokens[start:start + size]
+                if len(phrase) < size or not _is_keyword_edge(phrase[0]) or not _is_keyword_edge(phrase[-1]):
+                    continue
+                keywords.setdefault(' '.join(phrase), None)
+                if max_keywords and len(keywords) >= max_keywords:
+                    return list(keywords)
+    return list(keywords)
+
+def _is_keyword_edge(token: str):
+    return token not in STOP_WORDS and len(token) > 1 and not token.isdigit()
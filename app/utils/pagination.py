@@ -0,0 +1,58 @@
+import base64
+import json
+from datetime import date, datetime
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import Date, DateTime, literal, tuple_
+
+def encode_cursor(*values):
+    """Encode the sort key of the last row on a page as an opaque cursor."""
+    values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str):
+    """Decode a cursor produced by encode_cursor, raising ValueError if it is malformed."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def page_size():
+    """The requested page size, capped at API_MAX_PAGE_SIZE."""
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    return max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+
+def keyset_page(query, sort_columns: list, cursor: str, limit: int, descending: bool = False):
+    """Return (rows, next_cursor) for the page of query after cursor.
+
+    query must be ordered by sort_columns, all ascending or with descending
+    all descending, which must end in a unique column, and select each sort
+    column under its own name.
+    """
+    if cursor:
+        values = [_parse_cursor_value(column, value) for column, value in zip(sort_columns, decode_cursor(cursor))]
+        keys = tuple_(*sort_columns)
+        last = tuple_(*[literal(value, type_=column.type) for column, value in zip(sort_columns, values)])
+        query = query.filter(keys < last if descending else keys > last)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*[getattr(rows[-1], column.key) for column in sort_columns])
+
+def ndjson_response(records):
+    """Stream an iterable of dicts as newline-delimited JSON."""
+    def generate():
+        for record in records:
+            yield json.dumps(record) + '\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _parse_cursor_value(column, value):
+    try:
+        if isinstance(column.type, DateTime):
+            return datetime.fromisoformat(value)
+        if isinstance(column.type, Date):
+            return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+    return value
@@ -0,0 +1,102 @@
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app import db
+from app.models import Sale, DailySalesRollup, CompetitorPrice, ProfitMargin, KeywordPerformance
+from app.services.competitor_tracker import CompetitorTracker
+from app.services.sales_rollup import SalesRollup
+from app.services.tracking import TrackingScheduler
+
+# Any SCAN reads every row, even one walking an index (SCAN t USING INDEX i); only SEARCH seeks
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)\b')
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+def service_queries(product_id: int = 1):
+    """Representative queries issued by the tracker services and routes, keyed by name."""
+    now = datetime.utcnow()
+    today = now.date()
+    return {
+        'sales_by_date_range': Sale.query.filter(
+            Sale.date >= today - timedelta(days=30),
+            Sale.date <= today
+        ),
+        'sales_rollup_product_totals': DailySalesRollup.query.filter(
+            DailySalesRollup.product_id == product_id
+        ),
+        'sales_rollup_marketplace_refresh': SalesRollup()._marketplace_totals().filter(
+            DailySalesRollup.date >= today - timedelta(days=30),
+            DailySalesRollup.date <= today
+        ),
+        'competitor_price_history': CompetitorTracker(None).price_history_query(product_id, days=30)[0],
+        'competitor_price_history_daily': CompetitorTracker(None).price_history_query(product_id, days=365)[0],
+        'competitor_latest_prices': CompetitorTracker(None)._ranked_prices(
+            product_id,
+            CompetitorPrice.last_seen_at >= now - timedelta(hours=24)
+        ),
+        'competitor_previous_prices': CompetitorTracker(None)._ranked_prices(
+            product_id,
+            CompetitorPrice.timestamp < now - timedelta(hours=24)
+        ),
+        'profit_trends': ProfitMargin.query.filter(
+            ProfitMargin.product_id == product_id
+        ).order_by(ProfitMargin.date.desc()).limit(30),
+        'profit_performance': ProfitMargin.query.filter(
+            ProfitMargin.product_id == product_id
+        ),
+        'keyword_trends': KeywordPerformance.query.filter(
+            KeywordPerformance.product_id == product_id,
+            KeywordPerformance.date >= today - timedelta(days=30)
+        ).order_by(KeywordPerformance.date.desc(), KeywordPerformance.keyword),
+        'keyword_top': KeywordPerformance.query.filter(
+            KeywordPerformance.product_id == product_id,
+            KeywordPerformance.date >= today - timedelta(days=7)
+        ).order_by(KeywordPerformance.conversions.desc()).limit(10),
+        'keyword_rankings': KeywordPerformance.query.filter(
+            KeywordPerformance.product_id == product_id,
+            KeywordPerformance.date == today
+        ).order_by(KeywordPerformance.search_rank),
+        'keyword_history': KeywordPerformance.query.filter(
+            KeywordPerformance.product_id == product_id,
+            KeywordPerformance.keyword == 'keyword',
+            KeywordPerformance.date >= today - timedelta(days=30)
+        ),
+        'tracking_due': TrackingScheduler().due_query('prices', now),
+    }
+
+def explain(query):
+    """Return the database's query plan for a query as a list of lines."""
+    connection = db.session.connection()
+    dialect = connection.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect.name == 'sqlite':
+        rows = connection.execute(text(f'EXPLAIN QUERY PLAN {sql}')).all()
+        return [row[-1] for row in rows]
+    if dialect.name == 'postgresql':
+        # Make the planner report a sequential scan only when no index can serve the query
+        connection.execute(text('SET LOCAL enable_seqscan = off'))
+        rows = connection.execute(text(f'EXPLAIN {sql}')).all()
+        return [row[0] for row in rows]
+    raise ValueError(f"Query plans are not supported for the {dialect.name} dialect")
+
+def full_table_scans(plan: list):
+    """Return the names of tables the plan reads with a full table scan."""
+    tables = set(db.metadata.tables)
+    scans = []
+    for line in plan:
+        match = SQLITE_FULL_SCAN.match(line.strip()) or POSTGRES_FULL_SCAN.search(line)
+        if match and match.group(1) in tables:
+            scans.append(match.group(1))
+    return scans
+
+def check_query_plans(product_id: int = 1):
+    """EXPLAIN every service query and return {name: [fully scanned tables]} for offenders."""
+    failures = {}
+    try:
+        for name, query in service_queries(product_id).items():
+            scans = full_table_scans(explain(query))
+            if scans:
+                failures[name] = scans
+    finally:
+        db.session.rollback()
+    return failures
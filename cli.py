@@ -3,6 +3,18 @@ from flask.cli import with_appcontext
 from app import db
 from app.models import Product, Sale, Report
 
+def _warn_if_cache_not_shared():
+    """Warn that this process's writes can't invalidate the web server's in-process response cache."""
+    from app import response_cache
+
+    if not response_cache.shared:
+        click.echo(
+            'Warning: RESPONSE_CACHE_BACKEND=memory keeps the response cache inside each process, so data this '
+            'command writes only shows in the API once cached responses expire (RESPONSE_CACHE_TTL). '
+            'Use RESPONSE_CACHE_BACKEND=redis to invalidate them right away.',
+            err=True
+        )
+
 @click.command('init-db')
 @with_appcontext
 def init_db_command():
@@ -14,6 +26,302 @@ def init_db_command():
     except Exception as e:
         click.echo(f'Error initializing database: {str(e)}')
 
+@click.command('run-report-jobs')
+@click.option('--status', 'statuses', multiple=True, default=['queued'],
+              help='Job states to run (default: queued).')
+@with_appcontext
+def run_report_jobs_command(statuses):
+    """Run pending report jobs in the foreground, e.g. after a restart."""
+    from app.services.report_jobs import ReportJobRunner
+
+    runner = ReportJobRunner()
+    report_ids = [report.id for report in Report.query.filter(Report.status.in_(statuses)).all()]
+    for report_id in report_ids:
+        success = runner.run(report_id)
+        click.echo(f"Report {report_id}: {'done' if success else 'failed'}")
+    click.echo(f'Ran {len(report_ids)} report jobs.')
+
+@click.command('rebuild-sales-rollup')
+@with_appcontext
+def rebuild_sales_rollup_command():
+    """Rebuild the daily sales rollup from the Sale table."""
+    from app.services.sales_rollup import SalesRollup
+
+    count = SalesRollup().rebuild()
+    click.echo(f'Rebuilt sales rollup with {count} rows.')
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    """EXPLAIN the service queries and fail if any falls back to a full table scan."""
+    from app.utils.query_plans import check_query_plans
+
+    failures = check_query_plans()
+    for name, tables in failures.items():
+        click.echo(f"{name}: full table scan on {', '.join(tables)}")
+    if failures:
+        raise SystemExit(1)
+    click.echo('All service queries use indexes.')
+
+@click.command('refresh-competitor-prices')
+@click.option('--batch-size', default=500, help='Products per tracking batch.')
+@with_appcontext
+def refresh_competitor_prices_command(batch_size):
+    """Refresh competitor prices for the whole catalog in every marketplace."""
+    from app.services.amazon_sp_api import for_each_marketplace
+    from app.services.competitor_tracker import CompetitorTracker
+    from app.utils.bulk import chunked
+
+    _warn_if_cache_not_shared()
+
+    products = db.session.query(Product.id, Product.asin).order_by(Product.id).all()
+
+    def refresh(service):
+        tracker = CompetitorTracker(service)
+        total = 0
+        for batch in chunked(products, batch_size):
+            product_ids = tracker.track_catalog_prices(batch)
+            if product_ids is None or len(product_ids) < len(batch):
+                click.echo(f'Failed to refresh some {service.marketplace.name} prices for products {batch[0].id}-{batch[-1].id}.')
+            total += len(product_ids or ())
+        return total
+
+    totals = for_each_marketplace(refresh)
+    for marketplace, total in totals.items():
+        click.echo(f'{marketplace}: refreshed competitor prices for {total} of {len(products)} products.')
+
+@click.command('tracking-scheduler')
+@click.option('--workers', type=int, default=None, help='Scheduler processes, each owning a shard of the catalog (default: TRACKING_WORKERS).')
+@click.option('--once', is_flag=True, help='Run a single pass over due products and exit.')
+@with_appcontext
+def tracking_scheduler_command(workers, once):
+    """Keep competitor prices, keywords and profit margins fresh for the whole catalog."""
+    from flask import current_app
+    from app.services.tracking import TrackingScheduler, run_tracking_workers
+
+    _warn_if_cache_not_shared()
+
+    workers = workers or current_app.config['TRACKING_WORKERS']
+    poll_interval = current_app.config['TRACKING_POLL_INTERVAL']
+    if workers == 1:
+        scheduler = TrackingScheduler()
+        if once:
+            for data_type, tracked in scheduler.run_once().items():
+                click.echo(f'Tracked {data_type} for {tracked} products.')
+        else:
+            scheduler.run_forever(poll_interval)
+        return
+
+    click.echo(f'Starting {workers} tracking scheduler workers.')
+    if not run_tracking_workers(workers, poll_interval, once=once):
+        raise SystemExit(1)
+
+@click.command('tracking-status')
+@with_appcontext
+def tracking_status_command():
+    """Show tracking queue depth and lag per data type."""
+    from app.services.tracking import TrackingScheduler
+
+    for data_type, status in TrackingScheduler().queue_status().items():
+        click.echo(
+            f"{data_type}: {status['due']} due of {status['scheduled']} scheduled, "
+            f"{status['failed']} failed, lag {status['lag_seconds']:.0f}s"
+        )
+
+@click.command('keyword-opportunities')
+@click.option('--days', default=30, help='Days of keyword performance to evaluate.')
+@click.option('--limit', default=50, help='Number of top opportunities to show.')
+@click.option('--benchmark', is_flag=True, help='Compare against the per-product loop over the same data.')
+@with_appcontext
+def keyword_opportunities_command(days, limit, benchmark):
+    """Rank keyword opportunities across the whole catalog."""
+    import time
+    from app.services.keyword_opportunities import KeywordOpportunityEngine
+    from app.services.keyword_tracker import KeywordTracker
+
+    engine = KeywordOpportunityEngine()
+    for opportunity in engine.get_opportunities(days=days, limit=limit):
+        click.echo(f"{opportunity['product_id']}\t{opportunity['keyword']}\t{opportunity['type']}\t"
+                   f"{opportunity['value']:.4g}\t{opportunity['suggestion']}")
+
+    if benchmark:
+        start = time.perf_counter()
+        legacy_types = {'low_ctr', 'low_conversion', 'high_acos'}
+        vectorized = engine.evaluate(engine.load_performance(days), latest_only=False)
+        vectorized_count = int(vectorized['type'].isin(legacy_types).sum())
+        vectorized_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tracker = KeywordTracker(None)
+        product_ids = [row.id for row in db.session.query(Product.id).all()]
+        loop_count = sum(len(tracker.get_keyword_opportunities(product_id)) for product_id in product_ids)
+        loop_seconds = time.perf_counter() - start
+
+        click.echo(f'Vectorized: {vectorized_count} opportunities in {vectorized_seconds:.3f}s')
+        click.echo(f'Per-product loop: {loop_count} opportunities in {loop_seconds:.3f}s')
+        if vectorized_count != loop_count:
+            click.echo('Results differ; the loop only applies the default thresholds.')
+
+@click.command('backfill-profit')
+@click.option('--days', default=90, help='Days of profit margins to compute, ending today.')
+@click.option('--batch-size', default=500, help='Products per batch.')
+@with_appcontext
+def backfill_profit_command(days, batch_size):
+    """Compute profit margins for the whole catalog over a date range."""
+    from app.services.amazon_sp_api import get_sp_api_service
+    from app.services.profit_engine import ProfitEngine, backfill_dates
+    from app.utils.bulk import chunked
+
+    _warn_if_cache_not_shared()
+
+    engine = ProfitEngine(get_sp_api_service())
+    start_date, end_date = backfill_dates(days)
+    products = db.session.query(Product.id, Product.asin).order_by(Product.id).all()
+    stored = 0
+    for batch in chunked(products, batch_size):
+        product_ids = engine.calculate_profit_margins(batch, start_date, end_date)
+        if product_ids is None:
+            click.echo(f'Failed to compute profit margins for products {batch[0].id}-{batch[-1].id}.')
+            continue
+        stored += len(product_ids)
+    click.echo(f'Computed {days} days of profit margins for {stored} of {len(products)} products.')
+
+@click.command('warm-catalog-cache')
+@click.option('--batch-size', default=500, help='ASINs per batch.')
+@with_appcontext
+def warm_catalog_cache_command(batch_size):
+    """Prefetch catalog details for every product whose cached details are stale."""
+    from app.services.amazon_sp_api import get_sp_api_service
+    from app.services.catalog_cache import CatalogCache
+
+    asins = [row.asin for row in db.session.query(Product.asin).order_by(Product.id).all()]
+    fetched = CatalogCache(get_sp_api_service()).warm(asins, batch_size)
+    click.echo(f'Fetched catalog details for {fetched} of {len(asins)} products.')
+
+@click.command('compact-competitor-prices')
+@with_appcontext
+def compact_competitor_prices_command():
+    """Downsample expired competitor prices into hourly and daily rollups and purge them."""
+    from app.services.price_retention import PriceRetention
+
+    result = PriceRetention().compact()
+    click.echo(
+        f"Compacted {result['raw_rows_compacted']} raw prices for {result['products']} products "
+        f"and purged {result['hourly_rollups_purged']} hourly rollups."
+    )
+
+@click.command('backfill-competitor-price-last-seen')
+@with_appcontext
+def backfill_competitor_price_last_seen_command():
+    """Set last_seen_at on competitor prices stored before it was added."""
+    from flask import current_app
+    from app.services.competitor_tracker import backfill_last_seen_at
+
+    updated = backfill_last_seen_at(current_app.config['COMPETITOR_PRICE_PURGE_BATCH_SIZE'])
+    click.echo(f'Set last_seen_at on {updated} competitor prices.')
+
+@click.command('dedupe-unique-keys')
+@with_appcontext
+def dedupe_unique_keys_command():
+    """Delete duplicate sales, profit margins and keyword performance rows, keeping the newest of each key."""
+    from flask import current_app
+    from app.models import KeywordPerformance, ProfitMargin
+    from app.utils.bulk import delete_duplicates
+
+    # Sales stored before marketplaces were tagged have none; they are keyed as 'Unknown'
+    Sale.query.filter(Sale.marketplace.is_(None)).update({'marketplace': 'Unknown'}, synchronize_session=False)
+    db.session.commit()
+
+    batch_size = current_app.config['BULK_INSERT_BATCH_SIZE']
+    for model, key_columns in (
+        (Sale, ['product_id', 'date', 'marketplace']),
+        (ProfitMargin, ['product_id', 'date']),
+        (KeywordPerformance, ['product_id', 'keyword', 'date']),
+    ):
+        deleted = delete_duplicates(model, key_columns, batch_size)
+        click.echo(f'{model.__tablename__}: deleted {deleted} duplicate rows.')
+
+@click.command('backfill-sale-marketplaces')
+@with_appcontext
+def backfill_sale_marketplaces_command():
+    """Move sales stored as 'Unknown' or under a report's own marketplace tag to marketplace IDs."""
+    from flask import current_app
+    from app.services.amazon_sp_api import configured_marketplaces
+    from app.services.sales_rollup import backfill_sale_marketplaces
+
+    default_marketplace = configured_marketplaces()[0].marketplace_id
+    moved = backfill_sale_marketplaces(default_marketplace, current_app.config['BULK_INSERT_BATCH_SIZE'])
+    click.echo(f'Moved {moved} sales to their marketplace IDs; untagged sales went to {default_marketplace}.')
+
+@click.command('migrate-report-data')
+@with_appcontext
+def migrate_report_data_command():
+    """Move processed data still held in Report.data into the Parquet report store."""
+    from app.services.report_store import ReportStore
+
+    store = ReportStore()
+    report_ids = [row.id for row in db.session.query(Report.id).filter(
+        Report.data.isnot(None), Report.data_file.is_(None)
+    ).order_by(Report.id).all()]
+    for report_id in report_ids:
+        report = db.session.get(Report, report_id)
+        report.data_file = store.write(report.id, report.data, report.type)
+        report.row_count = len(report.data)
+        report.byte_size = store.size(report.data_file)
+        report.data = db.null()
+        db.session.commit()
+    click.echo(f'Moved the data of {len(report_ids)} reports to the report store.')
+
+@click.command('sync-orders')
+@with_appcontext
+def sync_orders_command():
+    """Sync orders updated since the last run, and their items, from the Orders API in every marketplace."""
+    from app.services.amazon_sp_api import for_each_marketplace
+    from app.services.order_sync import OrderSync
+
+    results = for_each_marketplace(lambda service: OrderSync(service).sync())
+    for marketplace, result in results.items():
+        if result is None:
+            click.echo(f'{marketplace}: order sync failed; the next run will retry the same window.')
+            continue
+        click.echo(
+            f"{marketplace}: synced {result['orders']} orders and {result['order_items']} order items "
+            f"up to {result['high_water_mark'].isoformat()}; {result['failed_orders']} orders' items will be retried."
+        )
+
+@click.command('sync-sales')
+@with_appcontext
+def sync_sales_command():
+    """Ingest sales reports for the days not yet synced in every marketplace, resuming unfinished windows."""
+    from app.services.amazon_sp_api import for_each_marketplace
+    from app.services.sales_sync import SalesSync
+
+    results = for_each_marketplace(lambda service: SalesSync(service).sync())
+    for marketplace, result in results.items():
+        if result is None:
+            click.echo(f'{marketplace}: sales sync failed.')
+            continue
+        click.echo(
+            f"{marketplace}: synced {result['done']} of {result['windows']} windows; "
+            f"sales are complete through {result['synced_through'].isoformat()}."
+        )
+
 def init_app(app):
     """Register database commands with the Flask app."""
-    app.cli.add_command(init_db_command) 
\ No newline at end of file
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(run_report_jobs_command)
+    app.cli.add_command(rebuild_sales_rollup_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(refresh_competitor_prices_command)
+    app.cli.add_command(tracking_scheduler_command)
+    app.cli.add_command(tracking_status_command)
+    app.cli.add_command(keyword_opportunities_command)
+    app.cli.add_command(backfill_profit_command)
+    app.cli.add_command(warm_catalog_cache_command)
+    app.cli.add_command(compact_competitor_prices_command)
+    app.cli.add_command(backfill_competitor_price_last_seen_command)
+    app.cli.add_command(dedupe_unique_keys_command)
+    app.cli.add_command(backfill_sale_marketplaces_command)
+    app.cli.add_command(migrate_report_data_command)
+    app.cli.add_command(sync_orders_command)
+    app.cli.add_command(sync_sales_command)
@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -18,4 +19,80 @@ class Config:
     AMAZON_AWS_ACCESS_KEY = os.getenv('AMAZON_AWS_ACCESS_KEY')
     AMAZON_AWS_SECRET_KEY = os.getenv('AMAZON_AWS_SECRET_KEY')
     AMAZON_ROLE_ARN = os.getenv('AMAZON_ROLE_ARN')
-    AMAZON_MARKETPLACE_ID = os.getenv('AMAZON_MARKETPLACE_ID')
+    AMAZON_MARKETPLACE_ID = os.getenv('AMAZON_MARKETPLACE_ID')  # used when AMAZON_MARKETPLACES is unset
+    AMAZON_MARKETPLACES = [code.strip() for code in os.getenv('AMAZON_MARKETPLACES', '').split(',') if code.strip()]  # e.g. US,CA,MX,GB,DE; the first is the primary
+    SP_API_MAX_WORKERS = int(os.getenv('SP_API_MAX_WORKERS', 8))  # concurrent SP-API calls per operation batch
+    SP_API_MAX_RETRIES = int(os.getenv('SP_API_MAX_RETRIES', 5))  # retries for throttled (429) calls
+    SP_API_RETRY_BACKOFF = float(os.getenv('SP_API_RETRY_BACKOFF', 1.0))  # base backoff in seconds
+
+    # API pagination
+    API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 1000))
+    API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 10000))
+
+    # Report jobs
+    REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', 2))
+    REPORT_POLL_INTERVAL = int(os.getenv('REPORT_POLL_INTERVAL', 30))  # seconds
+    REPORT_POLL_TIMEOUT = int(os.getenv('REPORT_POLL_TIMEOUT', 3600))  # seconds
+    REPORT_CHUNK_SIZE = int(os.getenv('REPORT_CHUNK_SIZE', 50000))  # flat file rows per batch
+    REPORT_STORE_DIR = os.getenv('REPORT_STORE_DIR')  # Parquet files of processed reports, instance/reports if unset
+
+    # Order sync
+    ORDER_SYNC_INITIAL_DAYS = int(os.getenv('ORDER_SYNC_INITIAL_DAYS', 30))  # history pulled by the first sync
+    ORDER_SYNC_OVERLAP = int(os.getenv('ORDER_SYNC_OVERLAP', 300))  # seconds re-read before the high-water mark
+    ORDER_SYNC_BATCH_SIZE = int(os.getenv('ORDER_SYNC_BATCH_SIZE', 100))  # orders per concurrent item fetch
+
+    # Sales sync
+    SALES_SYNC_INITIAL_DAYS = int(os.getenv('SALES_SYNC_INITIAL_DAYS', 365))  # history pulled by the first sync
+    SALES_SYNC_LOOKBACK_DAYS = int(os.getenv('SALES_SYNC_LOOKBACK_DAYS', 1))  # synced days re-pulled in case Amazon revised them
+    SALES_SYNC_WINDOW_DAYS = int(os.getenv('SALES_SYNC_WINDOW_DAYS', 7))  # days per report request
+    SALES_SYNC_WORKERS = int(os.getenv('SALES_SYNC_WORKERS', 4))  # windows synced concurrently
+
+    # Bulk writes
+    BULK_INSERT_BATCH_SIZE = int(os.getenv('BULK_INSERT_BATCH_SIZE', 1000))
+
+    # Catalog details cache
+    CATALOG_DETAILS_TTL = int(os.getenv('CATALOG_DETAILS_TTL', 604800))  # seconds, for fields without their own TTL
+    CATALOG_FIELD_TTLS = {
+        'price': int(os.getenv('CATALOG_PRICE_TTL', 3600)),
+    }
+    CATALOG_NOT_FOUND_TTL = int(os.getenv('CATALOG_NOT_FOUND_TTL', 86400))  # seconds to remember unknown ASINs
+    CATALOG_CACHE_MAX_ENTRIES = int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', 10000))  # in-memory LRU size
+
+    # Keyword tracking
+    KEYWORD_MAX_NGRAM = int(os.getenv('KEYWORD_MAX_NGRAM', 3))  # longest phrase extracted from titles, in words
+    KEYWORD_MAX_PER_PRODUCT = int(os.getenv('KEYWORD_MAX_PER_PRODUCT', 50))
+    KEYWORD_OPPORTUNITY_RULES = json.loads(os.getenv('KEYWORD_OPPORTUNITY_RULES', 'null'))  # JSON rule list, default rules if unset
+
+    # Competitor price storage
+    COMPETITOR_PRICE_STORAGE = os.getenv('COMPETITOR_PRICE_STORAGE', 'dense')  # dense: a row per poll, changes: a row per change
+    COMPETITOR_PRICE_STATE_CACHE_SIZE = int(os.getenv('COMPETITOR_PRICE_STATE_CACHE_SIZE', 10000))  # products
+
+    # Competitor price retention
+    COMPETITOR_PRICE_RAW_RETENTION_DAYS = int(os.getenv('COMPETITOR_PRICE_RAW_RETENTION_DAYS', 7))
+    COMPETITOR_PRICE_HOURLY_RETENTION_DAYS = int(os.getenv('COMPETITOR_PRICE_HOURLY_RETENTION_DAYS', 90))  # daily rollups are kept forever
+    COMPETITOR_PRICE_ARCHIVE = os.getenv('COMPETITOR_PRICE_ARCHIVE', 'false').lower() == 'true'  # keep compacted raw rows as gzipped CSV
+    COMPETITOR_PRICE_PURGE_BATCH_SIZE = int(os.getenv('COMPETITOR_PRICE_PURGE_BATCH_SIZE', 10000))
+
+    # Profit fee schedule
+    PROFIT_REFERRAL_FEE_RATE = float(os.getenv('PROFIT_REFERRAL_FEE_RATE', 0.15))  # fraction of selling price
+    PROFIT_FBA_FEE_PER_UNIT = float(os.getenv('PROFIT_FBA_FEE_PER_UNIT', 3.31))
+    PROFIT_SHIPPING_COST_PER_UNIT = float(os.getenv('PROFIT_SHIPPING_COST_PER_UNIT', 2.50))
+
+    # Competitor price alerts
+    PRICE_ALERT_THRESHOLD = float(os.getenv('PRICE_ALERT_THRESHOLD', 0.1))  # fractional price change
+    PRICE_ALERT_LOOKBACK_HOURS = int(os.getenv('PRICE_ALERT_LOOKBACK_HOURS', 24))
+
+    # Response cache for the product analytics endpoints
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')  # memory, redis or none
+    RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL', 'redis://localhost:6379/0')
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))  # seconds
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+
+    # Tracking scheduler
+    TRACKING_PRICE_INTERVAL = int(os.getenv('TRACKING_PRICE_INTERVAL', 3600))  # seconds
+    TRACKING_KEYWORD_INTERVAL = int(os.getenv('TRACKING_KEYWORD_INTERVAL', 86400))  # seconds
+    TRACKING_PROFIT_INTERVAL = int(os.getenv('TRACKING_PROFIT_INTERVAL', 86400))  # seconds
+    TRACKING_RETRY_INTERVAL = int(os.getenv('TRACKING_RETRY_INTERVAL', 900))  # seconds before retrying a failure
+    TRACKING_BATCH_SIZE = int(os.getenv('TRACKING_BATCH_SIZE', 100))  # products per tracking batch
+    TRACKING_WORKERS = int(os.getenv('TRACKING_WORKERS', 2))  # scheduler processes, each owning a catalog shard
+    TRACKING_POLL_INTERVAL = int(os.getenv('TRACKING_POLL_INTERVAL', 60))  # seconds between scheduler passes
@@ -0,0 +1,58 @@
+import os
+import pytest
+
+# Never touch a configured database; every test gets a fresh in-memory one
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from sp_api.api import Products
+from sp_api.base import Marketplaces
+from app import create_app, db
+from app.services.amazon_sp_api import AmazonSPAPIService
+from app.services.rate_limiter import SPAPIRateLimiter
+from fake_sp_api import FakeSPAPI
+
+CREDENTIALS = {
+    'refresh_token': 'fake-refresh-token',
+    'lwa_app_id': 'fake-client-id',
+    'lwa_client_secret': 'fake-client-secret',
+}
+
+@pytest.fixture
+def app():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def fake_sp_api():
+    """Start a fake SP-API server; call it with FakeSPAPI options."""
+    servers = []
+
+    def start(**options):
+        server = FakeSPAPI(**options).__enter__()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
+
+@pytest.fixture
+def sp_api_service(app, monkeypatch):
+    """Return a function building a US service whose pricing calls go to a fake server."""
+    def build(server: FakeSPAPI, limits: dict = None, max_workers: int = 4):
+        def products_api(service):
+            # A restricted data token stands in for the LWA access token, so no token exchange is made
+            client = Products(marketplace=Marketplaces.US, credentials=CREDENTIALS, restricted_data_token='fake-token')
+            client.endpoint = server.endpoint
+            return client
+
+        monkeypatch.setattr(AmazonSPAPIService, 'products_api', property(products_api))
+        service = AmazonSPAPIService(CREDENTIALS, Marketplaces.US)
+        service.rate_limiter = SPAPIRateLimiter(limits, max_workers=max_workers, max_retries=3, backoff=0.01)
+        return service
+
+    return build
@@ -0,0 +1,112 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+COMPETITIVE_PRICING_PATH = '/products/pricing/v0/competitivePrice'
+
+class FakeSPAPI:
+    """A local stand-in for the SP-API competitive pricing endpoint.
+
+    The first `throttle` requests are answered with 429 and an
+    x-amzn-RateLimit-Limit header, like a throttled SP-API call; the rest get
+    competitive pricing for the requested ASINs, with the offers in `prices`
+    ({asin: [landed prices]}, 10.0 by default). Request times and the peak
+    number of requests in flight are recorded.
+    """
+    def __init__(self, throttle: int = 0, rate_limit: str = '0.5', prices: dict = None, latency: float = 0.0):
+        self.throttle = throttle
+        self.rate_limit = rate_limit
+        self.prices = prices or {}
+        self.latency = latency
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, path: str, query: dict):
+        """Return (status, headers, body) for a request, counting it."""
+        with self.lock:
+            self.requests.append(time.monotonic())
+            throttled = len(self.requests) <= self.throttle
+
+        if throttled:
+            return 429, {'x-amzn-RateLimit-Limit': self.rate_limit}, {
+                'errors': [{'code': 'QuotaExceeded', 'message': 'You exceeded your quota for the requested resource.'}]
+            }
+        if path != COMPETITIVE_PRICING_PATH:
+            return 404, {}, {'errors': [{'code': 'NotFound', 'message': f'No route for {path}'}]}
+
+        marketplace_id = query.get('MarketplaceId', [''])[0]
+        asins = query.get('Asins', [''])[0].split(',')
+        return 200, {'x-amzn-RateLimit-Limit': self.rate_limit}, {
+            'payload': [competitive_pricing(asin, marketplace_id, self.prices.get(asin, [10.0])) for asin in asins]
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fake.lock:
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    time.sleep(fake.latency)
+                    url = urlparse(self.path)
+                    status, headers, body = fake.respond(url.path, parse_qs(url.query))
+                finally:
+                    with fake.lock:
+                        fake.in_flight -= 1
+
+                content = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def competitive_pricing(asin: str, marketplace_id: str, prices: list):
+    """A getCompetitivePricing payload item with a New offer at each landed price."""
+    return {
+        'status': 'Success',
+        'ASIN': asin,
+        'Product': {
+            'Identifiers': {'MarketplaceASIN': {'MarketplaceId': marketplace_id, 'ASIN': asin}},
+            'CompetitivePricing': {
+                'CompetitivePrices': [{
+                    'CompetitivePriceId': str(index + 1),
+                    'Price': {
+                        'LandedPrice': {'CurrencyCode': 'USD', 'Amount': price},
+                        'ListingPrice': {'CurrencyCode': 'USD', 'Amount': price},
+                        'Shipping': {'CurrencyCode': 'USD', 'Amount': 0.0}
+                    },
+                    'condition': 'New',
+                    'belongsToRequester': False
+                } for index, price in enumerate(prices)],
+                'NumberOfOfferListings': [{'condition': 'New', 'Count': len(prices)}]
+            }
+        }
+    }
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+import pytest
+from sp_api.base import Marketplaces
+from app import db
+from app.models import CompetitorPrice, Product
+from app.services import competitor_tracker
+from app.services.competitor_tracker import CompetitorTracker
+
+POLLS = 30
+START = datetime(2026, 1, 1, 8, 0, 5)
+FAST_PRICING = {'getCompetitivePricing': (1000.0, 10)}
+
+def offer_prices(poll: int):
+    """Landed prices of the offers for the product at each poll, changing now and then."""
+    if poll < 10:
+        return [10.0, 12.0, 20.0]
+    if poll < 20:
+        return [11.0, 12.0, 20.0]
+    if poll < 25:
+        return [9.0, 12.0, 25.0]
+    return [9.0, 12.0]
+
+class Clock:
+    def __init__(self):
+        self.now = START
+
+    def utcnow(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    fake_datetime = type('datetime', (datetime,), {'utcnow': staticmethod(clock.utcnow)})
+    monkeypatch.setattr(competitor_tracker, 'datetime', fake_datetime)
+    return clock
+
+def track_polls(app, server, tracker, clock, storage: str):
+    """Poll hourly in a storage mode, returning the market position and alerts after every poll."""
+    app.config['COMPETITOR_PRICE_STORAGE'] = storage
+    competitor_tracker._price_states = None
+    db.drop_all()
+    db.create_all()
+    product = Product(asin='B000000001', title='Product')
+    db.session.add(product)
+    db.session.commit()
+
+    answers = []
+    for poll in range(POLLS):
+        clock.now = START + timedelta(hours=poll)
+        server.prices[product.asin] = offer_prices(poll)
+        assert tracker.track_catalog_prices([product]) == {product.id}
+        answers.append((
+            tracker.get_market_position(product.id),
+            tracker.get_price_alerts(product.id, threshold=0.05, lookback_hours=6)
+        ))
+    return answers, CompetitorPrice.query.count()
+
+def test_market_position_counts_every_offer_of_the_latest_poll(app, fake_sp_api, sp_api_service, clock):
+    server = fake_sp_api(prices={'B000000001': [10.0, 12.0, 20.0]})
+    tracker = CompetitorTracker(sp_api_service(server, limits=FAST_PRICING))
+    product = Product(asin='B000000001', title='Product')
+    db.session.add(product)
+    db.session.commit()
+
+    tracker.track_catalog_prices([product])
+
+    assert tracker.get_market_position(product.id) == {
+        Marketplaces.US.marketplace_id: {
+            'currency': 'USD',
+            'average_market_price': 14.0,
+            'lowest_price': 10.0,
+            'highest_price': 20.0,
+            'price_range': 10.0,
+            'competitor_count': 3
+        }
+    }
+
+def test_market_position_keeps_marketplaces_apart(app, clock):
+    tracker = CompetitorTracker(None)
+    product = Product(asin='B000000001', title='Product')
+    db.session.add(product)
+    db.session.commit()
+    us, ca = Marketplaces.US.marketplace_id, Marketplaces.CA.marketplace_id
+    # Each marketplace polls at its own time, with prices in its own currency
+    db.session.add_all([
+        CompetitorPrice(product_id=product.id, competitor_asin='B000000002', marketplace=us, price=10.0,
+                        timestamp=START, last_seen_at=START),
+        CompetitorPrice(product_id=product.id, competitor_asin='B000000003', marketplace=us, price=20.0,
+                        timestamp=START, last_seen_at=START),
+        CompetitorPrice(product_id=product.id, competitor_asin='B000000002', marketplace=ca, price=14.0,
+                        timestamp=START, last_seen_at=START + timedelta(minutes=5)),
+    ])
+    db.session.commit()
+
+    positions = tracker.get_market_position(product.id)
+
+    assert (positions[us]['currency'], positions[us]['average_market_price'], positions[us]['competitor_count']) == ('USD', 15.0, 2)
+    assert (positions[ca]['currency'], positions[ca]['average_market_price'], positions[ca]['competitor_count']) == ('CAD', 14.0, 1)
+
+@pytest.mark.parametrize('storage', ['dense', 'changes'])
+def test_market_position_follows_the_latest_poll(app, fake_sp_api, sp_api_service, clock, storage):
+    server = fake_sp_api()
+    tracker = CompetitorTracker(sp_api_service(server, limits=FAST_PRICING))
+
+    answers, _ = track_polls(app, server, tracker, clock, storage)
+
+    positions, _ = answers[-1]
+    position = positions[Marketplaces.US.marketplace_id]
+    assert position['competitor_count'] == 2
+    assert position['average_market_price'] == 10.5
+    # The range still covers the 25.0 offer seen within the last 24 hours
+    assert (position['lowest_price'], position['highest_price']) == (9.0, 25.0)
+
+def test_change_only_storage_answers_like_dense_storage(app, fake_sp_api, sp_api_service, clock):
+    server = fake_sp_api()
+    tracker = CompetitorTracker(sp_api_service(server, limits=FAST_PRICING))
+
+    dense, dense_rows = track_polls(app, server, tracker, clock, 'dense')
+    changes, change_rows = track_polls(app, server, tracker, clock, 'changes')
+
+    assert changes == dense
+    assert change_rows < dense_rows / 5
+
+def test_change_only_storage_without_multi_row_returning(app, fake_sp_api, sp_api_service, clock, monkeypatch):
+    server = fake_sp_api()
+    tracker = CompetitorTracker(sp_api_service(server, limits=FAST_PRICING))
+    dense, _ = track_polls(app, server, tracker, clock, 'dense')
+
+    # Like MySQL, which can't return the ids of a multi-row insert
+    dialect = db.session.get_bind().dialect
+    monkeypatch.setattr(dialect, 'insert_executemany_returning_sort_by_parameter_order', False)
+    changes, _ = track_polls(app, server, tracker, clock, 'changes')
+
+    assert changes == dense
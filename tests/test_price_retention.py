@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+import pandas as pd
+from app import db
+from app.models import CompetitorPrice, CompetitorPriceRollup, Product
+from app.services.competitor_tracker import backfill_last_seen_at
+from app.services.price_retention import PriceRetention
+
+START = datetime(2026, 1, 1, 0, 10)
+POLL_INTERVAL = timedelta(minutes=20)
+POLLS = 3 * 72  # three days
+
+def price_at(poll: int):
+    """The competitor's price at each poll, holding for hours or days at a time."""
+    for until, price in ((5, 10.0), (80, 12.0), (81, 9.0), (150, 11.0)):
+        if poll < until:
+            return price
+    return 10.5
+
+def dense_rows(product_id: int):
+    return [{
+        'product_id': product_id,
+        'competitor_asin': 'B000000001',
+        'marketplace': 'ATVPDKIKX0DER',
+        'price': price_at(poll),
+        'timestamp': START + poll * POLL_INTERVAL,
+        'last_seen_at': START + poll * POLL_INTERVAL,
+        'sample_count': 1
+    } for poll in range(POLLS)]
+
+def change_rows(product_id: int):
+    """The same polls stored change-only, as one interval per price."""
+    rows = []
+    for poll in range(POLLS):
+        seen_at = START + poll * POLL_INTERVAL
+        if rows and rows[-1]['price'] == price_at(poll):
+            rows[-1].update(last_seen_at=seen_at, sample_count=rows[-1]['sample_count'] + 1)
+            continue
+        if rows:
+            rows[-1]['valid_to'] = seen_at
+        rows.append({
+            'product_id': product_id,
+            'competitor_asin': 'B000000001',
+            'marketplace': 'ATVPDKIKX0DER',
+            'price': price_at(poll),
+            'timestamp': seen_at,
+            'last_seen_at': seen_at,
+            'valid_to': None,
+            'sample_count': 1
+        })
+    return rows
+
+def compacted_rollups(app, rows_for, batch_size: int):
+    db.drop_all()
+    db.create_all()
+    product = Product(asin='B000000099', title='Product')
+    db.session.add(product)
+    db.session.commit()
+    db.session.execute(CompetitorPrice.__table__.insert(), rows_for(product.id))
+    db.session.commit()
+
+    app.config['COMPETITOR_PRICE_PURGE_BATCH_SIZE'] = batch_size
+    PriceRetention().compact_product(product.id, START + timedelta(days=4))
+    assert CompetitorPrice.query.count() == 0
+    return [
+        (row.resolution, row.bucket_start, row.open_price, row.high_price, row.low_price, row.close_price, row.sample_count)
+        for row in CompetitorPriceRollup.query.order_by(CompetitorPriceRollup.resolution, CompetitorPriceRollup.bucket_start)
+    ]
+
+def test_change_only_rows_compact_like_dense_rows(app):
+    dense = compacted_rollups(app, dense_rows, batch_size=50)
+    changes = compacted_rollups(app, change_rows, batch_size=2)
+
+    assert changes == dense
+    assert len([row for row in dense if row[0] == 'hour']) == 72
+    assert sum(row[-1] for row in dense if row[0] == 'day') == POLLS
+
+def test_close_comes_from_the_latest_sample(app):
+    # Compacting in small batches merges each bucket over several transactions
+    rollups = compacted_rollups(app, dense_rows, batch_size=7)
+
+    hour = next(row for row in rollups if row[0] == 'hour' and row[1] == datetime(2026, 1, 1, 1))
+    assert hour[2:] == (10.0, 12.0, 10.0, 12.0, 3)
+
+def test_backfill_sets_last_seen_at_from_timestamp(app):
+    product = Product(asin='B000000099', title='Product')
+    db.session.add(product)
+    db.session.commit()
+    db.session.execute(CompetitorPrice.__table__.insert(), [
+        {'product_id': product.id, 'competitor_asin': 'B000000001', 'marketplace': 'ATVPDKIKX0DER',
+         'price': 10.0, 'timestamp': START + timedelta(hours=hour), 'last_seen_at': None}
+        for hour in range(5)
+    ])
+    db.session.commit()
+
+    assert backfill_last_seen_at(batch_size=2) == 5
+    assert all(row.last_seen_at == row.timestamp for row in CompetitorPrice.query)
+
+def test_failed_archive_leaves_no_files_and_keeps_the_raw_rows(app, tmp_path, monkeypatch):
+    product = Product(asin='B000000099', title='Product')
+    db.session.add(product)
+    db.session.commit()
+    # One row in each of two months, so the batch is archived to two files
+    db.session.execute(CompetitorPrice.__table__.insert(), [
+        dict(row, timestamp=seen_at, last_seen_at=seen_at)
+        for row, seen_at in zip(dense_rows(product.id), (START, START + timedelta(days=40)))
+    ])
+    db.session.commit()
+    app.config['COMPETITOR_PRICE_ARCHIVE'] = True
+    monkeypatch.setattr(app, 'instance_path', str(tmp_path))
+    to_csv = pd.DataFrame.to_csv
+    writes = []
+
+    def failing_to_csv(df, path, **kwargs):
+        writes.append(path)
+        to_csv(df, path, **kwargs)
+        if len(writes) == 2:
+            raise OSError('No space left on device')
+
+    monkeypatch.setattr(pd.DataFrame, 'to_csv', failing_to_csv)
+
+    assert PriceRetention().compact_product(product.id, START + timedelta(days=60)) == 0
+    assert [path for path in tmp_path.rglob('*') if path.is_file()] == []
+    assert CompetitorPrice.query.count() == 2
+    assert CompetitorPriceRollup.query.count() == 0
@@ -0,0 +1,15 @@
+from app.utils.query_plans import check_query_plans, full_table_scans
+
+def test_service_queries_use_indexes(app):
+    assert check_query_plans() == {}
+
+def test_scans_through_an_index_count_as_full_scans(app):
+    plan = [
+        'SCAN daily_sales_rollup USING INDEX sqlite_autoindex_daily_sales_rollup_1',
+        'SCAN sale USING COVERING INDEX ix_sale_date',
+        'SCAN tracking_schedule AS t',
+        'SEARCH product USING INTEGER PRIMARY KEY (rowid=?)',
+        'SCAN (subquery-2)',
+    ]
+
+    assert full_table_scans(plan) == ['daily_sales_rollup', 'sale', 'tracking_schedule']
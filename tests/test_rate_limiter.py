@@ -0,0 +1,73 @@
+import threading
+import pytest
+from sp_api.base.exceptions import SellingApiRequestThrottledException
+from app.services.rate_limiter import SPAPIRateLimiter
+
+def test_throttled_call_is_retried_at_the_reported_rate(fake_sp_api, sp_api_service):
+    server = fake_sp_api(throttle=1, rate_limit='5.0')
+    service = sp_api_service(server)
+
+    offers = service.get_competing_offers('B000000001')
+
+    assert [offer['price'] for offer in offers] == [10.0]
+    assert len(server.requests) == 2
+    assert service.rate_limiter.bucket('getCompetitivePricing').rate == 5.0
+
+def test_throttled_call_gives_up_after_max_retries(fake_sp_api, sp_api_service):
+    server = fake_sp_api(throttle=100, rate_limit='50.0')
+    service = sp_api_service(server)
+
+    with pytest.raises(SellingApiRequestThrottledException) as error:
+        service.rate_limiter.call(
+            'getCompetitivePricing', service.products_api.get_competitive_pricing_for_asins, ['B000000001']
+        )
+
+    assert error.value.headers['x-amzn-RateLimit-Limit'] == '50.0'
+    assert len(server.requests) == service.rate_limiter.max_retries + 1
+
+def test_failed_batches_are_reported(fake_sp_api, sp_api_service):
+    server = fake_sp_api(throttle=100, rate_limit='50.0')
+    service = sp_api_service(server)
+
+    offers, failed = service.get_competing_offers_batch(['B000000001', 'B000000002'])
+
+    assert offers == {}
+    assert failed == ['B000000001', 'B000000002']
+
+def test_concurrent_batches_stay_within_the_bucket(fake_sp_api, sp_api_service):
+    rate, burst = 20.0, 2
+    server = fake_sp_api(latency=0.05)
+    service = sp_api_service(server, limits={'getCompetitivePricing': (rate, burst)}, max_workers=4)
+    asins = [f'B{index:09d}' for index in range(120)]
+
+    offers, failed = service.get_competing_offers_batch(asins)
+
+    assert failed == []
+    assert sorted(offers) == asins
+    # Six batches of 20 ASINs, overlapping in flight but started no faster than the bucket allows
+    assert len(server.requests) == 6
+    assert server.max_in_flight > 1
+    first = server.requests[0]
+    for index, requested_at in enumerate(server.requests):
+        assert requested_at - first >= (index + 1 - burst) / rate - 0.01
+
+def test_throttled_batches_are_retried_alongside_the_rest(fake_sp_api, sp_api_service):
+    server = fake_sp_api(throttle=2, rate_limit='50.0')
+    service = sp_api_service(server, limits={'getCompetitivePricing': (50.0, 4)})
+    asins = [f'B{index:09d}' for index in range(80)]
+
+    offers, failed = service.get_competing_offers_batch(asins)
+
+    assert failed == []
+    assert sorted(offers) == asins
+    assert len(server.requests) == 6
+
+def test_map_reuses_its_worker_threads(app):
+    limiter = SPAPIRateLimiter(max_workers=3)
+    threads = set()
+
+    for _ in range(3):
+        limiter.map(lambda item: threads.add(threading.get_ident()), range(10))
+
+    # The same pool serves every call, so the threads keep their SP-API clients
+    assert len(threads) <= 3
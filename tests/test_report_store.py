@@ -0,0 +1,65 @@
+from datetime import date
+from app import db
+from app.models import Report
+from app.services.report_processor import ReportProcessor
+from app.services.report_store import ReportStore
+
+ORDERS_DOCUMENT = {'Orders': [
+    {
+        'AmazonOrderId': '111-0000001-0000001',
+        'PurchaseDate': '2026-01-01T10:00:00Z',
+        'OrderStatus': 'Shipped',
+        'OrderTotal': {'CurrencyCode': 'USD', 'Amount': '25.98'},
+        'OrderItems': [{'ASIN': 'B000000001', 'Title': 'Widget', 'QuantityOrdered': 2,
+                        'ItemPrice': {'CurrencyCode': 'USD', 'Amount': '25.98'}}]
+    },
+    {
+        # Pending orders have no OrderTotal or item prices yet
+        'AmazonOrderId': '111-0000002-0000002',
+        'PurchaseDate': '2026-01-01T11:00:00Z',
+        'OrderStatus': 'Pending',
+        'OrderItems': [{'ASIN': 'B000000001', 'Title': 'Widget', 'QuantityOrdered': 1}]
+    },
+]}
+
+def orders_report():
+    report = Report(name='Orders', type='orders', start_date=date(2026, 1, 1), end_date=date(2026, 1, 1), status='running')
+    db.session.add(report)
+    db.session.commit()
+    return report
+
+def test_orders_with_pending_orders_are_stored(app, tmp_path):
+    report = orders_report()
+    processor = ReportProcessor(amazon_api=object())
+    processor.store = ReportStore(str(tmp_path))
+
+    records = processor._process_orders_report(ORDERS_DOCUMENT)
+    assert processor._save_report_data(report, records, 0.0)
+
+    rows = processor.store.query(report, ['order_id', 'order_total'], ['order_total,>,0']).to_pylist()
+    assert rows == [{'order_id': '111-0000001-0000001', 'order_total': 25.98}]
+    items = processor.store.query(report, ['items']).column('items').to_pylist()
+    assert [item['price'] for order_items in items for item in order_items] == [25.98, 0.0]
+
+def test_legacy_report_data_is_read_with_the_report_schema(app, tmp_path):
+    report = orders_report()
+    report.data = ReportProcessor(amazon_api=object())._process_orders_report(ORDERS_DOCUMENT)
+    db.session.commit()
+    store = ReportStore(str(tmp_path))
+
+    assert store.query(report, ['order_total']).column('order_total').to_pylist() == [25.98, 0.0]
+
+    report.data_file = store.write(report.id, report.data, report.type)
+    assert store.query(report, ['order_total']).column('order_total').to_pylist() == [25.98, 0.0]
+
+def test_missing_data_file_is_not_found(app):
+    report = orders_report()
+    report.status = 'done'
+    report.data_file = f'report-{report.id}.parquet'
+    db.session.commit()
+    client = app.test_client()
+
+    for url in (f'/api/reports/{report.id}', f'/api/reports/{report.id}/download'):
+        response = client.get(url)
+        assert response.status_code == 404
+        assert response.get_json() == {'error': 'Report data file not found'}
@@ -0,0 +1,50 @@
+import sqlite3
+import threading
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+import config
+from app import create_app, db
+from app.models import Product, Sale
+from app.services import report_processor
+from app.services.report_processor import ReportProcessor
+
+@pytest.fixture
+def file_app(tmp_path, monkeypatch):
+    """An app on a SQLite file, so other connections see its write locks."""
+    path = tmp_path / 'sales.db'
+    monkeypatch.setattr(config.Config, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{path}')
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app, path
+        db.session.remove()
+        db.drop_all()
+
+def test_each_batch_is_committed_before_the_next_is_read(file_app, monkeypatch):
+    app, path = file_app
+    db.session.add(Product(asin='B000000001', title='Product'))
+    db.session.commit()
+    batches = [
+        pd.DataFrame({'asin': ['B000000001'], 'date': ['2026-01-01'], 'quantity': ['2'], 'revenue': ['20.0']}),
+        pd.DataFrame({'asin': ['B000000001'], 'date': ['2026-01-01'], 'quantity': ['3'], 'revenue': ['30.0']}),
+    ]
+    other_writes = []
+
+    def slow_batches(document, batch_size):
+        for batch in batches:
+            yield batch
+            # Another window's worker writes while this report is still downloading
+            with sqlite3.connect(path, timeout=0.5) as connection:
+                try:
+                    connection.execute("INSERT INTO product (asin, title) VALUES (?, 'Other')", (f'B00000000{len(other_writes) + 2}',))
+                    other_writes.append(True)
+                except sqlite3.OperationalError as e:
+                    other_writes.append(str(e))
+
+    monkeypatch.setattr(report_processor, 'iter_flat_file_batches', slow_batches)
+    processor = ReportProcessor(amazon_api=SimpleNamespace(marketplace_id='ATVPDKIKX0DER'))
+
+    assert len(processor._process_sales_report_stream(None)) == 1
+    assert other_writes == [True, True]
+    assert [(sale.quantity, sale.revenue) for sale in Sale.query.all()] == [(5, 50.0)]
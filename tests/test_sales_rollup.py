@@ -0,0 +1,75 @@
+from datetime import date
+import pandas as pd
+from sp_api.base import Marketplaces
+from app import db
+from app.models import DailyMarketplaceSalesRollup, DailySalesRollup, Product, Sale
+from app.services.sales_rollup import SalesRollup, backfill_sale_marketplaces
+from app.utils.data_processing import aggregate_sales
+
+US = Marketplaces.US.marketplace_id
+GB = Marketplaces.GB.marketplace_id
+DAY = date(2026, 1, 1)
+NEXT_DAY = date(2026, 1, 2)
+
+def test_aggregate_sales_tags_every_row_with_a_marketplace_id():
+    df = pd.DataFrame({
+        'ASIN': ['B000000001'] * 5,
+        'date': ['2026-01-01'] * 5,
+        'quantity': ['1', '2', '3', '4', '5'],
+        'revenue': ['1.0'] * 5,
+        'marketplace': ['Amazon.com', None, US, 'Amazon.co.uk', 'Non-Amazon']
+    })
+
+    sales = aggregate_sales(df, US)
+
+    assert sales[['marketplace', 'quantity']].values.tolist() == [[GB, 4], [US, 11]]
+
+def test_backfill_moves_legacy_tags_to_marketplace_ids(app):
+    product = Product(asin='B000000001', title='Product')
+    db.session.add(product)
+    db.session.commit()
+    db.session.add_all([
+        # Synced again under the ID since, so the 'Unknown' row is a stale copy
+        Sale(product_id=product.id, date=DAY, marketplace='Unknown', quantity=5, revenue=50.0),
+        Sale(product_id=product.id, date=DAY, marketplace=US, quantity=3, revenue=30.0),
+        # The rest of the same day, tagged with the sales channel
+        Sale(product_id=product.id, date=DAY, marketplace='Amazon.com', quantity=2, revenue=20.0),
+        Sale(product_id=product.id, date=NEXT_DAY, marketplace='Unknown', quantity=1, revenue=10.0),
+        Sale(product_id=product.id, date=NEXT_DAY, marketplace='Amazon.co.uk', quantity=4, revenue=40.0),
+    ])
+    db.session.commit()
+    SalesRollup().rebuild()
+
+    assert backfill_sale_marketplaces(US, batch_size=1) == 3
+
+    sales = {(sale.date, sale.marketplace): (sale.quantity, sale.revenue) for sale in Sale.query.all()}
+    assert sales == {
+        (DAY, US): (5, 50.0),
+        (NEXT_DAY, US): (1, 10.0),
+        (NEXT_DAY, GB): (4, 40.0),
+    }
+    assert {row.marketplace for row in SalesRollup().get_marketplace_totals()} == {US, GB}
+    assert DailySalesRollup.query.count() == 3
+
+def test_refresh_keeps_marketplace_totals_in_step(app):
+    products = [Product(asin='B000000001', title='One'), Product(asin='B000000002', title='Two')]
+    db.session.add_all(products)
+    db.session.commit()
+    db.session.add_all([
+        Sale(product_id=products[0].id, date=DAY, marketplace=US, quantity=2, revenue=20.0),
+        Sale(product_id=products[1].id, date=DAY, marketplace=US, quantity=3, revenue=30.0),
+        Sale(product_id=products[1].id, date=NEXT_DAY, marketplace=GB, quantity=1, revenue=8.0),
+    ])
+    db.session.commit()
+    SalesRollup().refresh({product.id for product in products}, DAY, NEXT_DAY)
+    db.session.commit()
+
+    # A later ingest only refreshes the product it revised
+    Sale.query.filter_by(product_id=products[0].id).update({'quantity': 4, 'revenue': 40.0})
+    SalesRollup().refresh({products[0].id}, DAY, DAY)
+    db.session.commit()
+
+    totals = {row.marketplace: (row.units, row.revenue, row.recent_revenue)
+              for row in SalesRollup().get_marketplace_totals(recent_since=NEXT_DAY)}
+    assert totals == {US: (7, 70.0, 0.0), GB: (1, 8.0, 8.0)}
+    assert DailyMarketplaceSalesRollup.query.count() == 2
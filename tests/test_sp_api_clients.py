@@ -0,0 +1,47 @@
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+from app.services.sp_api_clients import CachedAccessTokenClient
+
+def token_client(refresh_token: str):
+    return CachedAccessTokenClient(credentials=SimpleNamespace(
+        refresh_token=refresh_token,
+        lwa_app_id='fake-client-id',
+        lwa_client_secret='fake-client-secret'
+    ))
+
+def test_module_imports_on_its_own():
+    result = subprocess.run([sys.executable, '-c', 'import app.services.sp_api_clients'], capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+
+def test_slow_token_exchange_does_not_hold_up_other_tokens(monkeypatch):
+    monkeypatch.setattr(CachedAccessTokenClient, '_tokens', {})
+    slow_exchange_started, release_slow_exchange = threading.Event(), threading.Event()
+    fast_waited_for_slow = []
+
+    def request(client, url, data, headers):
+        if client.cred.refresh_token == 'slow':
+            slow_exchange_started.set()
+            release_slow_exchange.wait(5)
+        elif release_slow_exchange.is_set():
+            fast_waited_for_slow.append(True)
+        return {'access_token': f'token-{client.cred.refresh_token}', 'expires_in': 3600}
+
+    monkeypatch.setattr(CachedAccessTokenClient, '_request', request)
+    slow = threading.Thread(target=token_client('slow').get_auth)
+    slow.start()
+    slow_exchange_started.wait(5)
+
+    tokens = []
+    fast = threading.Thread(target=lambda: tokens.append(token_client('fast').get_auth().access_token))
+    fast.start()
+    fast.join(1)
+    release_slow_exchange.set()
+    slow.join()
+    fast.join()
+
+    assert tokens == ['token-fast']
+    assert not fast_waited_for_slow
+    assert token_client('slow').get_auth().access_token == 'token-slow'
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import DailySalesRollup, Product
+from app.services.tracking import TrackingScheduler
+
+def test_due_products_are_ordered_by_recent_units_sold(app):
+    products = [Product(asin=f'B00000000{index}', title=f'Product {index}') for index in range(3)]
+    db.session.add_all(products)
+    db.session.commit()
+    today = datetime.utcnow().date()
+    db.session.add_all([
+        DailySalesRollup(product_id=products[1].id, date=today, marketplace='ATVPDKIKX0DER', units=5, revenue=50.0),
+        DailySalesRollup(product_id=products[2].id, date=today, marketplace='ATVPDKIKX0DER', units=2, revenue=20.0),
+        # Outside the priority window
+        DailySalesRollup(product_id=products[2].id, date=today - timedelta(days=60), marketplace='ATVPDKIKX0DER',
+                         units=100, revenue=1000.0),
+    ])
+    db.session.commit()
+
+    scheduler = TrackingScheduler()
+    scheduler.sync_schedules()
+    scheduler.update_priorities()
+
+    due = scheduler.due_query('prices', datetime.utcnow()).all()
+    assert [(schedule.product_id, schedule.priority) for schedule in due] == [
+        (products[1].id, 5), (products[2].id, 2), (products[0].id, 0)
+    ]